@@ -1,20 +1,28 @@
-import asyncio
+import json
 import logging
-from typing import Dict, Set, Optional, List
-from datetime import datetime
-from zoneinfo import ZoneInfo
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, List, Tuple
 
-import requests
+import httpx
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from telegram import helpers
 
+import alert_history
 import config
+import metrics
 import database as db
+import http_client
+import outbox
+import subscriptions
+import regions
 
 logger = logging.getLogger(__name__)
 
+SNAPSHOT_KEY = 'alert_snapshot'
+
 ALERT_TYPES_TRANSLATION = {
     'AIR': 'Повітряна тривога',
     'ARTILLERY': 'Артилерія',
@@ -23,38 +31,140 @@ ALERT_TYPES_TRANSLATION = {
     'CHEMICAL': 'Хімічна загроза'
 }
 
-async def get_air_raid_status(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> Optional[List[Dict]]:
-    api_url = config.cfg.get('AIR_RAID_API_URL')
+ALERT_POLLS = metrics.Counter('bot_alert_polls_total', "Air raid status checks by outcome.", ['result'])
+
+@dataclass
+class AlertFeed:
+    """
+    Response of the alerts endpoint.
+
+    data is None when the server answered 304 Not Modified. last_modified
+    and etag are the server's validators for the next conditional request.
+    """
+    data: Optional[List[Dict]]
+    last_modified: Optional[str] = None
+    etag: Optional[str] = None
+
+def _auth_headers() -> Optional[Dict[str, str]]:
     auth_token = config.cfg.get('UKRAINE_ALARM_TOKEN')
-    if not api_url or not auth_token:
-        logger.error("Air Raid API URL or Auth Token is not configured.")
+    if not auth_token:
         return None
-
-    logger.debug(f"Using auth token: '{auth_token}'")
-    headers = {
+    return {
         'Authorization': auth_token,
         'accept': 'application/json'
     }
-    if context and 'last_alert_status' in context.bot_data:
-        last_update = context.bot_data['last_alert_status'].get('lastUpdate')
-        if last_update:
-            headers['If-Modified-Since'] = last_update
 
+async def get_alert_marker() -> Optional[int]:
+    """
+    Fetches the feed's lastActionIndex, which changes whenever any alert starts or ends.
+
+    The status endpoint returns a single number, so polling it is much cheaper
+    than downloading and diffing the full alert list.
+
+    Returns:
+        The index, or None if the endpoint is not configured or unavailable.
+    """
+    api_url = config.cfg.get('AIR_RAID_STATUS_URL')
+    headers = _auth_headers()
+    if not api_url or not headers:
+        return None
     try:
-        response = requests.get(api_url, headers=headers, timeout=10)
-        if response.status_code == 304 and context:
-            logger.info("Air raid status not modified since last check.")
-            return context.bot_data['last_alert_status']['data']
+        response = await http_client.get(api_url, headers=headers, upstream='alerts_status')
+        if response.status_code != 200:
+            logger.warning(f"Alert status API returned status {response.status_code}.")
+            return None
+        marker = response.json().get('lastActionIndex')
+        return marker if isinstance(marker, int) else None
+    except (httpx.HTTPError, ValueError, AttributeError) as e:
+        logger.warning(f"Failed to fetch alert status marker: {e}")
+        return None
+
+async def fetch_alerts(state: Optional[Dict] = None) -> Optional[AlertFeed]:
+    """
+    Fetches the full alert list.
+
+    Args:
+        state: Previous alert state. Its server validators ('lastUpdate' holds
+            Last-Modified, 'etag' holds ETag) make the request conditional.
+
+    Returns:
+        The feed, or None on errors.
+    """
+    api_url = config.cfg.get('AIR_RAID_API_URL')
+    headers = _auth_headers()
+    if not api_url or not headers:
+        logger.error("Air Raid API URL or Auth Token is not configured.")
+        return None
+
+    if state:
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('lastUpdate'):
+            headers['If-Modified-Since'] = state['lastUpdate']
+
+    try:
+        response = await http_client.get(api_url, headers=headers, upstream='alerts')
+        if response.status_code == 304 and state:
+            return AlertFeed(None, state.get('lastUpdate'), state.get('etag'))
         if response.status_code == 200:
             data = response.json()
             logger.debug(f"Air raid status fetched: {len(data)} regions.")
-            return data
+            return AlertFeed(data, response.headers.get('Last-Modified'), response.headers.get('ETag'))
         logger.error(f"Air raid API returned status {response.status_code}: {response.text}")
         return None
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Failed to fetch air raid status: {e}")
         return None
 
+async def get_air_raid_status(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> Optional[List[Dict]]:
+    state = context.bot_data.get('last_alert_status') if context else None
+    feed = await fetch_alerts(state)
+    if feed is None:
+        return None
+    if feed.data is None:
+        logger.info("Air raid status not modified since last check.")
+        return state['data']
+    return feed.data
+
+async def get_regions() -> Optional[List[Dict]]:
+    """Fetches the list of oblasts from the UkraineAlarm regions endpoint."""
+    api_url = config.cfg.get('REGIONS_API_URL')
+    auth_token = config.cfg.get('UKRAINE_ALARM_TOKEN')
+    if not api_url or not auth_token:
+        logger.error("Regions API URL or Auth Token is not configured.")
+        return None
+
+    headers = {
+        'Authorization': auth_token,
+        'accept': 'application/json'
+    }
+    try:
+        response = await http_client.get(api_url, headers=headers, upstream='regions')
+        if response.status_code != 200:
+            logger.error(f"Regions API returned status {response.status_code}: {response.text}")
+            return None
+        data = response.json()
+        states = data.get('states', []) if isinstance(data, dict) else data
+        logger.debug(f"Regions fetched: {len(states)} states.")
+        return states
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to fetch regions: {e}")
+        return None
+
+async def refresh_regions(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> None:
+    states = await get_regions()
+    if states:
+        regions.directory.update(states, states=True)
+        logger.info(f"Region directory refreshed: {len(regions.directory)} regions.")
+        return
+    # The alert feed still carries region names when the regions endpoint is unavailable.
+    alerts = await get_air_raid_status()
+    if alerts:
+        regions.directory.update(alerts)
+        logger.info(f"Region directory refreshed from the alert feed: {len(regions.directory)} regions.")
+    else:
+        logger.error("Failed to refresh region directory.")
+
 def format_alert_message(region_name: str, alert_types: str = None) -> str:
     alert_type_str = f" ({alert_types})" if alert_types else ""
     return f"🚨 УВАГА! Тривога в **{region_name}**!{alert_type_str}\nПрямуйте до укриття!"
@@ -62,70 +172,167 @@ def format_alert_message(region_name: str, alert_types: str = None) -> str:
 def format_no_alert_message(region_name: str) -> str:
     return f"✅ Відбій тривоги в **{region_name}**."
 
-async def notify_user(context: ContextTypes.DEFAULT_TYPE, user_id: int, message: str) -> None:
+@lru_cache(maxsize=256)
+def _translate_types(alert_types: Tuple[str, ...]) -> str:
+    return ", ".join(ALERT_TYPES_TRANSLATION.get(t, t) for t in alert_types)
+
+def translate_alert_types(region: Dict) -> str:
+    return _translate_types(tuple(a.get('type', 'Невідомо') for a in region.get('activeAlerts', [])))
+
+@dataclass(frozen=True)
+class RenderedAlert:
+    region_id: str
+    kind: str
+    text: str
+
+def render_tick(started: List[Dict], ended: List[Dict]) -> List[RenderedAlert]:
+    """
+    Renders each changed region's message exactly once.
+
+    Delivery passes references to these payloads around instead of
+    formatting per recipient.
+    """
+    rendered = [
+        RenderedAlert(region['regionId'], 'alert', format_alert_message(region['regionName'], translate_alert_types(region)))
+        for region in started
+    ]
+    rendered.extend(
+        RenderedAlert(region['regionId'], 'clear', format_no_alert_message(region['regionName']))
+        for region in ended
+    )
+    return rendered
+
+def diff_alert_status(last_data: List[Dict], current_data: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Compares two alert snapshots.
+
+    Args:
+        last_data: Regions from the previous tick.
+        current_data: Regions from the current tick.
+
+    Returns:
+        Regions where an alert started and regions where it ended. A region
+        missing from the current snapshot counts as having no alert.
+    """
+    last_active = {region['regionId']: region for region in last_data if region.get('activeAlerts')}
+    current_active = {region['regionId']: region for region in current_data if region.get('activeAlerts')}
+    started = [region for region_id, region in current_active.items() if region_id not in last_active]
+    ended = [region for region_id, region in last_active.items() if region_id not in current_active]
+    return started, ended
+
+def pack_snapshot(data: List[Dict], last_update: Optional[str], etag: Optional[str] = None,
+                  last_action_index: Optional[int] = None, since: Optional[Dict[str, List]] = None) -> str:
+    """
+    Serializes the alert state compactly.
+
+    Only regions with active alerts matter for the diff, so the snapshot keeps
+    just their id, name and alert types, plus the server's change markers and
+    the start of each alert in progress for the alert history.
+    """
+    active = [
+        [region['regionId'], region.get('regionName', ''), [a.get('type') for a in region['activeAlerts']]]
+        for region in data if region.get('activeAlerts')
+    ]
+    snapshot = {'lastUpdate': last_update, 'etag': etag, 'lastActionIndex': last_action_index, 'active': active,
+                'since': since or {}}
+    return json.dumps(snapshot, ensure_ascii=False, separators=(',', ':'))
+
+def unpack_snapshot(raw: str) -> Dict:
+    snapshot = json.loads(raw)
+    data = [
+        {'regionId': region_id, 'regionName': name, 'activeAlerts': [{'type': t} for t in types]}
+        for region_id, name, types in snapshot.get('active', [])
+    ]
+    return {
+        'data': data,
+        'lastUpdate': snapshot.get('lastUpdate'),
+        'etag': snapshot.get('etag'),
+        'lastActionIndex': snapshot.get('lastActionIndex'),
+        'since': snapshot.get('since') or {}
+    }
+
+async def save_alert_snapshot(bot_data: Dict) -> None:
+    snapshot = bot_data.get('last_alert_status')
+    if snapshot:
+        await db.set_state(SNAPSHOT_KEY, pack_snapshot(
+            snapshot['data'], snapshot.get('lastUpdate'), snapshot.get('etag'), snapshot.get('lastActionIndex'),
+            snapshot.get('since')
+        ))
+
+async def load_alert_snapshot(bot_data: Dict) -> None:
+    """Restores the last alert state so the first tick after a restart only reports real changes."""
+    raw = await db.get_state(SNAPSHOT_KEY)
+    if not raw:
+        logger.info("No saved alert snapshot, starting cold.")
+        return
     try:
-        delay = float(config.cfg.get('NOTIFICATION_DELAY', 0.1))
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=message,
-            parse_mode='Markdown',
-            disable_notification=False
-        )
-        await asyncio.sleep(delay)
-    except Exception as e:
-        logger.error(f"Failed to notify user {user_id}: {e}")
-        if isinstance(e, (Forbidden, BadRequest)):
-            db.remove_subscriber(user_id)
+        bot_data['last_alert_status'] = unpack_snapshot(raw)
+        logger.info(f"Restored alert snapshot with {len(bot_data['last_alert_status']['data'])} active regions.")
+    except (ValueError, TypeError, KeyError) as e:
+        logger.error(f"Ignoring corrupt alert snapshot: {e}")
 
 async def check_air_raid_status(context: ContextTypes.DEFAULT_TYPE) -> None:
-    logger.info("Checking air raid status...")
-    current_status = await get_air_raid_status(context)
-    if current_status is None:
+    with metrics.ALERT_TICK_DURATION.time():
+        await _check_air_raid_status(context)
+
+async def _check_air_raid_status(context: ContextTypes.DEFAULT_TYPE) -> None:
+    logger.debug("Checking air raid status...")
+    state = context.bot_data.setdefault('last_alert_status', {'data': [], 'lastUpdate': None})
+    marker = await get_alert_marker()
+    if marker is not None and marker == state.get('lastActionIndex'):
+        ALERT_POLLS.inc('unchanged')
+        return
+
+    feed = await fetch_alerts(state)
+    if feed is None:
+        ALERT_POLLS.inc('failed')
         logger.error("Failed to fetch air raid status.")
         return
+    # The marker was read before the list, so the list is at least as new as the marker.
+    if feed.data is None:
+        ALERT_POLLS.inc('not_modified')
+        if marker != state.get('lastActionIndex'):
+            state['lastActionIndex'] = marker
+            await save_alert_snapshot(context.bot_data)
+        return
 
-    bot_data = context.bot_data.setdefault('last_alert_status', {'data': [], 'lastUpdate': None})
-    last_status = {region['regionId']: region for region in bot_data['data']}
-    current_active_regions: Set[str] = {region['regionId'] for region in current_status if region.get('activeAlerts')}
+    ALERT_POLLS.inc('fetched')
+    regions.directory.update(feed.data)
+    started, ended = diff_alert_status(state['data'], feed.data)
+    if started or ended:
+        rendered = render_tick(started, ended)
+        recipients = subscriptions.store.snapshot_recipients([alert.region_id for alert in rendered])
+        queued = await outbox.enqueue([(alert.region_id, alert.kind, alert.text) for alert in rendered], recipients)
+        if queued is None:
+            # The state is only advanced once the notifications are stored, so the next check finds these changes again.
+            logger.error("Failed to queue alert notifications, retrying on the next check.")
+            return
+        logger.info(f"Alerts started in {len(started)} and ended in {len(ended)} regions, "
+                    f"{queued} notifications queued.")
+    else:
+        logger.debug("No alert changes since last check.")
 
-    subscribers = db.get_subscribers()
-    subscribers_dict: Dict[int, Set[Optional[str]]] = {}
-    for user_id, region_id in subscribers:
-        if not isinstance(region_id, (str, type(None))):
-            logger.error(f"Invalid region_id type from database: {region_id} (type: {type(region_id)})")
-            continue
-        subscribers_dict.setdefault(user_id, set()).add(region_id)
-
-    for user_id, regions in subscribers_dict.items():
-        selected_region = context.user_data.get('selected_region') if user_id in context.user_data else None
-        try:
-            regions = regions if None not in regions else {None}
-            for region_id in regions:
-                if region_id is None or (selected_region and region_id == selected_region):
-                    for region in current_status:
-                        if region_id is not None and region['regionId'] != region_id:
-                            continue
-                        region_id_str = region['regionId']
-                        was_active = bool(last_status.get(region_id_str, {}).get('activeAlerts'))
-                        is_active = region_id_str in current_active_regions
-                        if is_active and not was_active:
-                            alert_types = [ALERT_TYPES_TRANSLATION.get(a.get('type', 'Невідомо'), a.get('type', 'Невідомо')) 
-                                         for a in region.get('activeAlerts', [])]
-                            message = format_alert_message(region['regionName'], ", ".join(alert_types))
-                            await notify_user(context, user_id, message)
-                        elif was_active and not is_active:
-                            message = format_no_alert_message(region['regionName'])
-                            await notify_user(context, user_id, message)
-        except Exception as e:
-            logger.error(f"Error notifying {user_id}: {e}", exc_info=True)
-            await context.bot.send_message(chat_id=user_id, text=f"⚠️ Помилка: {str(e)}")
-
-    bot_data['data'] = current_status
-    bot_data['lastUpdate'] = datetime.now(ZoneInfo("UTC")).isoformat()
+    state['lastActionIndex'] = marker
+    state['data'] = feed.data
+    state['lastUpdate'] = feed.last_modified
+    state['etag'] = feed.etag
+    alert_history.track(state.setdefault('since', {}), started, ended)
+    await save_alert_snapshot(context.bot_data)
+
+def cached_alerts(bot_data: Dict) -> Optional[List[Dict]]:
+    """Alert list as of the last poll, or None before the first successful poll or restored snapshot."""
+    state = bot_data.get('last_alert_status')
+    # Set by every successful poll and by a restored snapshot, not by the empty initial state.
+    if not state or 'lastActionIndex' not in state:
+        return None
+    return state['data']
 
 async def alerts_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
-        current_alerts = await get_air_raid_status()
+        # Served from the state the poller keeps; the upstream is only asked before it has any.
+        current_alerts = cached_alerts(context.bot_data)
+        if current_alerts is None:
+            current_alerts = await get_air_raid_status()
         if current_alerts is None:
             await update.message.reply_text("Не вдалося отримати статус тривог. Перевірте токен API тривог.")
             return
@@ -141,11 +348,36 @@ async def alerts_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             message = "🚨 *Активні тривоги:*\n\n"
             for region in active_regions:
                 name = helpers.escape_markdown(region.get('regionName', 'Невідомий регіон'), version=2)
-                alert_types = [ALERT_TYPES_TRANSLATION.get(a.get('type', 'Невідомо'), a.get('type', 'Невідомо')) 
-                             for a in region.get('activeAlerts', [])]
-                types_str = ", ".join(alert_types)
+                types_str = translate_alert_types(region)
                 message += f"\\- {name}: {types_str}\n"
             await update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN_V2)
     except Exception as e:
         await update.message.reply_text(f"⚠️ Помилка: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/stats [region]: number, total and average duration and the longest alert per window."""
+    region_id = None
+    if context.args:
+        region_id = regions.directory.resolve(" ".join(context.args))
+        if not region_id:
+            await update.message.reply_text("Регіон не знайдено. Спробуйте ще раз.")
+            return
+
+    stats = await alert_history.get_stats(region_id)
+    if stats is None:
+        await update.message.reply_text("Не вдалося отримати статистику тривог.")
+        return
+    title = regions.directory.name(region_id) if region_id else "Всі регіони"
+    message = f"📊 Статистика тривог: {title}\n"
+    for (label, _), window in zip(alert_history.WINDOWS, stats):
+        if not window.alerts:
+            message += f"\n{label}: тривог не було\n"
+            continue
+        message += (
+            f"\n{label}: {window.alerts} трив.\n"
+            f"Загалом: {alert_history.format_duration(window.total)}, "
+            f"в середньому: {alert_history.format_duration(window.average)}\n"
+            f"Найдовша: {alert_history.format_duration(window.longest)}\n"
+        )
+    await update.message.reply_text(message)
@@ -0,0 +1,97 @@
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from telegram.ext import ContextTypes
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+# /stats windows: label and number of calendar days, today included.
+WINDOWS = (('Сьогодні', 1), ('7 днів', 7), ('30 днів', 30))
+
+# Finished alerts waiting for the next flush: (region_id, alert_type, started_at, ended_at, day).
+_pending: List[Tuple[str, str, float, float, int]] = []
+
+@dataclass
+class AlertStats:
+    alerts: int
+    total: float
+    longest: float
+
+    @property
+    def average(self) -> float:
+        return self.total / self.alerts if self.alerts else 0.0
+
+def day_of(timestamp: float) -> int:
+    """Rollup bucket of a timestamp: the ordinal of its local calendar day."""
+    return date.fromtimestamp(timestamp).toordinal()
+
+def alert_type(region: Dict) -> str:
+    return ",".join(a.get('type', 'UNKNOWN') for a in region.get('activeAlerts', [])) or 'UNKNOWN'
+
+def track(since: Dict[str, List], started: List[Dict], ended: List[Dict], now: Optional[float] = None) -> int:
+    """
+    Records the alert changes of one tick.
+
+    Args:
+        since: region_id -> [started_at, alert_type] of the alerts in progress.
+            Lives in the alert snapshot, so a restart does not lose start times.
+        started: Regions where an alert started.
+        ended: Regions where an alert ended.
+
+    Returns:
+        Number of finished alerts queued for the next flush. Alerts whose start
+        was never seen (active before the first snapshot) are not recorded.
+    """
+    now = time.time() if now is None else now
+    for region in started:
+        since.setdefault(region['regionId'], [now, alert_type(region)])
+    finished = 0
+    for region in ended:
+        opened = since.pop(region['regionId'], None)
+        if opened is None:
+            continue
+        started_at, kind = opened
+        _pending.append((region['regionId'], kind, started_at, now, day_of(started_at)))
+        finished += 1
+    return finished
+
+async def flush(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> int:
+    """
+    Writes queued alerts in one transaction. Scheduled as a job and run on shutdown.
+
+    Returns:
+        Number of alerts written. On failure they stay queued for the next run.
+    """
+    if not _pending:
+        return 0
+    batch = _pending[:]
+    del _pending[:len(batch)]
+    if not await db.add_alert_intervals(batch):
+        _pending[:0] = batch
+        return 0
+    logger.debug(f"Recorded {len(batch)} finished alerts.")
+    return len(batch)
+
+async def get_stats(region_id: Optional[str], today: Optional[date] = None) -> Optional[List[AlertStats]]:
+    """
+    Statistics for each of WINDOWS, of one region or of all regions if region_id is None.
+
+    Read from the daily rollups, so the cost depends on the window length and
+    not on how much history is stored. An alert counts towards the day it started.
+    """
+    await flush()
+    first = (today or date.today()).toordinal()
+    rows = await db.alert_stats(region_id, [first - days + 1 for _, days in WINDOWS])
+    if not rows:
+        return None
+    return [AlertStats(alerts, total, longest) for alerts, total, longest in rows]
+
+def format_duration(seconds: float) -> str:
+    minutes = int(round(seconds / 60))
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} год {minutes} хв" if hours else f"{minutes} хв"
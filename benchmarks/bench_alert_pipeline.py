@@ -0,0 +1,218 @@
+"""
+Scale benchmark for the alert pipeline.
+
+For each size the SQLite database is seeded with synthetic subscriptions,
+then check_air_raid_status runs against a local UkraineAlarm stub that
+replays a scripted sequence of alert states, and the outbox is drained into a
+fake bot that records every send.
+
+Per tick it reports tick latency (up to the outbox enqueue), peak traced
+memory, time spent in the database layer and time from tick start to the last
+notification. Results are written as JSON; pass --compare with an earlier file
+to print the change.
+
+Usage:
+    python -m benchmarks.bench_alert_pipeline [--sizes 1000 10000 100000 1000000]
+        [--output PATH] [--compare PATH] [--no-tracemalloc]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import config
+import database as db
+import subscriptions
+import air_raid
+import outbox
+import http_client
+
+REGION_IDS = [str(i) for i in range(3, 28)]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+def alert_state(active: List[str]) -> List[Dict]:
+    return [
+        {'regionId': region_id, 'regionName': f"Область {region_id}", 'regionType': 'State',
+         'activeAlerts': [{'regionId': region_id, 'type': 'AIR'}] if region_id in active else []}
+        for region_id in REGION_IDS
+    ]
+
+# (name, alert feed) pairs replayed in order, one per tick.
+SCRIPT = [
+    ('quiet', alert_state([])),
+    ('five_regions', alert_state(REGION_IDS[:5])),
+    ('unchanged', alert_state(REGION_IDS[:5])),
+    ('nationwide', alert_state(REGION_IDS)),
+    ('all_clear', alert_state([])),
+]
+
+class ScriptedAlertServer:
+    """HTTP stub that answers each request with the next scripted alert feed."""
+
+    def __init__(self):
+        self.responses: List[bytes] = []
+        self.port = 0
+
+    def start(self) -> None:
+        ready = threading.Event()
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            try:
+                while True:
+                    await reader.readuntil(b"\r\n\r\n")
+                    body = self.responses.pop(0) if self.responses else b"[]"
+                    writer.write(
+                        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                        + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                    )
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionResetError):
+                pass
+            finally:
+                writer.close()
+
+        def run() -> None:
+            loop = asyncio.new_event_loop()
+            server = loop.run_until_complete(asyncio.start_server(handle, '127.0.0.1', 0))
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = 0
+        self.last_sent_at = 0.0
+
+    async def send_message(self, chat_id: int, text: str, parse_mode: Optional[str] = None) -> None:
+        self.sent += 1
+        self.last_sent_at = time.perf_counter()
+
+def seed_database(path: str, size: int) -> None:
+    rng = random.Random(size)
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE subscriptions (user_id INTEGER, region_id TEXT, PRIMARY KEY (user_id, region_id))")
+        conn.executemany(
+            "INSERT INTO subscriptions VALUES (?, ?)",
+            ((user_id, None if rng.random() < 0.3 else rng.choice(REGION_IDS)) for user_id in range(1, size + 1))
+        )
+
+def instrument_database() -> Dict[str, float]:
+    """Wraps the database worker dispatch to accumulate time spent in queries."""
+    timings = {'seconds': 0.0}
+    original = db._run
+
+    async def timed_run(func, *args):
+        started = time.perf_counter()
+        try:
+            return await original(func, *args)
+        finally:
+            timings['seconds'] += time.perf_counter() - started
+
+    db._run = timed_run
+    return timings
+
+async def run_size(size: int, server: ScriptedAlertServer, trace: bool) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        seed_database(path, size)
+        db.DB_PATH = path
+        db.init_db()
+        db_time = instrument_database()
+
+        started = time.perf_counter()
+        await subscriptions.load()
+        result = {'subscribers': size, 'load_s': time.perf_counter() - started, 'ticks': {}}
+
+        bot = RecordingBot()
+        context = SimpleNamespace(bot=bot, bot_data={})
+        server.responses = [json.dumps(state).encode() for _, state in SCRIPT]
+        for name, _ in SCRIPT:
+            bot.sent = 0
+            db_time['seconds'] = 0.0
+            if trace:
+                tracemalloc.start()
+            started = time.perf_counter()
+            await air_raid.check_air_raid_status(context)
+            finished = time.perf_counter()
+            await outbox.drain(bot)
+            peak = tracemalloc.get_traced_memory()[1] if trace else 0
+            if trace:
+                tracemalloc.stop()
+            result['ticks'][name] = {
+                'tick_s': round(finished - started, 4),
+                'peak_mib': round(peak / 2 ** 20, 2),
+                'db_s': round(db_time['seconds'], 4),
+                'notifications': bot.sent,
+                'last_notification_s': round(bot.last_sent_at - started, 4) if bot.sent else 0.0,
+            }
+        await db.close_db()
+    return result
+
+def print_results(results: List[Dict], baseline: Optional[Dict]) -> None:
+    previous = {entry['subscribers']: entry for entry in baseline['results']} if baseline else {}
+    for entry in results:
+        print(f"{entry['subscribers']} subscribers (store load {entry['load_s']:.2f}s)")
+        for name, tick in entry['ticks'].items():
+            line = (f"  {name:<13} tick {tick['tick_s']:>8.3f}s  db {tick['db_s']:>7.3f}s  "
+                    f"peak {tick['peak_mib']:>8.2f} MiB  sent {tick['notifications']:>8}  "
+                    f"last {tick['last_notification_s']:>8.3f}s")
+            old = previous.get(entry['subscribers'], {}).get('ticks', {}).get(name)
+            if old and old['tick_s']:
+                line += f"  ({(tick['tick_s'] / old['tick_s'] - 1) * 100:+.0f}% tick)"
+            print(line)
+
+async def main_async(args: argparse.Namespace) -> List[Dict]:
+    server = ScriptedAlertServer()
+    server.start()
+    config.cfg.update({
+        'AIR_RAID_API_URL': f"http://127.0.0.1:{server.port}/api/v3/alerts",
+        'UKRAINE_ALARM_TOKEN': 'benchmark',
+        'BROADCAST_RATE': args.rate,
+        'BROADCAST_PER_CHAT_INTERVAL': 0.0,
+        'BROADCAST_CONCURRENCY': 100,
+    })
+    original_run = db._run
+    results = []
+    for size in args.sizes:
+        results.append(await run_size(size, server, not args.no_tracemalloc))
+        db._run = original_run
+    await http_client.close()
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--rate', type=float, default=1e9, help="broadcast rate limit, msg/s")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/alert_pipeline-<time>.json)")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--no-tracemalloc', action='store_true', help="skip peak memory tracking (faster)")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"alert_pipeline-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'created': datetime.now().isoformat(), 'script': [name for name, _ in SCRIPT],
+                   'results': results}, f, indent=2)
+    print(f"Results saved to {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+/stats query time over years of alert history.
+
+Fills a temporary database with finished alerts for 25 regions through
+alert_history.flush, a day of alerts per batch, then times the day, week and
+month windows two ways: "raw" aggregates alert_intervals through its
+(region_id, started_at) index, "rollup" sums the alert_rollups rows /stats reads.
+
+Usage:
+    python -m benchmarks.bench_alert_stats [--years 3] [--per-day 6] [--queries 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import alert_history
+import database as db
+
+REGIONS = [str(region_id) for region_id in range(3, 28)]
+RAW_STATS = (
+    "SELECT COUNT(*), SUM(ended_at - started_at), MAX(ended_at - started_at) FROM alert_intervals "
+    "WHERE region_id = ? AND started_at >= ?"
+)
+
+async def fill(years: int, per_day: int, today: date) -> float:
+    rng = random.Random(3)
+    started = time.perf_counter()
+    for offset in range(years * 365, -1, -1):
+        day = today - timedelta(days=offset)
+        midnight = datetime(day.year, day.month, day.day).timestamp()
+        for region_id in REGIONS:
+            for _ in range(rng.randint(0, 2 * per_day)):
+                start = midnight + rng.uniform(0, 86000)
+                duration = rng.expovariate(1 / 3600)
+                alert_history._pending.append((region_id, 'AIR', start, start + duration, alert_history.day_of(start)))
+        await alert_history.flush()
+    return time.perf_counter() - started
+
+def time_queries(label: str, queries: int, run) -> None:
+    timings = []
+    for i in range(queries):
+        began = time.perf_counter()
+        run(REGIONS[i % len(REGIONS)])
+        timings.append(time.perf_counter() - began)
+    timings.sort()
+    print(f"  {label:<7} mean {sum(timings) / len(timings) * 1e6:8.0f} us, "
+          f"p99 {timings[int(len(timings) * 0.99) - 1] * 1e6:8.0f} us")
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--per-day', type=int, default=6, help='average alerts per region per day')
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    today = date.today()
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, 'bench.db')
+        db.init_db()
+        fill_s = await fill(args.years, args.per_day, today)
+        await db.close_db()
+
+        conn = sqlite3.connect(db.DB_PATH)
+        intervals = conn.execute("SELECT COUNT(*) FROM alert_intervals").fetchone()[0]
+        rollups = conn.execute("SELECT COUNT(*) FROM alert_rollups").fetchone()[0]
+        print(f"{intervals} alerts in {rollups} rollup rows over {args.years} years, "
+              f"written in {fill_s:.1f} s ({fill_s / intervals * 1e6:.0f} us per alert)")
+
+        first_days = [today.toordinal() - days + 1 for _, days in alert_history.WINDOWS]
+        first_times = [datetime.fromordinal(day).timestamp() for day in first_days]
+
+        def raw(region_id: str) -> None:
+            for since in first_times:
+                conn.execute(RAW_STATS, (region_id, since)).fetchone()
+
+        def rollup(region_id: str) -> None:
+            for since in first_days:
+                conn.execute(db.SQL_REGION_ALERT_STATS, (region_id, since)).fetchone()
+
+        def rollup_all(_: str) -> None:
+            for since in first_days:
+                conn.execute(db.SQL_ALERT_STATS, (since,)).fetchone()
+
+        print("/stats <region>, three windows:")
+        time_queries('raw', args.queries, raw)
+        time_queries('rollup', args.queries, rollup)
+        print("/stats, all regions:")
+        time_queries('rollup', args.queries, rollup_all)
+        conn.close()
+
+if __name__ == '__main__':
+    asyncio.run(main())
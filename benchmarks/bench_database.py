@@ -0,0 +1,100 @@
+"""
+Throughput of add_subscriber / is_subscribed / get_subscribers.
+
+"before" replays the previous implementation, which opened a new connection
+per call and ran on the calling thread. "after" uses the database module:
+one WAL connection on a worker thread with cached statements.
+
+Usage:
+    python -m benchmarks.bench_database [--ops 5000] [--rows 10000]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Optional
+
+import database as db
+
+def legacy_add_subscriber(path: str, user_id: int, region_id: Optional[str]) -> bool:
+    with sqlite3.connect(path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT OR IGNORE INTO subscriptions (user_id, region_id) VALUES (?, ?)", (user_id, region_id))
+        conn.commit()
+        return cursor.rowcount > 0
+
+def legacy_is_subscribed(path: str, user_id: int) -> bool:
+    with sqlite3.connect(path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM subscriptions WHERE user_id = ?", (user_id,))
+        return cursor.fetchone()[0] > 0
+
+def legacy_get_subscribers(path: str) -> list:
+    with sqlite3.connect(path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id, region_id FROM subscriptions")
+        return cursor.fetchall()
+
+def create_schema(path: str) -> None:
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE subscriptions (user_id INTEGER, region_id TEXT, PRIMARY KEY (user_id, region_id))")
+
+def rate(ops: int, elapsed: float) -> str:
+    return f"{ops / elapsed:>10.0f} ops/s"
+
+def run_legacy(path: str, ops: int, rows: int) -> dict:
+    create_schema(path)
+    started = time.perf_counter()
+    for i in range(ops):
+        legacy_add_subscriber(path, i, str(i % 25))
+    add = time.perf_counter() - started
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT OR IGNORE INTO subscriptions VALUES (?, ?)", ((ops + i, None) for i in range(rows)))
+    started = time.perf_counter()
+    for i in range(ops):
+        legacy_is_subscribed(path, i)
+    check = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(20):
+        legacy_get_subscribers(path)
+    scan = time.perf_counter() - started
+    return {'add_subscriber': rate(ops, add), 'is_subscribed': rate(ops, check), 'get_subscribers': rate(20, scan)}
+
+async def run_current(path: str, ops: int, rows: int) -> dict:
+    db.DB_PATH = path
+    db.init_db()
+    started = time.perf_counter()
+    for i in range(ops):
+        await db.add_subscriber(i, str(i % 25))
+    add = time.perf_counter() - started
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT OR IGNORE INTO subscriptions VALUES (?, ?)", ((ops + i, None) for i in range(rows)))
+    started = time.perf_counter()
+    for i in range(ops):
+        await db.is_subscribed(i)
+    check = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(20):
+        await db.get_subscribers()
+    scan = time.perf_counter() - started
+    await db.close_db()
+    return {'add_subscriber': rate(ops, add), 'is_subscribed': rate(ops, check), 'get_subscribers': rate(20, scan)}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=5000)
+    parser.add_argument('--rows', type=int, default=10000, help="extra rows for the full-table scan")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = run_legacy(os.path.join(tmp, 'before.db'), args.ops, args.rows)
+        after = asyncio.run(run_current(os.path.join(tmp, 'after.db'), args.ops, args.rows))
+
+    print(f"{args.ops} operations, {args.ops + args.rows} rows for get_subscribers")
+    for name in before:
+        print(f"  {name:<16} before {before[name]}   after {after[name]}")
+
+if __name__ == '__main__':
+    main()
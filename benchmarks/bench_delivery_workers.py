@@ -0,0 +1,150 @@
+"""
+Throughput of outbox delivery from the bot process versus 1, 2 and 4 worker processes.
+
+Each run fills a fresh outbox with one alert per region for every synthetic
+subscriber and measures how long it takes until the outbox is empty. The
+workers use the real python-telegram-bot Bot against a local stub of the Bot
+API (served from several processes on one port, so the stub is not the
+bottleneck), which keeps JSON encoding and HTTP handling in the measurement.
+The rate limit is disabled so the numbers show the CPU ceiling; worker
+processes only help when the machine has cores to spare for them.
+
+Usage:
+    python -m benchmarks.bench_delivery_workers [--subscribers 20000] [--workers 1 2 4]
+        [--servers 4] [--concurrency 100]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+from typing import Dict, Optional
+
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+import config
+import database as db
+import http_server
+import metrics
+import outbox
+import outbox_workers
+
+TOKEN = '123456:' + 'A' * 35
+REGION_IDS = [str(i) for i in range(3, 8)]
+ME = json.dumps({'ok': True, 'result': {'id': 123456, 'is_bot': True, 'first_name': 'Bench',
+                                        'username': 'bench_bot'}}).encode()
+SENT = json.dumps({'ok': True, 'result': {'message_id': 1, 'date': 0,
+                                          'chat': {'id': 1, 'type': 'private'}, 'text': 'ok'}}).encode()
+
+def run_stub(port: int) -> None:
+    async def handle(request: http_server.Request) -> http_server.Response:
+        body = ME if request.path.endswith('/getMe') else SENT
+        return http_server.Response(200, body, content_type='application/json')
+
+    async def serve() -> None:
+        server = await http_server.start_server(handle, '127.0.0.1', port, reuse_port=True)
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1.0).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+async def fill_outbox(subscribers: int) -> int:
+    recipients = [range(1, subscribers + 1)] * len(REGION_IDS)
+    messages = [(region_id, 'alert', f"🚨 Повітряна тривога в регіоні {region_id}") for region_id in REGION_IDS]
+    return await outbox.enqueue(messages, recipients)
+
+async def wait_until_empty() -> None:
+    while (await db.outbox_status())[0]:
+        await asyncio.sleep(0.05)
+
+async def run_once(subscribers: int, workers: Optional[int], port: int) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, 'bench.db')
+        db.init_db()
+        pool = None
+        if workers:
+            pool = outbox_workers.DeliveryPool(workers)
+            await pool.start()
+        else:
+            bot = Bot(TOKEN, base_url=config.cfg['BOT_API_URL'],
+                      request=HTTPXRequest(connection_pool_size=config.cfg['BROADCAST_CONCURRENCY'] + 2))
+            await bot.initialize()
+            outbox.start(bot)
+
+        # Warm up: let the workers finish starting before the clock runs.
+        await outbox.enqueue([('0', 'alert', 'warm-up')], [range(1, 101)])
+        await wait_until_empty()
+
+        sent_before = metrics.NOTIFICATIONS.value('sent')
+        started = time.perf_counter()
+        queued = await fill_outbox(subscribers)
+        await wait_until_empty()
+        elapsed = time.perf_counter() - started
+
+        if pool:
+            await pool.stop()
+        else:
+            await outbox.stop()
+            await bot.shutdown()
+        sent = metrics.NOTIFICATIONS.value('sent') - sent_before
+        await db.close_db()
+    return {'workers': workers or 0, 'queued': queued, 'sent': int(sent), 'seconds': elapsed}
+
+async def main_async(args: argparse.Namespace, port: int) -> None:
+    for workers in [None] + args.workers:
+        result = await run_once(args.subscribers, workers, port)
+        label = f"{workers} worker process{'es' if workers != 1 else ''}" if workers else "bot process"
+        print(f"{label:<20} {result['sent']:>8} sent in {result['seconds']:7.2f}s  "
+              f"{result['sent'] / result['seconds']:8.0f} msg/s")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=20000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--servers', type=int, default=4, help="Bot API stub processes")
+    parser.add_argument('--concurrency', type=int, default=100, help="sends in flight per process")
+    args = parser.parse_args()
+
+    port = free_port()
+    context = multiprocessing.get_context('spawn')
+    stubs = [context.Process(target=run_stub, args=(port,), daemon=True) for _ in range(args.servers)]
+    for stub in stubs:
+        stub.start()
+    wait_for_port(port)
+
+    config.cfg.update({
+        'BOT_TOKEN': TOKEN,
+        'BOT_API_URL': f'http://127.0.0.1:{port}/bot',
+        'BROADCAST_RATE': 1e9,
+        'BROADCAST_PER_CHAT_INTERVAL': 0.0,
+        'BROADCAST_CONCURRENCY': args.concurrency,
+        'OUTBOX_BATCH_SIZE': 1000,
+    })
+    print(f"{args.subscribers} subscribers x {len(REGION_IDS)} regions, {os.cpu_count()} CPUs")
+    try:
+        asyncio.run(main_async(args, port))
+    finally:
+        for stub in stubs:
+            stub.terminate()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Event-loop latency while 50 concurrent /weather lookups hit a slow upstream.
+
+Runs the weather module against a local stub that answers after a fixed delay
+and measures how late a 10 ms heartbeat task wakes up. Compares the pooled
+async client against the old blocking call pattern.
+
+Usage:
+    python -m benchmarks.bench_http_event_loop [--requests 50] [--delay 0.5]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+from typing import List
+
+import httpx
+
+import config
+import weather
+import http_client
+
+WEATHER_PAYLOAD = json.dumps({
+    'weather': [{'description': 'ясно'}],
+    'main': {'temp': 20.0, 'feels_like': 19.5, 'humidity': 40},
+    'wind': {'speed': 3.0}
+}).encode()
+
+def start_stub_server(delay: float) -> int:
+    """Starts a slow HTTP stub in a background thread and returns its port."""
+    ready = threading.Event()
+    port_holder: List[int] = []
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                if not head:
+                    break
+                await asyncio.sleep(delay)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(WEATHER_PAYLOAD)}\r\n\r\n".encode()
+                    + WEATHER_PAYLOAD
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    def run() -> None:
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(handle, '127.0.0.1', 0))
+        port_holder.append(server.sockets[0].getsockname()[1])
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return port_holder[0]
+
+async def blocking_get_weather(city: str) -> None:
+    # Reproduces the previous implementation: a synchronous call inside a coroutine.
+    response = httpx.get(weather.WEATHER_API_URL, params={'q': city}, timeout=30)
+    response.raise_for_status()
+
+async def measure(fetch, requests_count: int) -> dict:
+    lags: List[float] = []
+    stop = asyncio.Event()
+
+    async def heartbeat() -> None:
+        interval = 0.01
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - started - interval)
+
+    ticker = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(f"city-{i}") for i in range(requests_count)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+
+    lags.sort()
+    return {
+        'wall_s': round(elapsed, 3),
+        'lag_p50_ms': round(statistics.median(lags) * 1000, 2),
+        'lag_p99_ms': round(lags[int(len(lags) * 0.99) - 1] * 1000, 2),
+        'lag_max_ms': round(lags[-1] * 1000, 2),
+    }
+
+async def main_async(args: argparse.Namespace) -> None:
+    port = start_stub_server(args.delay)
+    config.cfg.update({'HTTP_TIMEOUT': 30.0, 'HTTP_PER_HOST_LIMIT': args.requests})
+    weather.WEATHER_API_KEY = 'benchmark-key'
+    weather.WEATHER_API_URL = f"http://127.0.0.1:{port}/data/2.5/weather"
+
+    async def pooled(city: str) -> None:
+        await weather.get_weather(city, force_update=True)
+
+    results = {
+        'blocking': await measure(blocking_get_weather, args.requests),
+        'pooled_async': await measure(pooled, args.requests),
+    }
+    await http_client.close()
+
+    print(f"{args.requests} concurrent /weather calls, upstream delay {args.delay}s")
+    for name, stats in results.items():
+        print(f"  {name:>13}: wall {stats['wall_s']}s, loop lag p50 {stats['lag_p50_ms']} ms, "
+              f"p99 {stats['lag_p99_ms']} ms, max {stats['lag_max_ms']} ms")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.5)
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""
+End-to-end load test of the whole bot.
+
+Runs main.py unmodified in a child process against benchmarks.fake_bot_api,
+which also fakes the alert, weather and currency APIs, and replays mixed
+traffic from simulated users: commands, reply-keyboard menus and inline
+region buttons. Each user sends one update, waits for the bot's first reply
+(sendMessage or answerCallbackQuery), thinks, and sends the next, so load
+grows with --users and drops when the bot slows down.
+
+Reports updates/s offered and answered, latency percentiles from the moment
+an update is queued for getUpdates to the first reply, and error rates:
+"⚠️" error replies, updates never answered within --timeout, throttled
+updates and Bot API calls the fake rejected. The harness and the bot share
+the machine, so give it spare cores when pushing for the ceiling.
+
+Usage:
+    python -m benchmarks.bench_load [--users 2000] [--duration 60] [--warmup 10]
+        [--think 4] [--timeout 10] [--bot-log-level WARNING]
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from benchmarks import fake_bot_api
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = '123456:' + 'A' * 35
+USER_BASE = 100_000
+CITIES = ['Kyiv', 'Київ', 'Lviv', 'Львів', 'Odesa', 'Kharkiv', 'Dnipro', 'Zaporizhzhia', 'Vinnytsia', 'Poltava',
+          'Chernihiv', 'Uzhhorod', 'Ternopil', 'Rivne', 'Lutsk', 'Sumy', 'Kherson', 'Mykolaiv', 'Cherkasy', 'Zhytomyr']
+COMMANDS = ['/help', '/status', '/rates', '/rates EUR', '/convert 100 USD EUR', '/history USD 30d', '/stats',
+            '/stats Київська', '/subscribe', '/subscribe Львівська', '/unsubscribe', '/start']
+# Reply-keyboard buttons per menu and the menu they lead to.
+MENUS = {
+    'main': [("💵 Курс валют", 'currency'), ("☀️ Погода", 'weather'), ("🔔 Тревога", 'air_raid')],
+    'currency': [("🔄 Обновить курс", 'currency'), ("⬅️ Назад", 'main')],
+    'weather': [("🔄 Обновить прогноз", 'weather'), ("⬅️ Назад", 'main')],
+    'air_raid': [("🔄 Обновить статус", 'air_raid'), ("🌍 Выбрать область", 'air_raid'), ("⬅️ Назад", 'main')],
+}
+NOTIFICATION_PREFIXES = ("🚨 УВАГА", "✅ Відбій")
+
+def run_bot(workdir: str, env: Dict[str, str], log_level: str) -> None:
+    """Child process: starts main.py's bot with the upstream APIs pointed at the fake."""
+    os.environ.update(env)
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    # Configured before main is imported, so its basicConfig call is a no-op.
+    logging.basicConfig(format='bot: %(name)s - %(levelname)s - %(message)s', level=log_level)
+    import main
+    import currency
+    import weather
+
+    upstream = env['FAKE_UPSTREAM_URL']
+    weather.WEATHER_API_URL = f"{upstream}/weather"
+    weather.WEATHER_GROUP_URL = f"{upstream}/group"
+    currency.CURRENCY_API_URL = f"{upstream}/currency"
+    main.main()
+
+@dataclass
+class SimulatedUser:
+    """Mirrors the bot's per-user menu state to pick plausible next actions."""
+    user_id: int
+    menu: str = 'main'
+    awaiting_region: bool = False
+    sequence: int = 0
+
+    def next_action(self, rng: random.Random) -> Tuple[str, Dict]:
+        """Returns the traffic kind and the update body of the next action."""
+        self.sequence += 1
+        user = {'id': self.user_id, 'is_bot': False, 'first_name': f"User{self.user_id}"}
+        chat = {'id': self.user_id, 'type': 'private', 'first_name': user['first_name']}
+        if self.awaiting_region:
+            self.awaiting_region = False
+            message = {'message_id': self.sequence, 'date': int(time.time()), 'chat': chat,
+                       'from': {'id': fake_bot_api.BOT_ID, 'is_bot': True, 'first_name': 'Load'}, 'text': 'Оберіть'}
+            return 'callback', {'callback_query': {
+                'id': f"{self.user_id}-{self.sequence}", 'from': user, 'chat_instance': str(self.user_id),
+                'message': message, 'data': f"region:{rng.choice(fake_bot_api.REGION_IDS)}",
+            }}
+
+        roll = rng.random()
+        if roll < 0.35:
+            text = rng.choice(COMMANDS + [f"/weather {rng.choice(CITIES)}"] * 3)
+            kind = 'command'
+            if text == '/start':
+                self.menu = 'main'
+        else:
+            text, self.menu = rng.choice(MENUS[self.menu])
+            kind = 'text'
+            self.awaiting_region = text == "🌍 Выбрать область"
+        message = {'message_id': self.sequence, 'date': int(time.time()), 'chat': chat, 'from': user, 'text': text}
+        if kind == 'command':
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return kind, {'message': message}
+
+@dataclass
+class LoadStats:
+    started: float = 0.0
+    sent: Counter = field(default_factory=Counter)
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    error_replies: Counter = field(default_factory=Counter)
+    throttled: Counter = field(default_factory=Counter)
+    unanswered: Counter = field(default_factory=Counter)
+    notifications: int = 0
+    extra_replies: int = 0
+
+class Harness:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.api = fake_bot_api.FakeBotAPI(on_reply=self.on_reply)
+        self.stats = LoadStats()
+        self.measuring = False
+        # user_id -> future of the first reply to the user's outstanding update.
+        self._waiting: Dict[int, asyncio.Future] = {}
+        # user_id -> kind of the user's latest update.
+        self._kinds: Dict[int, str] = {}
+
+    def on_reply(self, chat_id: int, method: str, text: str) -> None:
+        if text.startswith(NOTIFICATION_PREFIXES):
+            self.stats.notifications += 1
+            return
+        # Errors and throttling count whenever they arrive: a callback is answered before its handler fails.
+        kind = self._kinds.get(chat_id)
+        if self.measuring and kind:
+            if text.startswith("⚠️"):
+                self.stats.error_replies[kind] += 1
+            elif text.startswith("Забагато запитів"):
+                self.stats.throttled[kind] += 1
+        future = self._waiting.pop(chat_id, None)
+        if future is None or future.done():
+            self.stats.extra_replies += 1
+            return
+        future.set_result(time.perf_counter())
+
+    async def user_loop(self, user: SimulatedUser, rng: random.Random, stop_at: float) -> None:
+        think = self.args.think
+        await asyncio.sleep(rng.uniform(0, think))
+        while time.perf_counter() < stop_at:
+            kind, body = user.next_action(rng)
+            future = asyncio.get_running_loop().create_future()
+            self._waiting[user.user_id] = future
+            self._kinds[user.user_id] = kind
+            sent_at = time.perf_counter()
+            self.api.push(body)
+            measured = self.measuring
+            if measured:
+                self.stats.sent[kind] += 1
+            try:
+                replied_at = await asyncio.wait_for(future, self.args.timeout)
+                if measured:
+                    self.stats.latencies[kind].append(replied_at - sent_at)
+            except asyncio.TimeoutError:
+                self._waiting.pop(user.user_id, None)
+                if measured:
+                    self.stats.unanswered[kind] += 1
+            await asyncio.sleep(rng.uniform(think / 2, think * 1.5))
+
+    async def run(self) -> None:
+        args = self.args
+        server, port = await fake_bot_api.serve(self.api, '127.0.0.1', 0)
+        base = f"http://127.0.0.1:{port}"
+        env = {
+            'BOT_TOKEN': TOKEN, 'WEATHER_API_KEY': 'w' * 32, 'UKRAINE_ALARM_TOKEN': 'abcdefgh:' + 'a' * 32,
+            'BOT_API_URL': f"{base}/bot", 'FAKE_UPSTREAM_URL': f"{base}/upstream",
+            'AIR_RAID_API_URL': f"{base}/upstream/alerts", 'AIR_RAID_STATUS_URL': f"{base}/upstream/alerts/status",
+            'REGIONS_API_URL': f"{base}/upstream/regions", 'RUN_MODE': 'polling', 'METRICS_PORT': '0',
+        }
+        with tempfile.TemporaryDirectory() as workdir:
+            bot = multiprocessing.get_context('spawn').Process(target=run_bot, args=(workdir, env, args.bot_log_level))
+            bot.start()
+            try:
+                while not self.api.calls['getUpdates']:
+                    if not bot.is_alive():
+                        raise RuntimeError("The bot exited during startup.")
+                    await asyncio.sleep(0.1)
+                print(f"Bot is polling. {args.users} users, {args.warmup:.0f} s warm-up, {args.duration:.0f} s measured.")
+
+                rng = random.Random(11)
+                stop_at = time.perf_counter() + args.warmup + args.duration
+                users = [
+                    asyncio.create_task(self.user_loop(SimulatedUser(USER_BASE + i), random.Random(rng.random()), stop_at))
+                    for i in range(args.users)
+                ]
+                await asyncio.sleep(args.warmup)
+                self.measuring = True
+                self.stats.started = time.perf_counter()
+                await asyncio.sleep(args.duration)
+                self.measuring = False
+                elapsed = time.perf_counter() - self.stats.started
+                await asyncio.gather(*users)
+            finally:
+                bot.terminate()
+                while bot.is_alive():
+                    await asyncio.sleep(0.1)
+                server.close()
+                await self.api.close()
+        self.report(elapsed)
+
+    def report(self, elapsed: float) -> None:
+        stats = self.stats
+        sent = sum(stats.sent.values())
+        answered = sum(len(values) for values in stats.latencies.values())
+        print(f"updates sent     {sent:>8} ({sent / elapsed:7.1f}/s)")
+        print(f"updates answered {answered:>8} ({answered / elapsed:7.1f}/s)")
+        print(f"\n{'latency (ms)':<12} {'count':>7} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+        kinds = sorted(stats.latencies)
+        for kind, values in [(kind, stats.latencies[kind]) for kind in kinds] + [
+            ('all', [value for kind in kinds for value in stats.latencies[kind]])
+        ]:
+            if not values:
+                continue
+            values = sorted(values)
+            pick = lambda q: values[min(len(values) - 1, int(len(values) * q))] * 1000
+            print(f"{kind:<12} {len(values):>7} {pick(0.5):8.1f} {pick(0.9):8.1f} {pick(0.99):8.1f} {values[-1] * 1000:8.1f}")
+
+        def rate(counter: Counter) -> str:
+            total = sum(counter.values())
+            return f"{total} ({total / sent:.2%})" if sent else "0"
+
+        print(f"\nerror replies    {rate(stats.error_replies)}")
+        print(f"unanswered       {rate(stats.unanswered)}  (within {self.args.timeout:.0f} s)")
+        print(f"throttled        {rate(stats.throttled)}")
+        print(f"API errors       {sum(self.api.errors.values())} {dict(self.api.errors) or ''}")
+        print(f"alert notifications {stats.notifications}, replies after the first {stats.extra_replies}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--duration', type=float, default=60.0)
+    parser.add_argument('--warmup', type=float, default=10.0)
+    parser.add_argument('--think', type=float, default=4.0, help='mean pause between a reply and the next update, s')
+    parser.add_argument('--timeout', type=float, default=10.0, help='an update without a reply by then is unanswered')
+    parser.add_argument('--bot-log-level', default='WARNING')
+    args = parser.parse_args()
+    asyncio.run(Harness(args).run())
+
+if __name__ == '__main__':
+    main()
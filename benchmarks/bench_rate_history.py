@@ -0,0 +1,69 @@
+"""
+Size on disk and query time of the daily rate history.
+
+Writes one snapshot per day for the given number of years and currencies
+(random walks, one append per day as the refresh job does), then times
+HistoryStore.summarize, the work behind /history, for several periods.
+
+Usage:
+    python -m benchmarks.bench_rate_history [--years 5] [--codes 160] [--queries 1000]
+"""
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import List
+
+from rate_history import HistoryStore
+
+def make_codes(count: int) -> List[str]:
+    rng = random.Random(1)
+    codes = {'USD', 'EUR', 'GBP', 'PLN'}
+    while len(codes) < count:
+        codes.add(''.join(rng.choices(string.ascii_uppercase, k=3)))
+    return sorted(codes)[:count]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--codes', type=int, default=160)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    codes = make_codes(args.codes)
+    prices = {code: rng.uniform(0.01, 50.0) for code in codes}
+    today = date(2025, 12, 31)
+    days = args.years * 365
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(tmp)
+        started = time.perf_counter()
+        for offset in range(days, -1, -1):
+            for code in codes:
+                prices[code] *= 1 + rng.gauss(0, 0.005)
+            store.append(today - timedelta(days=offset), prices)
+        append_s = time.perf_counter() - started
+        size = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+        print(f"{args.codes} currencies x {days + 1} days: {size / 1024:.0f} KiB on disk, "
+              f"{append_s / (days + 1) * 1000:.2f} ms per daily snapshot")
+
+        windows = [('30d', 30), ('1y', 365)]
+        if args.years != 1:
+            windows.append((f'{args.years}y', days))
+        for label, period in windows:
+            timings = []
+            for _ in range(args.queries):
+                code = rng.choice(codes)
+                began = time.perf_counter()
+                store.summarize(code, period, today)
+                timings.append(time.perf_counter() - began)
+            timings.sort()
+            print(f"  /history {label:>4}: mean {sum(timings) / len(timings) * 1e6:7.0f} us, "
+                  f"p99 {timings[int(len(timings) * 0.99) - 1] * 1e6:7.0f} us")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Memory and time of one alert tick's delivery plan at 100k subscribers.
+
+Replays what check_air_raid_status does once the changes are known:
+render_tick renders each region once, recipients are frozen per region and
+outbox.enqueue writes one row per recipient to a temporary SQLite database
+in one transaction. Reports peak traced memory, time spent rendering and
+enqueueing, rows written and how much the database file grew.
+
+Usage:
+    python -m benchmarks.bench_render_tick [--subscribers 100000] [--regions 5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+import database as db
+import outbox
+from air_raid import render_tick
+from subscriptions import SubscriptionStore
+
+def make_store(subscribers: int, region_ids: List[str]) -> SubscriptionStore:
+    rng = random.Random(42)
+    store = SubscriptionStore()
+    store.load(
+        (user_id, None if rng.random() < 0.3 else rng.choice(region_ids))
+        for user_id in range(1, subscribers + 1)
+    )
+    return store
+
+def database_size() -> int:
+    return sum(os.path.getsize(path) for path in (db.DB_PATH, db.DB_PATH + '-wal') if os.path.exists(path))
+
+async def measure(store: SubscriptionStore, started: List[Dict]) -> Dict[str, float]:
+    size_before = database_size()
+    tracemalloc.start()
+    began = time.perf_counter()
+    rendered = render_tick(started, [])
+    recipients = store.snapshot_recipients([alert.region_id for alert in rendered])
+    planned = time.perf_counter()
+    queued = await outbox.enqueue([(alert.region_id, alert.kind, alert.text) for alert in rendered], recipients)
+    finished = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'notifications': queued or 0,
+        'peak_kib': peak / 1024,
+        'render_ms': (planned - began) * 1000,
+        'enqueue_ms': (finished - planned) * 1000,
+        'db_kib': (database_size() - size_before) / 1024,
+    }
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=100000)
+    parser.add_argument('--regions', type=int, default=5, help="regions flipping in the tick")
+    args = parser.parse_args()
+
+    region_ids = [str(i) for i in range(1, 26)]
+    store = make_store(args.subscribers, region_ids)
+    started = [
+        {'regionId': region_id, 'regionName': f"Область {region_id}", 'activeAlerts': [{'type': 'AIR'}]}
+        for region_id in region_ids[:args.regions]
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, 'bench.db')
+        db.init_db()
+        print(f"{args.subscribers} subscribers, alert started in {args.regions} regions")
+        stats = await measure(store, started)
+        print(f"  {stats['notifications']} notifications queued, peak {stats['peak_kib']:.0f} KiB, "
+              f"render {stats['render_ms']:.1f} ms, enqueue {stats['enqueue_ms']:.1f} ms, "
+              f"database +{stats['db_kib']:.0f} KiB")
+        await db.close_db()
+
+if __name__ == '__main__':
+    asyncio.run(main())
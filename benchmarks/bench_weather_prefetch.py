@@ -0,0 +1,118 @@
+"""
+/weather cache hit ratio and upstream calls with and without the prefetcher.
+
+Replays a simulated day of requests whose cities follow a Zipf distribution,
+on a simulated clock, against a stub of OpenWeatherMap. "no prefetch" only
+fills the cache on misses; "prefetch" also runs prefetch_weather every
+WEATHER_PREFETCH_INTERVAL seconds within WEATHER_PREFETCH_BUDGET calls per
+hour. Misses are the requests that would have waited for the upstream API.
+
+Usage:
+    python -m benchmarks.bench_weather_prefetch [--cities 500] [--requests-per-hour 3000] [--hours 24]
+        [--budget 60] [--interval 300] [--top 300] [--zipf 1.1]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+from typing import Dict, List
+from unittest.mock import patch
+
+import httpx
+
+import cities
+import config
+import database as db
+import weather
+from cache import AsyncTTLCache
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def city_data(city_id: int) -> Dict:
+    return {
+        'id': city_id, 'name': f"Місто {city_id}", 'weather': [{'description': 'хмарно'}],
+        'main': {'temp': 12.5, 'feels_like': 11.0, 'humidity': 70}, 'wind': {'speed': 3.2}
+    }
+
+class StubWeatherAPI:
+    def __init__(self):
+        self.single_calls = 0
+        self.group_calls = 0
+
+    async def get(self, url: str, params: Dict, **kwargs) -> httpx.Response:
+        request = httpx.Request('GET', url)
+        if url == weather.WEATHER_GROUP_URL:
+            self.group_calls += 1
+            ids = [int(city_id) for city_id in params['id'].split(',')]
+            return httpx.Response(200, json={'cnt': len(ids), 'list': [city_data(i) for i in ids]}, request=request)
+        self.single_calls += 1
+        city_id = int(params['id']) if 'id' in params else int(params['q'].split()[-1])
+        return httpx.Response(200, json=city_data(city_id), request=request)
+
+def zipf_weights(count: int, exponent: float) -> List[float]:
+    return [1.0 / (rank ** exponent) for rank in range(1, count + 1)]
+
+async def simulate(args: argparse.Namespace, prefetch: bool) -> Dict:
+    rng = random.Random(7)
+    clock = SimulatedClock()
+    api = StubWeatherAPI()
+    names = [f"Місто {i}" for i in range(args.cities)]
+    weights = zipf_weights(args.cities, args.zipf)
+    total = int(args.requests_per_hour * args.hours)
+    gap = 3600.0 / args.requests_per_hour
+    next_prefetch = args.interval
+
+    cache = AsyncTTLCache(maxsize=1000, ttl=3600, name='weather', timer=clock)
+    with tempfile.TemporaryDirectory() as tmp, patch.object(weather, 'WEATHER_CACHE', cache), \
+            patch.object(weather, '_popularity', weather.Counter()), \
+            patch.object(cities, 'directory', cities.CityDirectory()), patch.object(weather.http_client, 'get', api.get):
+        db.DB_PATH = os.path.join(tmp, 'bench.db')
+        db.init_db()
+        for city in rng.choices(names, weights, k=total):
+            clock.now += rng.expovariate(1.0 / gap)
+            while prefetch and clock.now >= next_prefetch:
+                await weather.prefetch_weather()
+                next_prefetch += args.interval
+            await weather.get_weather(city)
+        await db.close_db()
+
+    hours = clock.now / 3600
+    return {
+        'hit_ratio': cache.hits / total,
+        'misses': cache.misses,
+        'single_per_hour': api.single_calls / hours,
+        'group_per_hour': api.group_calls / hours,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cities', type=int, default=500)
+    parser.add_argument('--requests-per-hour', type=int, default=3000)
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--budget', type=int, default=60, help="prefetch calls per hour")
+    parser.add_argument('--interval', type=int, default=300, help="seconds between prefetch runs")
+    parser.add_argument('--top', type=int, default=300, help="most requested cities the prefetcher considers")
+    parser.add_argument('--zipf', type=float, default=1.1, help="popularity skew of the cities")
+    args = parser.parse_args()
+
+    config.cfg.update({
+        'WEATHER_API_KEY': 'bench',
+        'WEATHER_PREFETCH_BUDGET': args.budget,
+        'WEATHER_PREFETCH_INTERVAL': args.interval,
+        'WEATHER_PREFETCH_TOP': args.top,
+    })
+    print(f"{args.requests_per_hour} requests/h over {args.cities} cities for {args.hours:g}h, "
+          f"prefetch budget {args.budget} calls/h")
+    for name, prefetch in (('no prefetch', False), ('prefetch', True)):
+        stats = asyncio.run(simulate(args, prefetch))
+        print(f"  {name:>11}: {stats['hit_ratio']:6.1%} hits, {stats['misses']:>6} misses, "
+              f"upstream {stats['single_per_hour']:6.1f} single + {stats['group_per_hour']:5.1f} group calls/h")
+
+if __name__ == '__main__':
+    main()
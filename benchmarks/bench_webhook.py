@@ -0,0 +1,139 @@
+"""
+Load test for the webhook endpoint.
+
+Starts the embedded webhook server on localhost and posts synthetic message
+updates from concurrent keep-alive connections, the way Telegram does. The
+clients write raw HTTP/1.1 so the load generator is not the bottleneck. Updates go
+through secret-token validation, Update.de_json and the bounded update queue,
+and are processed by a handler that only counts them.
+
+Reports accepted and processed updates per second and how many requests were
+answered with 503 because the queue was full.
+
+Usage:
+    python -m benchmarks.bench_webhook [--updates 20000] [--clients 40]
+        [--queue-size 1000] [--handler-delay 0]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from telegram import Update, User
+from telegram.ext import ApplicationBuilder, ContextTypes, ExtBot, TypeHandler
+
+import config
+import webhook
+
+SECRET = 'bench-secret-token-0123456789'
+PATH = '/telegram'
+
+class OfflineBot(ExtBot):
+    """Bot that answers getMe locally so the application can initialize without network access."""
+
+    async def get_me(self, *args, **kwargs) -> User:
+        self._bot_user = User(123456, 'Bench', True, username='bench_bot')
+        return self._bot_user
+
+def synthetic_update(update_id: int) -> bytes:
+    user = {'id': 1000 + update_id % 5000, 'is_bot': False, 'first_name': 'Bench'}
+    return json.dumps({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user['id'], 'type': 'private'},
+            'from': user,
+            'text': '/status',
+        },
+    }).encode()
+
+def post_request(body: bytes) -> bytes:
+    head = (
+        f"POST {PATH} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"{webhook.SECRET_HEADER}: {SECRET}\r\nContent-Length: {len(body)}\r\n\r\n"
+    )
+    return head.encode() + body
+
+async def read_status(reader: asyncio.StreamReader) -> int:
+    head = (await reader.readuntil(b"\r\n\r\n")).decode('latin-1')
+    length = 0
+    for line in head.split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        if name.lower() == 'content-length':
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return int(head.split(" ", 2)[1])
+
+async def run(updates: int, clients: int, queue_size: int, handler_delay: float) -> None:
+    application = (
+        ApplicationBuilder()
+        .bot(OfflineBot('123456:' + 'A' * 35))
+        .updater(None)
+        .update_queue(asyncio.Queue(queue_size))
+        .build()
+    )
+    processed = 0
+
+    async def count(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        nonlocal processed
+        if handler_delay:
+            await asyncio.sleep(handler_delay)
+        processed += 1
+
+    application.add_handler(TypeHandler(Update, count))
+
+    await application.initialize()
+    await application.start()
+    server = await webhook.http_server.start_server(
+        webhook.make_handler(application, PATH, SECRET), '127.0.0.1', 0
+    )
+    port = server.sockets[0].getsockname()[1]
+    statuses = {}
+    next_id = 0
+
+    async def client() -> None:
+        nonlocal next_id
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        while next_id < updates:
+            next_id += 1
+            request = post_request(synthetic_update(next_id))
+            while True:
+                writer.write(request)
+                status = await read_status(reader)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status != 503:
+                    break
+                await asyncio.sleep(0.01)
+        writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    accepted_at = time.perf_counter() - started
+    while processed < statuses.get(200, 0):
+        await asyncio.sleep(0.001)
+    processed_at = time.perf_counter() - started
+
+    server.close()
+    await server.wait_closed()
+    await application.stop()
+    await application.shutdown()
+
+    print(f"{updates} updates, {clients} clients, queue {queue_size}, handler delay {handler_delay * 1000:.1f}ms")
+    print(f"  accepted:  {statuses.get(200, 0) / accepted_at:8.0f} updates/s")
+    print(f"  processed: {processed / processed_at:8.0f} updates/s")
+    print(f"  responses: {dict(sorted(statuses.items()))}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=40)
+    parser.add_argument('--queue-size', type=int, default=1000)
+    parser.add_argument('--handler-delay', type=float, default=0.0, help="Seconds each update takes to handle.")
+    args = parser.parse_args()
+    config.cfg.setdefault('WEBHOOK_SECRET', SECRET)
+    asyncio.run(run(args.updates, args.clients, args.queue_size, args.handler_delay))
+
+if __name__ == '__main__':
+    main()
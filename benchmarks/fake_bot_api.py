@@ -0,0 +1,228 @@
+"""
+Local stand-in for the Telegram Bot API and the bot's upstream APIs.
+
+Serves getMe, getUpdates (long polling), sendMessage and answerCallbackQuery
+under /bot<token>/, so the bot runs unmodified with BOT_API_URL pointing at
+it. Updates are injected with FakeBotAPI.push; every reply is passed to the
+on_reply callback. Under /upstream/ it also serves canned UkraineAlarm,
+OpenWeatherMap and exchange-rate responses, so a load test never leaves the
+machine.
+
+Standalone, it serves an empty update queue for manual runs of main.py
+with the settings below. The weather and currency API URLs are module
+constants; bench_load points them at /upstream/ in the bot process.
+
+Usage:
+    python -m benchmarks.fake_bot_api [--port 8081]
+
+    BOT_API_URL=http://127.0.0.1:8081/bot
+    AIR_RAID_API_URL=http://127.0.0.1:8081/upstream/alerts
+    AIR_RAID_STATUS_URL=http://127.0.0.1:8081/upstream/alerts/status
+    REGIONS_API_URL=http://127.0.0.1:8081/upstream/regions
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import zlib
+from collections import Counter, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import http_server
+
+BOT_ID = 123456
+REGIONS = [
+    "Вінницька область", "Волинська область", "Дніпропетровська область", "Донецька область",
+    "Житомирська область", "Закарпатська область", "Запорізька область", "Івано-Франківська область",
+    "Київська область", "Кіровоградська область", "Луганська область", "Львівська область",
+    "Миколаївська область", "Одеська область", "Полтавська область", "Рівненська область",
+    "Сумська область", "Тернопільська область", "Харківська область", "Херсонська область",
+    "Хмельницька область", "Черкаська область", "Чернівецька область", "Чернігівська область", "м. Київ",
+]
+REGION_IDS = [str(i) for i in range(3, 3 + len(REGIONS))]
+CURRENCIES = ['USD', 'EUR', 'GBP', 'PLN', 'CHF', 'CZK', 'JPY', 'CAD', 'SEK', 'NOK', 'CNY', 'TRY']
+# Alerts change this often, in seconds.
+ALERT_PERIOD = 60
+
+# (chat_id, method, text) of one reply from the bot.
+OnReply = Callable[[int, str, str], None]
+
+def _ok(result) -> http_server.Response:
+    return http_server.Response(200, json.dumps({'ok': True, 'result': result}, ensure_ascii=False).encode(),
+                                content_type='application/json')
+
+def _error(status: int, description: str) -> http_server.Response:
+    body = {'ok': False, 'error_code': status, 'description': description}
+    return http_server.Response(status, json.dumps(body).encode(), content_type='application/json')
+
+def _params(request: http_server.Request) -> Dict[str, str]:
+    """Query string and form or JSON body parameters, as the Bot API accepts them."""
+    params = dict(parse_qsl(urlsplit(request.path).query))
+    if request.body:
+        if request.headers.get('content-type', '').startswith('application/json'):
+            params.update({key: value if isinstance(value, str) else json.dumps(value)
+                           for key, value in json.loads(request.body).items()})
+        else:
+            params.update(parse_qsl(request.body.decode()))
+    return params
+
+class FakeBotAPI:
+    """
+    In-process fake of the Bot API for one bot.
+
+    Pending updates are kept until the bot confirms them with a higher
+    getUpdates offset, like the real API. Requests it does not implement are
+    answered with 404 and counted in errors.
+    """
+
+    def __init__(self, on_reply: Optional[OnReply] = None):
+        self.on_reply = on_reply
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._updates: Deque[Dict] = deque()
+        self._available = asyncio.Event()
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._polls = 0
+        self._closed = False
+
+    def push(self, update: Dict) -> int:
+        """Queues an update for the bot's next getUpdates and returns its update_id."""
+        update_id = self._next_update_id
+        self._next_update_id += 1
+        self._updates.append({'update_id': update_id, **update})
+        self._available.set()
+        return update_id
+
+    async def handle(self, request: http_server.Request) -> http_server.Response:
+        path = urlsplit(request.path).path
+        if path.startswith('/upstream/'):
+            return self._upstream(path[len('/upstream/'):], _params(request))
+        parts = path.strip('/').split('/')
+        if len(parts) != 2 or not parts[0].startswith('bot'):
+            return _error(404, 'Not Found')
+        method = parts[1]
+        self.calls[method] += 1
+        params = _params(request)
+        if method == 'getUpdates':
+            return await self._get_updates(params)
+        if method == 'sendMessage':
+            return self._send_message(params)
+        if method == 'answerCallbackQuery':
+            # Callback query ids are "<user_id>-<n>", so the answer can be matched to the user.
+            user_id = params.get('callback_query_id', '').split('-')[0]
+            if not user_id.isdigit():
+                self.errors[method] += 1
+                return _error(400, 'Bad Request: query is too old or query ID is invalid')
+            self._reply(int(user_id), method, params.get('text', ''))
+            return _ok(True)
+        if method == 'getMe':
+            return _ok({'id': BOT_ID, 'is_bot': True, 'first_name': 'Load', 'username': 'load_test_bot'})
+        if method in ('deleteWebhook', 'close'):
+            return _ok(True)
+        self.errors[method] += 1
+        return _error(404, 'Not Found: method not found')
+
+    async def close(self) -> None:
+        """Ends pending long polls, so no handler is left waiting when the loop stops."""
+        self._closed = True
+        self._available.set()
+        while self._polls:
+            await asyncio.sleep(0.01)
+
+    async def _get_updates(self, params: Dict[str, str]) -> http_server.Response:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout > 0 and not self._closed:
+            self._available.clear()
+            self._polls += 1
+            try:
+                await asyncio.wait_for(self._available.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._polls -= 1
+        batch = [self._updates[i] for i in range(min(limit, len(self._updates)))]
+        return _ok(batch)
+
+    def _send_message(self, params: Dict[str, str]) -> http_server.Response:
+        try:
+            chat_id = int(params['chat_id'])
+        except (KeyError, ValueError):
+            self.errors['sendMessage'] += 1
+            return _error(400, 'Bad Request: chat_id is empty')
+        text = params.get('text', '')
+        self._reply(chat_id, 'sendMessage', text)
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return _ok({'message_id': message_id, 'date': int(time.time()), 'text': text,
+                    'chat': {'id': chat_id, 'type': 'private'},
+                    'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'Load'}})
+
+    def _reply(self, chat_id: int, method: str, text: str) -> None:
+        if self.on_reply is not None:
+            self.on_reply(chat_id, method, text)
+
+    def _upstream(self, name: str, params: Dict[str, str]) -> http_server.Response:
+        if name == 'regions':
+            states = [{'regionId': region_id, 'regionName': region, 'regionType': 'State'}
+                      for region_id, region in zip(REGION_IDS, REGIONS)]
+            return self._json({'states': states})
+        if name == 'alerts/status':
+            return self._json({'lastActionIndex': int(time.time() // ALERT_PERIOD)})
+        if name == 'alerts':
+            return self._json(active_alerts(int(time.time() // ALERT_PERIOD)))
+        if name == 'weather':
+            city = params.get('q') or params.get('id', '')
+            city_id = int(city) if city.isdigit() else zlib.crc32(city.casefold().encode()) % 1_000_000 + 1
+            return self._json(weather(city_id, city if not city.isdigit() else f"City {city_id}"))
+        if name == 'group':
+            ids = [int(city_id) for city_id in params.get('id', '').split(',') if city_id.isdigit()]
+            return self._json({'cnt': len(ids), 'list': [weather(city_id, f"City {city_id}") for city_id in ids]})
+        if name == 'currency':
+            rng = random.Random(int(time.time() // 3600))
+            return self._json({'base': 'UAH', 'rates': {'UAH': 1.0, **{code: rng.uniform(0.01, 0.05) for code in CURRENCIES}}})
+        return _error(404, 'Not Found')
+
+    def _json(self, body) -> http_server.Response:
+        return http_server.Response(200, json.dumps(body, ensure_ascii=False).encode(), content_type='application/json')
+
+def active_alerts(epoch: int) -> List[Dict]:
+    """About a quarter of the regions under alert, changing every ALERT_PERIOD."""
+    rng = random.Random(epoch)
+    return [
+        {'regionId': region_id, 'regionName': region, 'regionType': 'State',
+         'activeAlerts': [{'regionId': region_id, 'type': 'AIR'}] if rng.random() < 0.25 else []}
+        for region_id, region in zip(REGION_IDS, REGIONS)
+    ]
+
+def weather(city_id: int, name: str) -> Dict:
+    temp = city_id % 35 - 5
+    return {'id': city_id, 'name': name, 'weather': [{'description': 'хмарно'}],
+            'main': {'temp': temp, 'feels_like': temp - 2, 'humidity': 60}, 'wind': {'speed': 3.5}}
+
+async def serve(api: FakeBotAPI, host: str, port: int) -> Tuple[asyncio.AbstractServer, int]:
+    """Starts the server. Port 0 picks a free port, which is returned."""
+    server = await http_server.start_server(api.handle, host, port)
+    return server, server.sockets[0].getsockname()[1]
+
+async def main_async(port: int) -> None:
+    api = FakeBotAPI(on_reply=lambda chat_id, method, text: print(f"{method} -> {chat_id}: {text[:60]!r}"))
+    server, port = await serve(api, '127.0.0.1', port)
+    print(f"Fake Bot API listening on http://127.0.0.1:{port}/bot")
+    async with server:
+        await server.serve_forever()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.port))
+
+if __name__ == '__main__':
+    main()
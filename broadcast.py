@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# BadRequest descriptions that mean the chat itself is gone, not that one message was rejected.
+DEAD_CHAT_ERRORS = ('chat not found', 'user is deactivated')
+
+def is_dead_chat(error: TelegramError) -> bool:
+    """Whether Telegram reported the chat as blocked, deleted or missing."""
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and any(reason in error.message.lower() for reason in DEAD_CHAT_ERRORS)
+
+class TokenBucket:
+    """
+    Token bucket that callers wait on before each send.
+
+    Reservations are made synchronously, so the bucket needs no lock and is
+    safe to share between any number of tasks on the loop.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _reserve(self) -> float:
+        now = time.monotonic()
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+        self._tokens -= 1
+        # Tokens are accounted at self._updated, which is in the future while paused.
+        return max(0.0, self._updated - now) + max(0.0, -self._tokens / self.rate)
+
+    async def acquire(self) -> None:
+        while True:
+            paused_until = self._paused_until
+            wait = self._reserve()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+            # A pause that began while waiting voids the reservation, so queue again behind it instead of bursting.
+            if self._paused_until == paused_until:
+                return
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stops handing out tokens for the given time, e.g. after a RetryAfter.
+
+        Callers already waiting take a new reservation, so the outstanding
+        ones are forgiven and sends resume at the bucket's rate.
+        """
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            self._tokens = 0.0
+            self._updated = max(self._updated, until)
+            logger.warning(f"Broadcast paused for {seconds:.1f}s by flood control.")
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in shared memory, so delivery worker
+    processes draw from one global budget and a RetryAfter seen by one of
+    them pauses all of them.
+
+    time.monotonic() is system-wide, so timestamps are comparable between
+    processes. Pass the bucket to the worker processes as a Process argument.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, context: Optional[multiprocessing.context.BaseContext] = None):
+        self.rate = rate
+        self.capacity = capacity
+        context = context or multiprocessing.get_context('spawn')
+        # tokens, updated, paused_until
+        self._state = context.Array('d', [capacity, time.monotonic(), 0.0])
+
+    @property
+    def _paused_until(self) -> float:
+        return self._state[2]
+
+    def _reserve(self) -> float:
+        with self._state.get_lock():
+            tokens, updated, _ = self._state
+            now = time.monotonic()
+            if now > updated:
+                tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+                updated = now
+            tokens -= 1
+            self._state[0], self._state[1] = tokens, updated
+        return max(0.0, updated - now) + max(0.0, -tokens / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        until = time.monotonic() + seconds
+        with self._state.get_lock():
+            if until <= self._state[2]:
+                return
+            self._state[2] = until
+            self._state[0] = 0.0
+            self._state[1] = max(self._state[1], until)
+        logger.warning(f"Broadcast paused for {seconds:.1f}s by flood control.")
+
+@dataclass
+class BroadcastReport:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    blocked: List[int] = field(default_factory=list)
+    duration: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        return self.sent / self.duration if self.duration > 0 else 0.0
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+        return ordered[index]
+
+    def summary(self) -> str:
+        return (
+            f"{self.sent}/{self.total} sent, {self.failed} failed, {len(self.blocked)} blocked, "
+            f"{self.retries} retries in {self.duration:.2f}s ({self.throughput:.1f} msg/s), "
+            f"latency p50 {self.percentile(50):.2f}s p99 {self.percentile(99):.2f}s"
+        )
+
+_bucket: Optional[TokenBucket] = None
+
+def get_bucket() -> TokenBucket:
+    """Returns the process-wide bucket shared by all broadcasts."""
+    global _bucket
+    if _bucket is None:
+        _bucket = TokenBucket(float(config.cfg.get('BROADCAST_RATE', 30.0)))
+    return _bucket
+
+def set_bucket(bucket: Optional[TokenBucket]) -> None:
+    """Replaces the process-wide bucket, e.g. with the delivery pool's shared one. None restores the default."""
+    global _bucket
+    _bucket = bucket
@@ -0,0 +1,167 @@
+import asyncio
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+from cachetools import TTLCache
+
+import metrics
+
+V = TypeVar('V')
+
+class _CountingTTLCache(TTLCache):
+    """TTLCache that counts LRU evictions and TTL expirations and exposes each entry's expiry time."""
+
+    def __init__(self, maxsize: int, ttl: float, timer: Callable[[], float] = time.monotonic):
+        super().__init__(maxsize, ttl, timer)
+        self.evictions = 0
+        self.expirations = 0
+        self.expires: Dict[Hashable, float] = {}
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.expires[key] = self.timer() + self.ttl
+
+    def __delitem__(self, key):
+        self.expires.pop(key, None)
+        super().__delitem__(key)
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        for key, _ in expired:
+            self.expires.pop(key, None)
+        return expired
+
+# Live caches, read by the metrics callbacks at scrape time.
+_caches: 'weakref.WeakSet[AsyncTTLCache]' = weakref.WeakSet()
+
+def _cache_requests() -> Dict[Tuple[str, str], float]:
+    values = {}
+    for cache in _caches:
+        values[(cache.name, 'hit')] = cache.hits
+        values[(cache.name, 'miss')] = cache.misses
+        values[(cache.name, 'coalesced')] = cache.coalesced
+    return values
+
+def _cache_evictions() -> Dict[Tuple[str, str], float]:
+    values = {}
+    for cache in _caches:
+        values[(cache.name, 'lru')] = cache._cache.evictions
+        values[(cache.name, 'ttl')] = cache._cache.expirations
+    return values
+
+CACHE_REQUESTS = metrics.CallbackCounter(
+    'bot_cache_requests_total', "Cache lookups by result.", ['cache', 'result'], callback=_cache_requests
+)
+CACHE_EVICTIONS = metrics.CallbackCounter(
+    'bot_cache_evictions_total', "Entries removed by LRU eviction or TTL expiry.", ['cache', 'reason'],
+    callback=_cache_evictions
+)
+CACHE_SIZE = metrics.Gauge(
+    'bot_cache_entries', "Entries currently cached.", ['cache'],
+    callback=lambda: {(cache.name,): len(cache) for cache in _caches}
+)
+
+class AsyncTTLCache(Generic[V]):
+    """
+    Bounded TTL/LRU cache with single-flight loading.
+
+    Concurrent misses for the same key share one fetch: the first caller
+    starts it and the others await the same task. Failed fetches (None or an
+    exception) are not cached.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str = 'cache', timer: Callable[[], float] = time.monotonic):
+        self.name = name
+        self._cache = _CountingTTLCache(maxsize, ttl, timer)
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        _caches.add(self)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._cache
+
+    def get(self, key: Hashable) -> Optional[V]:
+        value = self._cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V) -> None:
+        self._cache[key] = value
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """Seconds until the entry expires, or None if it is not cached."""
+        if key not in self._cache:
+            return None
+        return self._cache.expires[key] - self._cache.timer()
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Optional[V]]],
+                           force_update: bool = False) -> Optional[V]:
+        """
+        Returns the cached value or loads it with fetch.
+
+        Args:
+            key: Cache key.
+            fetch: Coroutine factory that loads the value, returning None on failure.
+            force_update: Skip the cached value, but still join a fetch already in flight.
+        """
+        if not force_update:
+            value = self.get(key)
+            if value is not None:
+                return value
+
+        return await self._join(key, fetch, store=True)
+
+    async def coalesce(self, key: Hashable, fetch: Callable[[], Awaitable[Optional[V]]]) -> Optional[V]:
+        """
+        Runs fetch once for all concurrent callers with the same key, without caching the result.
+
+        For lookups whose result fetch stores itself under another key.
+        """
+        return await self._join(key, fetch, store=False)
+
+    async def _join(self, key: Hashable, fetch: Callable[[], Awaitable[Optional[V]]], store: bool) -> Optional[V]:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._load(key, fetch, store))
+            self._inflight[key] = task
+        # Shielded so a cancelled caller does not abort the fetch other callers are waiting on.
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, fetch: Callable[[], Awaitable[Optional[V]]], store: bool) -> Optional[V]:
+        try:
+            value = await fetch()
+            if value is not None and store:
+                self._cache[key] = value
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'size': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self._cache.evictions,
+            'expirations': self._cache.expirations,
+        }
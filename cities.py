@@ -0,0 +1,85 @@
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import database as db
+from regions import normalize_name
+
+logger = logging.getLogger(__name__)
+
+# Spellings remembered per city besides its canonical name, so typos that
+# still resolve cannot grow the alias table without bound.
+MAX_ALIASES_PER_CITY = 8
+
+class CityDirectory:
+    """
+    In-memory index of the cities users asked about.
+
+    Maps every normalized spelling seen so far ("kyiv", "київ", "kiev") to
+    one OpenWeatherMap city id, so weather is fetched and cached once per
+    place. Backed by the cities and city_aliases tables.
+    """
+
+    def __init__(self):
+        self._aliases: Dict[str, int] = {}
+        self._names: Dict[int, str] = {}
+        self._counts: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def load(self, rows: Iterable[Tuple[str, int, str]]) -> None:
+        """Replaces the index with (alias, city_id, name) rows."""
+        aliases: Dict[str, int] = {}
+        names: Dict[int, str] = {}
+        for alias, city_id, name in rows:
+            aliases[alias] = city_id
+            names[city_id] = name
+        self._aliases, self._names = aliases, names
+        self._counts = Counter(aliases.values())
+
+    def resolve(self, city: str) -> Optional[int]:
+        return self._aliases.get(normalize_name(city))
+
+    def name(self, city_id: int) -> Optional[str]:
+        return self._names.get(city_id)
+
+    def add(self, city_id: int, name: str, spellings: Iterable[str]) -> List[str]:
+        """
+        Records spellings of a city.
+
+        The canonical name is always recorded; other spellings only while the
+        city has fewer than MAX_ALIASES_PER_CITY aliases.
+
+        Returns:
+            Normalized aliases that were new or pointed to another city.
+        """
+        self._names[city_id] = name
+        canonical = normalize_name(name)
+        added = []
+        for spelling in spellings:
+            alias = normalize_name(spelling)
+            previous = self._aliases.get(alias)
+            if not alias or previous == city_id:
+                continue
+            if alias != canonical and self._counts[city_id] >= MAX_ALIASES_PER_CITY:
+                continue
+            if previous is not None:
+                self._counts[previous] -= 1
+            self._aliases[alias] = city_id
+            self._counts[city_id] += 1
+            added.append(alias)
+        return added
+
+directory = CityDirectory()
+
+async def load() -> None:
+    directory.load(await db.get_city_aliases())
+    logger.info(f"Loaded {len(directory)} known cities.")
+
+async def remember(spelling: str, city_id: int, name: str) -> None:
+    """Maps the user's spelling and the canonical name to city_id, in memory and in the database."""
+    known_name = directory.name(city_id)
+    aliases = directory.add(city_id, name, (spelling, name))
+    if aliases or known_name != name:
+        await db.add_city_aliases(city_id, name, aliases)
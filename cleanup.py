@@ -0,0 +1,90 @@
+import asyncio
+import bisect
+import logging
+from typing import List, Optional
+
+from telegram import Bot
+from telegram.error import TelegramError, RetryAfter, Forbidden, BadRequest
+from telegram.ext import ContextTypes, JobQueue
+
+import config
+import database as db
+import broadcast
+import subscriptions
+
+logger = logging.getLogger(__name__)
+
+CURSOR_KEY = 'cleanup_cursor'
+MAX_ATTEMPTS = 3
+# Seconds after startup at which an interrupted scan is resumed.
+RESUME_DELAY = 60
+
+async def _is_dead(bot: Bot, bucket: broadcast.TokenBucket, user_id: int) -> bool:
+    """Probes a chat. Only chats Telegram reports as blocked or missing count as dead."""
+    for _ in range(MAX_ATTEMPTS):
+        await bucket.acquire()
+        try:
+            await bot.send_chat_action(chat_id=user_id, action='typing')
+            return False
+        except RetryAfter as e:
+            bucket.pause(float(e.retry_after))
+        except (Forbidden, BadRequest) as e:
+            if broadcast.is_dead_chat(e):
+                return True
+            logger.warning(f"Failed to probe subscriber {user_id}: {e}")
+            return False
+        except TelegramError as e:
+            logger.warning(f"Failed to probe subscriber {user_id}: {e}")
+            return False
+    return False
+
+async def cleanup_subscribers(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Removes subscribers who blocked the bot or deleted their account.
+
+    Users are probed in ascending ID order with limited concurrency under the
+    shared broadcast rate limit. Dead users of each batch are deleted in one
+    transaction and the last probed ID is saved, so a restart resumes the
+    scan where it stopped.
+    """
+    concurrency = int(config.cfg.get('CLEANUP_CONCURRENCY', 5))
+    batch_size = int(config.cfg.get('CLEANUP_BATCH_SIZE', 200))
+    bucket = broadcast.get_bucket()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    saved_cursor: Optional[str] = await db.get_state(CURSOR_KEY)
+    users = sorted(subscriptions.store.users())
+    start = bisect.bisect_right(users, int(saved_cursor)) if saved_cursor else 0
+    if start:
+        logger.info(f"Resuming subscriber cleanup after user {saved_cursor}.")
+
+    async def probe(user_id: int) -> Optional[int]:
+        async with semaphore:
+            return user_id if await _is_dead(context.bot, bucket, user_id) else None
+
+    removed_total = 0
+    for offset in range(start, len(users), batch_size):
+        batch: List[int] = users[offset:offset + batch_size]
+        results = await asyncio.gather(*(probe(user_id) for user_id in batch))
+        dead = [user_id for user_id in results if user_id is not None]
+        if dead:
+            await subscriptions.remove_subscribers(dead)
+            removed_total += len(dead)
+            logger.info(f"Removed {len(dead)} inactive subscribers.")
+        await db.set_state(CURSOR_KEY, str(batch[-1]))
+
+    await db.set_state(CURSOR_KEY, None)
+    logger.info(f"Subscriber cleanup finished: {len(users) - start} checked, {removed_total} removed.")
+
+async def schedule_resume(job_queue: JobQueue) -> bool:
+    """
+    Resumes an interrupted scan shortly after startup instead of at the next scheduled run.
+
+    Returns:
+        True if a saved cursor was found and a run was scheduled.
+    """
+    if not await db.get_state(CURSOR_KEY):
+        return False
+    job_queue.run_once(cleanup_subscribers, when=RESUME_DELAY)
+    logger.info(f"Subscriber cleanup was interrupted, resuming in {RESUME_DELAY}s.")
+    return True
@@ -35,16 +35,93 @@ def validate_config(cfg: Dict[str, Any]) -> None:
         errors.append("WEATHER_API_KEY is missing or too short.")
 
     # Validate AIR_RAID_CHECK_INTERVAL
-    interval = cfg.get('AIR_RAID_CHECK_INTERVAL', 90)
-    if not isinstance(interval, int) or interval < 30:
-        cfg['AIR_RAID_CHECK_INTERVAL'] = 90
-        logger.warning("AIR_RAID_CHECK_INTERVAL invalid or too small. Using default: 90.")
-
-    # Validate NOTIFICATION_DELAY
-    delay = cfg.get('NOTIFICATION_DELAY', 0.1)
-    if not isinstance(delay, (int, float)) or delay < 0:
-        cfg['NOTIFICATION_DELAY'] = 0.1
-        logger.warning("NOTIFICATION_DELAY invalid or negative. Using default: 0.1.")
+    interval = cfg.get('AIR_RAID_CHECK_INTERVAL', 15)
+    if not isinstance(interval, int) or interval < 5:
+        cfg['AIR_RAID_CHECK_INTERVAL'] = 15
+        logger.warning("AIR_RAID_CHECK_INTERVAL invalid or too small. Using default: 15.")
+
+    # Validate broadcast limits
+    rate = cfg.get('BROADCAST_RATE', 30.0)
+    if not isinstance(rate, (int, float)) or rate <= 0:
+        cfg['BROADCAST_RATE'] = 30.0
+        logger.warning("BROADCAST_RATE invalid or not positive. Using default: 30.")
+
+    per_chat = cfg.get('BROADCAST_PER_CHAT_INTERVAL', 1.0)
+    if not isinstance(per_chat, (int, float)) or per_chat < 0:
+        cfg['BROADCAST_PER_CHAT_INTERVAL'] = 1.0
+        logger.warning("BROADCAST_PER_CHAT_INTERVAL invalid or negative. Using default: 1.0.")
+
+    # Validate per-user throttling
+    for key, default in (('THROTTLE_RATE', 1.0), ('THROTTLE_DUPLICATE_WINDOW', 2.0), ('FORCE_REFRESH_PER_MINUTE', 30.0)):
+        value = cfg.get(key, default)
+        if not isinstance(value, (int, float)) or value <= 0:
+            cfg[key] = default
+            logger.warning(f"{key} invalid or not positive. Using default: {default}.")
+    burst = cfg.get('THROTTLE_BURST', 5)
+    if not isinstance(burst, int) or burst < 1:
+        cfg['THROTTLE_BURST'] = 5
+        logger.warning("THROTTLE_BURST invalid or too small. Using default: 5.")
+
+    concurrency = cfg.get('BROADCAST_CONCURRENCY', 30)
+    if not isinstance(concurrency, int) or concurrency < 1:
+        cfg['BROADCAST_CONCURRENCY'] = 30
+        logger.warning("BROADCAST_CONCURRENCY invalid or too small. Using default: 30.")
+
+    # Validate HTTP client settings
+    http_defaults = {
+        'HTTP_TIMEOUT': 10.0,
+        'HTTP_CONNECT_TIMEOUT': 5.0,
+        'HTTP_MAX_CONNECTIONS': 100,
+        'HTTP_MAX_KEEPALIVE': 20,
+        'HTTP_PER_HOST_LIMIT': 10
+    }
+    for key, default in http_defaults.items():
+        value = cfg.get(key, default)
+        if not isinstance(value, (int, float)) or value <= 0:
+            cfg[key] = default
+            logger.warning(f"{key} invalid or not positive. Using default: {default}.")
+
+    # Validate cache and cleanup job settings
+    for key, default in (('WEATHER_CACHE_SIZE', 1000), ('WEATHER_CACHE_TTL', 3600), ('WEATHER_NOT_FOUND_TTL', 120),
+                         ('CURRENCY_CACHE_TTL', 86400), ('CURRENCY_REFRESH_INTERVAL', 21600),
+                         ('CLEANUP_CONCURRENCY', 5), ('CLEANUP_BATCH_SIZE', 200),
+                         ('OUTBOX_BATCH_SIZE', 500), ('OUTBOX_MAX_AGE', 3600), ('DELIVERY_WORKERS', 1),
+                         ('PERSISTENCE_INTERVAL', 10), ('WEATHER_PREFETCH_INTERVAL', 300),
+                         ('WEATHER_PREFETCH_TOP', 300), ('ALERT_HISTORY_FLUSH_INTERVAL', 60)):
+        value = cfg.get(key, default)
+        if not isinstance(value, int) or value < 1:
+            cfg[key] = default
+            logger.warning(f"{key} invalid or too small. Using default: {default}.")
+
+    prefetch_budget = cfg.get('WEATHER_PREFETCH_BUDGET', 60)
+    if not isinstance(prefetch_budget, int) or prefetch_budget < 0:
+        cfg['WEATHER_PREFETCH_BUDGET'] = 60
+        logger.warning("WEATHER_PREFETCH_BUDGET invalid or negative. Using default: 60.")
+
+    # Validate run mode and webhook settings
+    if cfg.get('RUN_MODE', 'polling') not in ('polling', 'webhook'):
+        errors.append("RUN_MODE must be 'polling' or 'webhook'.")
+    elif cfg.get('RUN_MODE') == 'webhook':
+        if not str(cfg.get('WEBHOOK_URL', '')).startswith('https://'):
+            errors.append("WEBHOOK_URL must be an https:// URL in webhook mode.")
+        if not re.match(r'^[A-Za-z0-9_-]{16,256}$', cfg.get('WEBHOOK_SECRET', '')):
+            errors.append("WEBHOOK_SECRET must be 16-256 characters of A-Z, a-z, 0-9, _ or - in webhook mode.")
+        if not str(cfg.get('WEBHOOK_PATH', '/telegram')).startswith('/'):
+            errors.append("WEBHOOK_PATH must start with '/'.")
+    for key, default in (('WEBHOOK_PORT', 8443), ('WEBHOOK_QUEUE_SIZE', 1000), ('WEBHOOK_MAX_CONNECTIONS', 40)):
+        value = cfg.get(key, default)
+        if not isinstance(value, int) or value < 1:
+            cfg[key] = default
+            logger.warning(f"{key} invalid or too small. Using default: {default}.")
+    if not 1 <= cfg.get('WEBHOOK_MAX_CONNECTIONS', 40) <= 100:
+        cfg['WEBHOOK_MAX_CONNECTIONS'] = 40
+        logger.warning("WEBHOOK_MAX_CONNECTIONS must be between 1 and 100. Using default: 40.")
+
+    # Validate METRICS_PORT (0 disables the endpoint)
+    metrics_port = cfg.get('METRICS_PORT', 0)
+    if not isinstance(metrics_port, int) or not 0 <= metrics_port <= 65535:
+        cfg['METRICS_PORT'] = 0
+        logger.warning("METRICS_PORT invalid. Metrics endpoint disabled.")
 
     # Validate ADMIN_IDS
     admin_ids = cfg.get('ADMIN_IDS', '')
@@ -69,8 +146,50 @@ def load_config() -> None:
         'WEATHER_API_KEY': {'type': str, 'required': True},
         'UKRAINE_ALARM_TOKEN': {'type': str, 'required': True},
         'AIR_RAID_API_URL': {'type': str, 'required': False, 'default': 'https://api.ukrainealarm.com/api/v3/alerts'},
-        'AIR_RAID_CHECK_INTERVAL': {'type': int, 'required': False, 'default': 90},
-        'NOTIFICATION_DELAY': {'type': float, 'required': False, 'default': 0.1}
+        'AIR_RAID_STATUS_URL': {'type': str, 'required': False,
+                                'default': 'https://api.ukrainealarm.com/api/v3/alerts/status'},
+        'AIR_RAID_CHECK_INTERVAL': {'type': int, 'required': False, 'default': 15},
+        'WEATHER_CACHE_SIZE': {'type': int, 'required': False, 'default': 1000},
+        'WEATHER_CACHE_TTL': {'type': int, 'required': False, 'default': 3600},
+        'WEATHER_NOT_FOUND_TTL': {'type': int, 'required': False, 'default': 120},
+        'WEATHER_PREFETCH_INTERVAL': {'type': int, 'required': False, 'default': 300},
+        'WEATHER_PREFETCH_BUDGET': {'type': int, 'required': False, 'default': 60},
+        'WEATHER_PREFETCH_TOP': {'type': int, 'required': False, 'default': 300},
+        'CURRENCY_CACHE_TTL': {'type': int, 'required': False, 'default': 86400},
+        'CURRENCY_REFRESH_INTERVAL': {'type': int, 'required': False, 'default': 21600},
+        'RATE_HISTORY_DIR': {'type': str, 'required': False, 'default': 'rate_history'},
+        'ALERT_HISTORY_FLUSH_INTERVAL': {'type': int, 'required': False, 'default': 60},
+        'REGIONS_API_URL': {'type': str, 'required': False, 'default': 'https://api.ukrainealarm.com/api/v3/regions'},
+        'REGIONS_REFRESH_INTERVAL': {'type': int, 'required': False, 'default': 21600},
+        'BROADCAST_RATE': {'type': float, 'required': False, 'default': 30.0},
+        'BROADCAST_PER_CHAT_INTERVAL': {'type': float, 'required': False, 'default': 1.0},
+        'BROADCAST_CONCURRENCY': {'type': int, 'required': False, 'default': 30},
+        'THROTTLE_RATE': {'type': float, 'required': False, 'default': 1.0},
+        'THROTTLE_BURST': {'type': int, 'required': False, 'default': 5},
+        'THROTTLE_DUPLICATE_WINDOW': {'type': float, 'required': False, 'default': 2.0},
+        'FORCE_REFRESH_PER_MINUTE': {'type': float, 'required': False, 'default': 30.0},
+        'CLEANUP_CONCURRENCY': {'type': int, 'required': False, 'default': 5},
+        'CLEANUP_BATCH_SIZE': {'type': int, 'required': False, 'default': 200},
+        'OUTBOX_BATCH_SIZE': {'type': int, 'required': False, 'default': 500},
+        'OUTBOX_MAX_AGE': {'type': int, 'required': False, 'default': 3600},
+        'DELIVERY_WORKERS': {'type': int, 'required': False, 'default': 1},
+        'PERSISTENCE_INTERVAL': {'type': int, 'required': False, 'default': 10},
+        'BOT_API_URL': {'type': str, 'required': False, 'default': 'https://api.telegram.org/bot'},
+        'HTTP_TIMEOUT': {'type': float, 'required': False, 'default': 10.0},
+        'HTTP_CONNECT_TIMEOUT': {'type': float, 'required': False, 'default': 5.0},
+        'HTTP_MAX_CONNECTIONS': {'type': int, 'required': False, 'default': 100},
+        'HTTP_MAX_KEEPALIVE': {'type': int, 'required': False, 'default': 20},
+        'HTTP_PER_HOST_LIMIT': {'type': int, 'required': False, 'default': 10},
+        'METRICS_HOST': {'type': str, 'required': False, 'default': '127.0.0.1'},
+        'METRICS_PORT': {'type': int, 'required': False, 'default': 0},
+        'RUN_MODE': {'type': str, 'required': False, 'default': 'polling'},
+        'WEBHOOK_URL': {'type': str, 'required': False, 'default': ''},
+        'WEBHOOK_SECRET': {'type': str, 'required': False, 'default': ''},
+        'WEBHOOK_PATH': {'type': str, 'required': False, 'default': '/telegram'},
+        'WEBHOOK_HOST': {'type': str, 'required': False, 'default': '0.0.0.0'},
+        'WEBHOOK_PORT': {'type': int, 'required': False, 'default': 8443},
+        'WEBHOOK_QUEUE_SIZE': {'type': int, 'required': False, 'default': 1000},
+        'WEBHOOK_MAX_CONNECTIONS': {'type': int, 'required': False, 'default': 40}
     }
 
     for key, info in config_keys_info.items():
@@ -1,6 +1,7 @@
 # tests/conftest.py
 import pytest
 from air_raid import config
+import database as db
 
 @pytest.fixture(autouse=True)
 def mock_config():
@@ -9,4 +10,12 @@ def mock_config():
         'UKRAINE_ALARM_TOKEN': 'mock_token'
     }
     yield
-    config.cfg = {}
\ No newline at end of file
+    config.cfg = {}
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'test.db'))
+    db._executor.submit(db._close_db).result()
+    db.init_db()
+    yield
+    db._executor.submit(db._close_db).result()
@@ -1,8 +1,12 @@
+import asyncio
+import json
 import logging
-from typing import Optional, Dict
+import math
+from typing import Optional, Dict, Any, List, Set, Tuple
 from datetime import datetime
 
-import requests
+import httpx
+import numpy as np
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
@@ -10,51 +14,241 @@ from telegram import helpers
 
 import config
 import database as db
+import http_client
+import rate_history
+import throttle
 
 logger = logging.getLogger(__name__)
 
 CURRENCY_API_URL = "https://api.exchangerate-api.com/v4/latest/UAH"
-CURRENCY_CACHE: Dict[str, dict] = {}
+BASE_CURRENCY = 'UAH'
+STATE_KEY = 'currency_rates'
 
-async def get_currency_rates(force_update: bool = False) -> Optional[Dict[str, float]]:
-    if not force_update and CURRENCY_CACHE and (datetime.now() - CURRENCY_CACHE['timestamp']).total_seconds() < 86400:
-        logger.info("Returning cached currency rates.")
-        return CURRENCY_CACHE['rates']
+# 'rates', their 'table' of cross rates, 'timestamp' of the last successful fetch
+# and 'refresh_failed' after a failed refresh.
+CURRENCY_CACHE: Dict[str, Any] = {}
+CURRENCY_CODES: Set[str] = set()
+_refresh_task: Optional[asyncio.Task] = None
+
+def format_amount(value: float) -> str:
+    """Two decimals for amounts of 1 and more, four significant digits below that."""
+    if value >= 1 or value <= 0:
+        return f"{value:.2f}"
+    return f"{value:.{3 - math.floor(math.log10(value))}f}"
+
+class CrossRates:
+    """
+    Cross rates between every pair of currencies of one rate snapshot.
+
+    Built once per refresh: the matrix is computed in one vectorized step and
+    the rows of the default UAH view are formatted up front, so rendering a
+    user's list only looks rows up. Views in other base currencies are
+    formatted on first use and kept until the next refresh.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        per_base = {code: float(rate) for code, rate in rates.items() if rate and rate > 0}
+        per_base[BASE_CURRENCY] = 1.0
+        self.codes: List[str] = sorted(per_base)
+        self.index: Dict[str, int] = {code: i for i, code in enumerate(self.codes)}
+        vector = np.array([per_base[code] for code in self.codes], dtype=np.float64)
+        # matrix[i, j]: units of codes[j] for one unit of codes[i].
+        self.matrix: np.ndarray = vector[np.newaxis, :] / vector[:, np.newaxis]
+        self._views: Dict[str, Dict[str, str]] = {}
+        self.rows(BASE_CURRENCY)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index
 
+    def rate(self, source: str, target: str) -> Optional[float]:
+        """Units of target for one unit of source, or None if either code is unknown."""
+        i, j = self.index.get(source), self.index.get(target)
+        if i is None or j is None:
+            return None
+        return float(self.matrix[i, j])
+
+    def rows(self, base: str) -> Dict[str, str]:
+        """MarkdownV2 rows "USD: 41\\.23 UAH" of every currency priced in base."""
+        view = self._views.get(base)
+        if view is None:
+            column = self.matrix[:, self.index[base]]
+            suffix = helpers.escape_markdown(base, version=2)
+            view = {
+                code: f"{helpers.escape_markdown(code, version=2)}: "
+                      f"{helpers.escape_markdown(format_amount(value), version=2)} {suffix}\n"
+                for code, value in zip(self.codes, column.tolist())
+            }
+            self._views[base] = view
+        return view
+
+def _store_rates(rates: Dict[str, float], timestamp: datetime) -> None:
+    CURRENCY_CACHE['rates'] = rates
+    CURRENCY_CACHE['table'] = CrossRates(rates)
+    CURRENCY_CACHE['timestamp'] = timestamp
+    CURRENCY_CACHE['refresh_failed'] = False
+    CURRENCY_CODES.clear()
+    CURRENCY_CODES.update(rates)
+
+async def fetch_currency_rates() -> Optional[Dict[str, float]]:
     try:
-        response = requests.get(CURRENCY_API_URL, timeout=10)
+        response = await http_client.get(CURRENCY_API_URL, upstream='currency')
         response.raise_for_status()
-        data = response.json()
-        CURRENCY_CACHE['rates'] = data['rates']
-        CURRENCY_CACHE['timestamp'] = datetime.now()
-        return data['rates']
-    except requests.RequestException as e:
+        return response.json()['rates']
+    except (httpx.HTTPError, ValueError, KeyError) as e:
         logger.error(f"Failed to fetch currency rates: {e}")
         return None
 
+async def refresh_currency_rates(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> bool:
+    """
+    Fetches fresh rates and persists them. Scheduled as a job well before the cache expires.
+
+    Returns:
+        True on success. On failure the previous rates stay in use and are marked stale.
+    """
+    rates = await fetch_currency_rates()
+    if not rates:
+        CURRENCY_CACHE['refresh_failed'] = True
+        return False
+    timestamp = datetime.now()
+    _store_rates(rates, timestamp)
+    await db.set_state(STATE_KEY, json.dumps({'timestamp': timestamp.isoformat(), 'rates': rates}))
+    await rate_history.append(timestamp.date(), {code: rate for code, rate in rates.items() if code != BASE_CURRENCY})
+    logger.info(f"Currency rates refreshed: {len(rates)} codes.")
+    return True
+
+def schedule_refresh() -> None:
+    """Starts a background refresh unless one is already running."""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(refresh_currency_rates())
+
+async def load_currency_rates() -> None:
+    """Restores the last persisted rates so the bot can answer before the first refresh."""
+    raw = await db.get_state(STATE_KEY)
+    if not raw:
+        return
+    try:
+        snapshot = json.loads(raw)
+        _store_rates(snapshot['rates'], datetime.fromisoformat(snapshot['timestamp']))
+        logger.info(f"Restored currency rates from {snapshot['timestamp']}.")
+    except (ValueError, TypeError, KeyError) as e:
+        logger.error(f"Ignoring corrupt currency snapshot: {e}")
+
+def is_stale() -> bool:
+    if not CURRENCY_CACHE.get('rates'):
+        return True
+    age = (datetime.now() - CURRENCY_CACHE['timestamp']).total_seconds()
+    return CURRENCY_CACHE.get('refresh_failed', False) or age >= int(config.cfg.get('CURRENCY_CACHE_TTL', 86400))
+
+async def get_currency_rates(force_update: bool = False) -> Optional[Dict[str, float]]:
+    """
+    Returns the cached rates without waiting on the upstream API.
+
+    An expired cache or force_update starts a background refresh; until it
+    completes the previous rates are served. force_update is ignored once the
+    global cap on forced refreshes is reached.
+    """
+    if force_update and not throttle.allow_refresh('currency'):
+        force_update = False
+    if force_update or is_stale():
+        schedule_refresh()
+    return CURRENCY_CACHE.get('rates')
+
+def stale_note() -> str:
+    if not is_stale():
+        return ""
+    updated = helpers.escape_markdown(CURRENCY_CACHE['timestamp'].strftime('%d.%m %H:%M'), version=2)
+    return f"\n⚠️ _Дані від {updated}, оновлення тимчасово недоступне\\._"
+
 async def get_currency_command(update: Update, context: ContextTypes.DEFAULT_TYPE, force_update: bool = False) -> None:
+    """Shows the user's currencies in UAH, or in the currency given as argument: /rates EUR."""
     user_id = update.effective_user.id
-    rates = await get_currency_rates(force_update)
-    if not rates:
+    if not await get_currency_rates(force_update):
         await update.message.reply_text("Не вдалося отримати курси валют.")
         return
 
-    user_currencies = db.get_user_currencies(user_id) or ['USD', 'EUR']
-    message = "💵 *Курси валют \\(UAH\\):*\n\n"
-    for code in user_currencies:
-        if code in rates:
-            rate = rates[code]
-            rate_str = f"{1/rate:.2f}".replace('.', '\\.')  # Экранируем точку
-            message += f"{helpers.escape_markdown(code, version=2)}: {rate_str} UAH\n"
+    table: CrossRates = CURRENCY_CACHE['table']
+    base = context.args[0].upper() if getattr(context, 'args', None) else BASE_CURRENCY
+    if base not in table:
+        await update.message.reply_text(f"Невідома валюта: {base}.")
+        return
+
+    user_currencies = await db.get_user_currencies(user_id) or ['USD', 'EUR']
+    rows = table.rows(base)
+    message = f"💵 *Курси валют \\({helpers.escape_markdown(base, version=2)}\\):*\n\n"
+    message += "".join(rows[code] for code in user_currencies if code in rows and code != base)
+    message += stale_note()
     await update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN_V2)
 
-def add_currency_code(user_id: int, code: str) -> bool:
-    if len(code) != 3 or not code.isalpha():
-        return False
-    rates = CURRENCY_CACHE.get('rates', {})
-    if code not in rates:
+def parse_conversion(args: List[str]) -> Optional[Tuple[float, str, str]]:
+    """Parses "<amount> <from> [to]" into (amount, source, target); target defaults to UAH."""
+    if len(args) not in (2, 3):
+        return None
+    try:
+        amount = float(args[0].replace(',', '.'))
+    except ValueError:
+        return None
+    if not np.isfinite(amount) or amount < 0:
+        return None
+    target = args[2] if len(args) == 3 else BASE_CURRENCY
+    return amount, args[1].upper(), target.upper()
+
+async def convert_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    parsed = parse_conversion(context.args or [])
+    if parsed is None:
+        await update.message.reply_text("Використання: /convert <сума> <з валюти> [у валюту], наприклад /convert 100 USD EUR")
+        return
+    amount, source, target = parsed
+    if not await get_currency_rates():
+        await update.message.reply_text("Не вдалося отримати курси валют.")
+        return
+
+    table: CrossRates = CURRENCY_CACHE['table']
+    rate = table.rate(source, target)
+    if rate is None:
+        unknown = source if source not in table else target
+        await update.message.reply_text(f"Невідома валюта: {unknown}.")
+        return
+    message = (
+        f"💱 {format_amount(amount)} {source} = {format_amount(amount * rate)} {target}\n"
+        f"1 {source} = {format_amount(rate)} {target}"
+    )
+    if is_stale():
+        message += f"\n⚠️ Дані від {CURRENCY_CACHE['timestamp'].strftime('%d.%m %H:%M')}."
+    await update.message.reply_text(message)
+
+async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/history USD 30d: low, high, change and trend of a currency's UAH price over a period."""
+    args = context.args or []
+    days = rate_history.parse_period(args[1]) if len(args) > 1 else 30
+    if not args or len(args) > 2 or days is None:
+        await update.message.reply_text("Використання: /history <валюта> [період], наприклад /history USD 30d (d, w, m, y)")
+        return
+    code = args[0].upper()
+    if not rate_history.CODE.match(code):
+        await update.message.reply_text(f"Невідома валюта: {code}.")
+        return
+
+    summary = await rate_history.summarize(code, days)
+    if summary is None:
+        await update.message.reply_text(f"Немає історії курсу {code} за {days} дн.")
+        return
+    arrow = "↗" if summary.slope > 0 else "↘" if summary.slope < 0 else "→"
+    await update.message.reply_text(
+        f"📈 {code} за {summary.days} дн. ({summary.points} знімків)\n"
+        f"Зараз: {format_amount(summary.last)} UAH ({summary.change:+.2%})\n"
+        f"Мін: {format_amount(summary.low)} UAH ({summary.low_day:%d.%m.%Y})\n"
+        f"Макс: {format_amount(summary.high)} UAH ({summary.high_day:%d.%m.%Y})\n"
+        f"Тренд: {arrow} {summary.slope:+.4f} UAH/день"
+    )
+
+async def add_currency_code(user_id: int, code: str) -> bool:
+    """Saves a currency for the user. Only codes in the loaded rate table are accepted, so /rates can show them."""
+    code = code.upper()
+    # Before the first successful fetch nothing can be validated, so nothing is accepted.
+    if code not in CURRENCY_CODES:
         return False
-    return db.add_user_currency(user_id, code.upper())
+    return await db.add_user_currency(user_id, code)
 
-def get_user_currencies(user_id: int) -> Optional[list]:
-    return db.get_user_currencies(user_id)
\ No newline at end of file
+async def get_user_currencies(user_id: int) -> Optional[list]:
+    return await db.get_user_currencies(user_id)
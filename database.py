@@ -1,99 +1,512 @@
+import asyncio
 import sqlite3
 import logging
-from typing import List, Tuple, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Sequence, Tuple, Optional
 
 import config
+import metrics
 
 logger = logging.getLogger(__name__)
 
 DB_PATH = config.cfg.get('DB_PATH', 'bot.db')
 
-def init_db() -> None:
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=67108864",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Statements are kept as constants so sqlite3's per-connection statement cache reuses them.
+SQL_ADD_SUBSCRIBER = "INSERT OR IGNORE INTO subscriptions (user_id, region_id) VALUES (?, ?)"
+SQL_REMOVE_SUBSCRIBER = "DELETE FROM subscriptions WHERE user_id = ?"
+SQL_REMOVE_SUBSCRIPTION = "DELETE FROM subscriptions WHERE user_id = ? AND region_id = ?"
+SQL_IS_SUBSCRIBED = "SELECT 1 FROM subscriptions WHERE user_id = ? LIMIT 1"
+SQL_IS_SUBSCRIBED_REGION = "SELECT 1 FROM subscriptions WHERE user_id = ? AND region_id = ? LIMIT 1"
+SQL_GET_SUBSCRIBERS = "SELECT user_id, region_id FROM subscriptions"
+SQL_GET_STATE = "SELECT value FROM bot_state WHERE key = ?"
+SQL_SET_STATE = "INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)"
+SQL_ADD_USER_CURRENCY = "INSERT OR IGNORE INTO user_currencies (user_id, currency_code) VALUES (?, ?)"
+SQL_GET_USER_CURRENCIES = "SELECT currency_code FROM user_currencies WHERE user_id = ?"
+SQL_GET_USER_DATA = "SELECT data FROM user_data WHERE user_id = ?"
+SQL_SET_USER_DATA = "INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)"
+SQL_DELETE_USER_DATA = "DELETE FROM user_data WHERE user_id = ?"
+SQL_GET_CITY_ALIASES = "SELECT a.alias, c.id, c.name FROM city_aliases a JOIN cities c ON c.id = a.city_id"
+SQL_SET_CITY = "INSERT OR REPLACE INTO cities (id, name) VALUES (?, ?)"
+SQL_SET_CITY_ALIAS = "INSERT OR REPLACE INTO city_aliases (alias, city_id) VALUES (?, ?)"
+SQL_ADD_OUTBOX_MESSAGE = "INSERT INTO outbox_messages (region_id, kind, text, created_at) VALUES (?, ?, ?, ?)"
+SQL_ADD_DELIVERY = "INSERT OR IGNORE INTO outbox (chat_id, message_id) VALUES (?, ?)"
+SQL_DELETE_DELIVERY = "DELETE FROM outbox WHERE chat_id = ? AND message_id = ?"
+SQL_DELETE_CHAT_DELIVERIES = "DELETE FROM outbox WHERE chat_id = ?"
+SQL_RESCHEDULE_DELIVERY = "UPDATE outbox SET attempts = attempts + ?, next_attempt = ? WHERE chat_id = ? AND message_id = ?"
+# A chat's messages go out in order, so a delivery waits while an earlier one to the same chat is pending.
+# superseded_by is the chat's next pending message of the opposite kind for the same region, if any.
+SQL_DUE_DELIVERIES = """
+    SELECT o.chat_id, o.message_id, o.attempts, m.text, (
+        SELECT MIN(s.message_id) FROM outbox s JOIN outbox_messages sm ON sm.id = s.message_id
+        WHERE s.chat_id = o.chat_id AND s.message_id > o.message_id AND sm.region_id = m.region_id AND sm.kind != m.kind
+    ), m.created_at FROM outbox o JOIN outbox_messages m ON m.id = o.message_id
+    WHERE o.next_attempt <= ? AND abs(o.chat_id) % ? = ?
+      AND NOT EXISTS (SELECT 1 FROM outbox e WHERE e.chat_id = o.chat_id AND e.message_id < o.message_id)
+    ORDER BY o.message_id LIMIT ?
+"""
+SQL_EXPIRE_DELIVERIES = "DELETE FROM outbox WHERE message_id IN (SELECT id FROM outbox_messages WHERE created_at < ?)"
+SQL_PRUNE_OUTBOX_MESSAGES = (
+    "DELETE FROM outbox_messages WHERE NOT EXISTS (SELECT 1 FROM outbox WHERE outbox.message_id = outbox_messages.id)"
+)
+SQL_ADD_ALERT_INTERVAL = "INSERT INTO alert_intervals (region_id, alert_type, started_at, ended_at) VALUES (?, ?, ?, ?)"
+SQL_ROLLUP_ALERT_INTERVAL = """
+    INSERT INTO alert_rollups (region_id, day, alerts, total, longest) VALUES (?, ?, 1, ?, ?)
+    ON CONFLICT (region_id, day) DO UPDATE SET
+        alerts = alerts + 1, total = total + excluded.total, longest = MAX(longest, excluded.longest)
+"""
+SQL_REGION_ALERT_STATS = "SELECT SUM(alerts), SUM(total), MAX(longest) FROM alert_rollups WHERE region_id = ? AND day >= ?"
+SQL_ALERT_STATS = "SELECT SUM(alerts), SUM(total), MAX(longest) FROM alert_rollups WHERE day >= ?"
+SQL_OUTBOX_SIZE = "SELECT COUNT(*) FROM outbox"
+SQL_NEXT_DELIVERY = "SELECT MIN(next_attempt) FROM outbox"
+
+# A single worker thread owns the connection, so queries never run on the event loop
+# and never contend with each other for it.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+_conn: Optional[sqlite3.Connection] = None
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _conn = conn
+        logger.info(f"Opened database {DB_PATH}.")
+    return _conn
+
+async def _run(func: Callable[..., Any], *args: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_executor, func, *args)
+    finally:
+        metrics.DB_QUERY_LATENCY.observe(time.perf_counter() - started, func.__name__.lstrip('_'))
+
+def _init_db() -> None:
+    conn = _connect()
+    with conn:
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS subscriptions (
                 user_id INTEGER,
                 region_id TEXT,
                 PRIMARY KEY (user_id, region_id)
             )
         """)
-        cursor.execute("""
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS user_currencies (
                 user_id INTEGER,
                 currency_code TEXT,
                 PRIMARY KEY (user_id, currency_code)
             )
         """)
-        conn.commit()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS bot_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_data (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cities (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS city_aliases (
+                alias TEXT PRIMARY KEY,
+                city_id INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox_messages (
+                id INTEGER PRIMARY KEY,
+                region_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                chat_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (chat_id, message_id)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS outbox_by_message ON outbox (message_id, chat_id)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS alert_intervals (
+                id INTEGER PRIMARY KEY,
+                region_id TEXT NOT NULL,
+                alert_type TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                ended_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS alert_intervals_by_region ON alert_intervals (region_id, started_at)")
+        # One row per region and day the alerts started on, kept up to date as intervals are written.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS alert_rollups (
+                region_id TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                alerts INTEGER NOT NULL,
+                total REAL NOT NULL,
+                longest REAL NOT NULL,
+                PRIMARY KEY (region_id, day)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS alert_rollups_by_day ON alert_rollups (day)")
+
+def init_db() -> None:
+    """Creates the schema. Called once at startup, before the event loop runs."""
+    _executor.submit(_init_db).result()
     logger.info("Database initialized successfully.")
 
-def add_subscriber(user_id: int, region_id: Optional[str]) -> bool:
+def _close_db() -> None:
+    global _conn
+    if _conn is not None:
+        _conn.execute("PRAGMA optimize")
+        _conn.close()
+        _conn = None
+
+async def close_db() -> None:
+    await _run(_close_db)
+    logger.info("Database closed.")
+
+def _add_subscriber(user_id: int, region_id: Optional[str]) -> bool:
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("INSERT OR IGNORE INTO subscriptions (user_id, region_id) VALUES (?, ?)", (user_id, region_id))
-            conn.commit()
-            return cursor.rowcount > 0
+        conn = _connect()
+        with conn:
+            cursor = conn.execute(SQL_ADD_SUBSCRIBER, (user_id, region_id))
+        return cursor.rowcount > 0
     except sqlite3.Error as e:
         logger.error(f"Failed to add subscriber {user_id}: {e}")
         return False
 
-def remove_subscriber(user_id: int, region_id: Optional[str] = None) -> bool:
+async def add_subscriber(user_id: int, region_id: Optional[str]) -> bool:
+    return await _run(_add_subscriber, user_id, region_id)
+
+def _remove_subscriber(user_id: int, region_id: Optional[str] = None) -> bool:
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
+        conn = _connect()
+        with conn:
             if region_id is None:
-                cursor.execute("DELETE FROM subscriptions WHERE user_id = ?", (user_id,))
+                cursor = conn.execute(SQL_REMOVE_SUBSCRIBER, (user_id,))
             else:
-                cursor.execute("DELETE FROM subscriptions WHERE user_id = ? AND region_id = ?", (user_id, region_id))
-            conn.commit()
-            return cursor.rowcount > 0
+                cursor = conn.execute(SQL_REMOVE_SUBSCRIPTION, (user_id, region_id))
+        return cursor.rowcount > 0
     except sqlite3.Error as e:
         logger.error(f"Failed to remove subscriber {user_id}: {e}")
         return False
 
-def is_subscribed(user_id: int, region_id: Optional[str] = None) -> bool:
+async def remove_subscriber(user_id: int, region_id: Optional[str] = None) -> bool:
+    return await _run(_remove_subscriber, user_id, region_id)
+
+def _remove_subscribers(user_ids: List[int]) -> int:
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            if region_id is None:
-                cursor.execute("SELECT COUNT(*) FROM subscriptions WHERE user_id = ?", (user_id,))
-            else:
-                cursor.execute("SELECT COUNT(*) FROM subscriptions WHERE user_id = ? AND region_id = ?", (user_id, region_id))
-            return cursor.fetchone()[0] > 0
+        conn = _connect()
+        with conn:
+            cursor = conn.executemany(SQL_REMOVE_SUBSCRIBER, ((user_id,) for user_id in user_ids))
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Failed to remove {len(user_ids)} subscribers: {e}")
+        return 0
+
+async def remove_subscribers(user_ids: List[int]) -> int:
+    """Removes all subscriptions of the given users in one transaction. Returns the number of deleted rows."""
+    return await _run(_remove_subscribers, user_ids)
+
+def _is_subscribed(user_id: int, region_id: Optional[str] = None) -> bool:
+    try:
+        conn = _connect()
+        if region_id is None:
+            row = conn.execute(SQL_IS_SUBSCRIBED, (user_id,)).fetchone()
+        else:
+            row = conn.execute(SQL_IS_SUBSCRIBED_REGION, (user_id, region_id)).fetchone()
+        return row is not None
     except sqlite3.Error as e:
         logger.error(f"Failed to check subscription for {user_id}: {e}")
         return False
 
-def get_subscribers() -> List[Tuple[int, Optional[str]]]:
+async def is_subscribed(user_id: int, region_id: Optional[str] = None) -> bool:
+    return await _run(_is_subscribed, user_id, region_id)
+
+def _get_subscribers() -> List[Tuple[int, Optional[str]]]:
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT user_id, region_id FROM subscriptions")
-            return cursor.fetchall()
+        return _connect().execute(SQL_GET_SUBSCRIBERS).fetchall()
     except sqlite3.Error as e:
         logger.error(f"Failed to get subscribers: {e}")
         return []
 
-def add_user_currency(user_id: int, currency_code: str) -> bool:
+async def get_subscribers() -> List[Tuple[int, Optional[str]]]:
+    return await _run(_get_subscribers)
+
+def _add_user_currency(user_id: int, currency_code: str) -> bool:
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("INSERT OR IGNORE INTO user_currencies (user_id, currency_code) VALUES (?, ?)", 
-                         (user_id, currency_code))
-            conn.commit()
-            return cursor.rowcount > 0
+        conn = _connect()
+        with conn:
+            cursor = conn.execute(SQL_ADD_USER_CURRENCY, (user_id, currency_code))
+        return cursor.rowcount > 0
     except sqlite3.Error as e:
         logger.error(f"Failed to add currency {currency_code} for user {user_id}: {e}")
         return False
 
-def get_user_currencies(user_id: int) -> Optional[List[str]]:
+async def add_user_currency(user_id: int, currency_code: str) -> bool:
+    return await _run(_add_user_currency, user_id, currency_code)
+
+def _get_user_currencies(user_id: int) -> Optional[List[str]]:
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT currency_code FROM user_currencies WHERE user_id = ?", (user_id,))
-            return [row[0] for row in cursor.fetchall()]
+        rows = _connect().execute(SQL_GET_USER_CURRENCIES, (user_id,)).fetchall()
+        return [row[0] for row in rows]
     except sqlite3.Error as e:
         logger.error(f"Failed to get currencies for user {user_id}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+async def get_user_currencies(user_id: int) -> Optional[List[str]]:
+    return await _run(_get_user_currencies, user_id)
+
+def _get_state(key: str) -> Optional[str]:
+    try:
+        row = _connect().execute(SQL_GET_STATE, (key,)).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read state {key}: {e}")
+        return None
+
+async def get_state(key: str) -> Optional[str]:
+    return await _run(_get_state, key)
+
+def _set_state(key: str, value: Optional[str]) -> bool:
+    try:
+        conn = _connect()
+        with conn:
+            conn.execute(SQL_SET_STATE, (key, value))
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Failed to save state {key}: {e}")
+        return False
+
+async def set_state(key: str, value: Optional[str]) -> bool:
+    return await _run(_set_state, key, value)
+
+def _get_user_data(user_id: int) -> Optional[str]:
+    try:
+        row = _connect().execute(SQL_GET_USER_DATA, (user_id,)).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read data of user {user_id}: {e}")
+        return None
+
+async def get_user_data(user_id: int) -> Optional[str]:
+    return await _run(_get_user_data, user_id)
+
+def _save_user_data(users: List[Tuple[int, Optional[str]]], state: List[Tuple[str, str]]) -> bool:
+    try:
+        conn = _connect()
+        with conn:
+            conn.executemany(SQL_SET_USER_DATA, ((user_id, data) for user_id, data in users if data is not None))
+            conn.executemany(SQL_DELETE_USER_DATA, ((user_id,) for user_id, data in users if data is None))
+            conn.executemany(SQL_SET_STATE, state)
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Failed to save data of {len(users)} users: {e}")
+        return False
+
+async def save_user_data(users: List[Tuple[int, Optional[str]]], state: Sequence[Tuple[str, str]] = ()) -> bool:
+    """
+    Writes serialized user data and bot state entries in one transaction.
+
+    Args:
+        users: (user_id, data) pairs; data None deletes the user's row.
+        state: (key, value) pairs for bot_state.
+    """
+    return await _run(_save_user_data, users, list(state))
+
+def _get_city_aliases() -> List[Tuple[str, int, str]]:
+    try:
+        return _connect().execute(SQL_GET_CITY_ALIASES).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read city aliases: {e}")
+        return []
+
+async def get_city_aliases() -> List[Tuple[str, int, str]]:
+    """Returns (alias, city_id, name) rows of all known city spellings."""
+    return await _run(_get_city_aliases)
+
+def _add_city_aliases(city_id: int, name: str, aliases: List[str]) -> bool:
+    try:
+        conn = _connect()
+        with conn:
+            conn.execute(SQL_SET_CITY, (city_id, name))
+            conn.executemany(SQL_SET_CITY_ALIAS, ((alias, city_id) for alias in aliases))
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Failed to save aliases of city {city_id}: {e}")
+        return False
+
+async def add_city_aliases(city_id: int, name: str, aliases: List[str]) -> bool:
+    return await _run(_add_city_aliases, city_id, name, aliases)
+
+def _enqueue_notifications(messages: Sequence[Tuple[str, str, str]], recipients: Sequence[Iterable[int]],
+                           created_at: float) -> Optional[int]:
+    try:
+        conn = _connect()
+        queued = 0
+        with conn:
+            for (region_id, kind, text), chat_ids in zip(messages, recipients):
+                message_id = conn.execute(SQL_ADD_OUTBOX_MESSAGE, (region_id, kind, text, created_at)).lastrowid
+                queued += conn.executemany(SQL_ADD_DELIVERY, ((chat_id, message_id) for chat_id in chat_ids)).rowcount
+        return queued
+    except sqlite3.Error as e:
+        logger.error(f"Failed to enqueue {len(messages)} notifications: {e}")
+        return None
+
+async def enqueue_notifications(messages: Sequence[Tuple[str, str, str]], recipients: Sequence[Iterable[int]],
+                                created_at: float) -> Optional[int]:
+    """
+    Queues one delivery per recipient of each (region_id, kind, text) message in one transaction.
+
+    Returns the count, or None if the transaction failed and nothing was queued.
+    """
+    return await _run(_enqueue_notifications, messages, recipients, created_at)
+
+def _due_notifications(now: float, limit: int,
+                       shard: Tuple[int, int]) -> List[Tuple[int, int, int, str, Optional[int], float]]:
+    index, count = shard
+    try:
+        return _connect().execute(SQL_DUE_DELIVERIES, (now, count, index, limit)).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read the outbox: {e}")
+        return []
+
+async def due_notifications(now: float, limit: int,
+                            shard: Tuple[int, int] = (0, 1)) -> List[Tuple[int, int, int, str, Optional[int], float]]:
+    """
+    Returns up to limit due deliveries, oldest message first, at most one per chat.
+
+    Rows are (chat_id, message_id, attempts, text, superseded_by, created_at). shard is
+    (index, count): only chats with abs(chat_id) % count == index are returned.
+    """
+    return await _run(_due_notifications, now, limit, shard)
+
+def _complete_notifications(done: List[Tuple[int, int]], retry: List[Tuple[int, float, int, int]],
+                            blocked: List[int]) -> int:
+    try:
+        conn = _connect()
+        with conn:
+            removed = conn.executemany(SQL_DELETE_DELIVERY, done).rowcount
+            conn.executemany(SQL_RESCHEDULE_DELIVERY, retry)
+            removed += conn.executemany(SQL_DELETE_CHAT_DELIVERIES, ((chat_id,) for chat_id in blocked)).rowcount
+        return removed
+    except sqlite3.Error as e:
+        logger.error(f"Failed to update {len(done) + len(retry)} outbox entries: {e}")
+        return 0
+
+async def complete_notifications(done: List[Tuple[int, int]], retry: List[Tuple[int, float, int, int]],
+                                 blocked: List[int]) -> int:
+    """
+    Records the outcome of a delivery batch in one transaction.
+
+    Args:
+        done: (chat_id, message_id) deliveries to remove, sent or given up on.
+        retry: (attempts increment, next_attempt, chat_id, message_id) deliveries to reschedule.
+        blocked: Chats whose remaining deliveries are dropped.
+
+    Returns:
+        Number of deliveries removed from the outbox.
+    """
+    return await _run(_complete_notifications, done, retry, blocked)
+
+def _expire_notifications(before: float) -> int:
+    try:
+        conn = _connect()
+        with conn:
+            expired = conn.execute(SQL_EXPIRE_DELIVERIES, (before,)).rowcount
+            conn.execute(SQL_PRUNE_OUTBOX_MESSAGES)
+        return expired
+    except sqlite3.Error as e:
+        logger.error(f"Failed to expire outbox entries: {e}")
+        return 0
+
+async def expire_notifications(before: float) -> int:
+    """Drops deliveries of messages created before the given time. Returns the number dropped."""
+    return await _run(_expire_notifications, before)
+
+def _outbox_status() -> Tuple[int, Optional[float]]:
+    try:
+        conn = _connect()
+        return conn.execute(SQL_OUTBOX_SIZE).fetchone()[0], conn.execute(SQL_NEXT_DELIVERY).fetchone()[0]
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read outbox status: {e}")
+        return 0, None
+
+async def outbox_status() -> Tuple[int, Optional[float]]:
+    """Returns the number of pending deliveries and the earliest next_attempt, or None if the outbox is empty."""
+    return await _run(_outbox_status)
+
+def _add_alert_intervals(intervals: List[Tuple[str, str, float, float, int]]) -> bool:
+    try:
+        conn = _connect()
+        with conn:
+            conn.executemany(SQL_ADD_ALERT_INTERVAL, (interval[:4] for interval in intervals))
+            conn.executemany(SQL_ROLLUP_ALERT_INTERVAL, (
+                (region_id, day, ended_at - started_at, ended_at - started_at)
+                for region_id, _, started_at, ended_at, day in intervals
+            ))
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Failed to save {len(intervals)} alert intervals: {e}")
+        return False
+
+async def add_alert_intervals(intervals: List[Tuple[str, str, float, float, int]]) -> bool:
+    """
+    Writes finished alerts and updates their daily rollups in one transaction.
+
+    Args:
+        intervals: (region_id, alert_type, started_at, ended_at, day) tuples; day
+            is the rollup bucket the alert is counted in.
+    """
+    return await _run(_add_alert_intervals, intervals)
+
+def _alert_stats(region_id: Optional[str], since_days: List[int]) -> List[Tuple[int, float, float]]:
+    try:
+        conn = _connect()
+        stats = []
+        for day in since_days:
+            if region_id is None:
+                alerts, total, longest = conn.execute(SQL_ALERT_STATS, (day,)).fetchone()
+            else:
+                alerts, total, longest = conn.execute(SQL_REGION_ALERT_STATS, (region_id, day)).fetchone()
+            stats.append((alerts or 0, total or 0.0, longest or 0.0))
+        return stats
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read alert statistics: {e}")
+        return []
+
+async def alert_stats(region_id: Optional[str], since_days: Sequence[int]) -> List[Tuple[int, float, float]]:
+    """
+    Sums the daily rollups of a region, or of all regions if region_id is None.
+
+    Returns:
+        (alerts, total seconds, longest seconds) for each first day in since_days,
+        or an empty list on errors.
+    """
+    return await _run(_alert_stats, region_id, list(since_days))
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Any
+from urllib.parse import urlsplit
+
+import httpx
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _reset_for_running_loop() -> None:
+    """
+    Drops the pooled client and host limits if they belong to another event loop.
+
+    httpx connections and asyncio semaphores are bound to the loop they were
+    created in, so a new loop (tests, benchmarks) needs fresh ones.
+    """
+    global _client, _loop
+    loop = asyncio.get_running_loop()
+    if _loop is not loop:
+        _client = None
+        _host_semaphores.clear()
+        _loop = loop
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    _reset_for_running_loop()
+    if _client is None or _client.is_closed:
+        timeout = httpx.Timeout(
+            float(config.cfg.get('HTTP_TIMEOUT', 10.0)),
+            connect=float(config.cfg.get('HTTP_CONNECT_TIMEOUT', 5.0))
+        )
+        limits = httpx.Limits(
+            max_connections=int(config.cfg.get('HTTP_MAX_CONNECTIONS', 100)),
+            max_keepalive_connections=int(config.cfg.get('HTTP_MAX_KEEPALIVE', 20)),
+            keepalive_expiry=30.0
+        )
+        _client = httpx.AsyncClient(timeout=timeout, limits=limits)
+        logger.debug("Created pooled HTTP client.")
+    return _client
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(int(config.cfg.get('HTTP_PER_HOST_LIMIT', 10)))
+        _host_semaphores[host] = semaphore
+    return semaphore
+
+async def get(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+              timeout: Optional[float] = None, upstream: str = 'other') -> httpx.Response:
+    """
+    Performs a GET request through the shared connection pool.
+
+    Args:
+        url: Request URL.
+        params: Query parameters.
+        headers: Request headers.
+        timeout: Overrides the configured total timeout for this request.
+        upstream: Name used to label latency and status metrics.
+
+    Returns:
+        The response. Status codes are not checked here.
+
+    Raises:
+        httpx.HTTPError: On transport errors and timeouts.
+    """
+    client = _get_client()
+    request_timeout = timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+    async with _host_semaphore(url):
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = await client.get(url, params=params, headers=headers, timeout=request_timeout)
+            status = str(response.status_code)
+            return response
+        finally:
+            metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - started, upstream)
+            metrics.UPSTREAM_REQUESTS.inc(upstream, status)
+
+async def close() -> None:
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("HTTP client closed.")
+    _client = None
+    _host_semaphores.clear()
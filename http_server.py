@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+# Seconds a client gets to send a whole request once it has started one.
+READ_TIMEOUT = 10.0
+# Seconds a keep-alive connection may sit idle between requests.
+IDLE_TIMEOUT = 75.0
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed',
+           408: 'Request Timeout', 413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    headers: Dict[str, str]
+    body: bytes = b""
+
+@dataclass
+class Response:
+    status: int = 200
+    body: bytes = b""
+    content_type: str = 'text/plain; charset=utf-8'
+    headers: Dict[str, str] = field(default_factory=dict)
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+async def _read_request(reader: asyncio.StreamReader, first: bytes = b"") -> Request:
+    head = first + await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode('latin-1').split("\r\n")
+    method, path, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY_SIZE:
+        raise OverflowError(length)
+    body = await reader.readexactly(length) if length else b""
+    return Request(method, path, headers, body)
+
+def _encode(response: Response, keep_alive: bool) -> bytes:
+    headers = {
+        'Content-Type': response.content_type,
+        'Content-Length': str(len(response.body)),
+        'Connection': 'keep-alive' if keep_alive else 'close',
+        **response.headers,
+    }
+    head = f"HTTP/1.1 {response.status} {REASONS.get(response.status, '')}\r\n"
+    head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    return head.encode('latin-1') + b"\r\n" + response.body
+
+async def start_server(handler: Handler, host: str, port: int, reuse_port: bool = False,
+                       read_timeout: float = READ_TIMEOUT, idle_timeout: float = IDLE_TIMEOUT) -> asyncio.AbstractServer:
+    """
+    Starts a minimal HTTP/1.1 server with keep-alive support.
+
+    Only what the bot's local endpoints need: Content-Length bodies, no chunked
+    encoding, no TLS (put a reverse proxy in front for public endpoints).
+    Connections idle for idle_timeout are closed, and a request that is not
+    complete read_timeout after its first byte gets 408.
+    """
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    first = await asyncio.wait_for(reader.readexactly(1), idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                try:
+                    request = await asyncio.wait_for(_read_request(reader, first), read_timeout)
+                except asyncio.TimeoutError:
+                    writer.write(_encode(Response(408), keep_alive=False))
+                    break
+                except OverflowError:
+                    writer.write(_encode(Response(413), keep_alive=False))
+                    break
+                except ValueError:
+                    writer.write(_encode(Response(400), keep_alive=False))
+                    break
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                try:
+                    response = await handler(request)
+                except Exception as e:
+                    logger.error(f"Error handling {request.method} {request.path}: {e}", exc_info=True)
+                    response = Response(500)
+                writer.write(_encode(response, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(serve, host, port, reuse_port=reuse_port or None)
+    logger.info(f"HTTP server listening on {host}:{port}.")
+    return server
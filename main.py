@@ -1,7 +1,8 @@
+import asyncio
 import logging
 import traceback
 import sqlite3
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 from dotenv import load_dotenv
 
@@ -14,6 +15,7 @@ from telegram.ext import (
     MessageHandler,
     filters,
     CallbackQueryHandler,
+    TypeHandler,
     Application
 )
 from telegram.constants import ParseMode
@@ -22,31 +24,29 @@ from telegram.error import TelegramError, Forbidden, BadRequest
 import config
 import database as db
 import air_raid
+import alert_history
 import weather
 import currency
+import http_client
+import regions
+import cities
+import subscriptions
+import cleanup
+import outbox
+import outbox_workers
+import metrics
+import throttle
+import webhook
+from persistence import SQLitePersistence
 
 load_dotenv()
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler("bot.log", encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
-logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
-try:
-    config.load_config()
-except ValueError as e:
-    logger.critical(f"Configuration error: {e}")
-    exit(1)
-
-BOT_TOKEN = config.cfg.get('BOT_TOKEN')
-ADMIN_IDS = [int(id_str) for id_str in config.cfg.get('ADMIN_IDS', '').split(',') if id_str.strip().isdigit()]
-AIR_RAID_CHECK_INTERVAL = config.cfg.get('AIR_RAID_CHECK_INTERVAL', 90)
+# Set by init() from the configuration.
+BOT_TOKEN: Optional[str] = None
+ADMIN_IDS: List[int] = []
+AIR_RAID_CHECK_INTERVAL = 15
 
 MAIN_MENU = [
     ["🔔 Тревога", "💵 Курс валют"],
@@ -65,12 +65,6 @@ AIR_RAID_MENU = [
     ["⬅️ Назад"]
 ]
 
-try:
-    db.init_db()
-except sqlite3.Error as e:
-    logger.critical(f"Failed to initialize database: {e}")
-    exit(1)
-
 def require_message(func):
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         if not update.message:
@@ -116,19 +110,25 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "`/help` \\- Допомога\\.\n"
         "`/subscribe` \\- Підписка на тривоги\\.\n"
         "`/unsubscribe` \\- Відписка\\.\n"
-        "`/status` \\- Статус підписки\\."
+        "`/status` \\- Статус підписки\\.\n"
+        "`/rates [валюта]` \\- Курси ваших валют у гривні або в іншій валюті\\.\n"
+        "`/convert <сума> <з> [у]` \\- Конвертація, наприклад `/convert 100 USD EUR`\\.\n"
+        "`/history <валюта> [період]` \\- Історія курсу, наприклад `/history USD 30d`\\.\n"
+        "`/stats [регіон]` \\- Статистика тривог за день, тиждень і місяць\\."
     )
 
     await update.message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN_V2)
 
-async def resolve_region_id(region_name: str) -> Optional[str]:
-    alerts = await air_raid.get_air_raid_status()
-    if not alerts:
+def region_keyboard(action: str) -> Optional[InlineKeyboardMarkup]:
+    region_list = regions.directory.regions()
+    if not region_list:
         return None
-    for region in alerts:
-        if region.get('regionName', '').lower() == region_name.lower():
-            return region.get('regionId')
-    return None
+    keyboard = [
+        [InlineKeyboardButton(name, callback_data=f"{action}:{region_id}")]
+        for region_id, name in region_list
+    ]
+    keyboard.append([InlineKeyboardButton("Всі регіони", callback_data=f"{action}:all")])
+    return InlineKeyboardMarkup(keyboard)
 
 @require_message
 async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -138,29 +138,23 @@ async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     region = " ".join(context.args).strip() if context.args else None
     if region:
-        region_id = await resolve_region_id(region)
+        region_id = regions.directory.resolve(region)
         if not region_id:
             await update.message.reply_text("Регіон не знайдено. Спробуйте ще раз.")
             return
-        if db.is_subscribed(user_id, region_id):
+        region = regions.directory.name(region_id)
+        if subscriptions.is_subscribed(user_id, region_id):
             await update.message.reply_text(f"Ви вже підписані на {region}.")
-        elif db.add_subscriber(user_id, region_id):
+        elif await subscriptions.add_subscriber(user_id, region_id):
             await update.message.reply_text(f"Підписано на {region}.")
         else:
             await update.message.reply_text("Помилка підписки.")
         return
 
-    alerts = await air_raid.get_air_raid_status()
-    if not alerts:
+    reply_markup = region_keyboard("subscribe")
+    if not reply_markup:
         await update.message.reply_text("Не вдалося завантажити список регіонів.")
         return
-
-    keyboard = [
-        [InlineKeyboardButton(region.get('regionName'), callback_data=f"subscribe:{region.get('regionId')}")]
-        for region in sorted(alerts, key=lambda x: x.get('regionName', ''))
-    ]
-    keyboard.append([InlineKeyboardButton("Всі регіони", callback_data="subscribe:all")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text("Оберіть регіон для підписки:", reply_markup=reply_markup)
 
 @require_message
@@ -171,21 +165,22 @@ async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
 
     region = " ".join(context.args).strip() if context.args else None
     if region:
-        region_id = await resolve_region_id(region)
+        region_id = regions.directory.resolve(region)
         if not region_id:
             await update.message.reply_text("Регіон не знайдено.")
             return
-        if not db.is_subscribed(user_id, region_id):
+        region = regions.directory.name(region_id)
+        if not subscriptions.is_subscribed(user_id, region_id):
             await update.message.reply_text(f"Ви не підписані на {region}.")
-        elif db.remove_subscriber(user_id, region_id):
+        elif await subscriptions.remove_subscriber(user_id, region_id):
             await update.message.reply_text(f"Відписано від {region}.")
         else:
             await update.message.reply_text("Помилка відписки.")
         return
 
-    if not db.is_subscribed(user_id):
+    if not subscriptions.is_subscribed(user_id):
         await update.message.reply_text("Ви не підписані.")
-    elif db.remove_subscriber(user_id):
+    elif await subscriptions.remove_subscriber(user_id):
         await update.message.reply_text("Відписано від усіх сповіщень.")
     else:
         await update.message.reply_text("Помилка відписки.")
@@ -196,17 +191,14 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not user_id:
         return
 
-    subscriptions = db.get_subscribers()
-    user_regions = [r for u, r in subscriptions if u == user_id]
+    user_regions = subscriptions.store.user_regions(user_id)
     if not user_regions:
         await update.message.reply_text("Ви не підписані.")
         return
 
-    alerts = await air_raid.get_air_raid_status()
-    region_names = {r.get('regionId'): r.get('regionName') for r in alerts} if alerts else {}
     message = "Ви підписані на:\n"
     for region_id in user_regions:
-        name = region_names.get(region_id, "Всі регіони" if region_id is None else "Невідомий регіон")
+        name = regions.directory.name(region_id) or ("Всі регіони" if region_id is None else "Невідомий регіон")
         message += f"- {name}\n"
     await update.message.reply_text(message)
 
@@ -217,7 +209,7 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await update.message.reply_text("Доступ заборонено.")
         return
 
-    sub_count = len(set(u for u, _ in db.get_subscribers()))
+    sub_count = subscriptions.store.user_count()
     await update.message.reply_text(f"Кількість підписників: {sub_count}")
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -271,16 +263,10 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             if text == "🔄 Обновить статус":
                 await air_raid.alerts_command(update, context)
             elif text == "🌍 Выбрать область":
-                alerts = await air_raid.get_air_raid_status()
-                if not alerts:
+                reply_markup = region_keyboard("region")
+                if not reply_markup:
                     await update.message.reply_text("Не вдалося завантажити список регіонів.")
                     return
-                keyboard = [
-                    [InlineKeyboardButton(region.get('regionName'), callback_data=f"region:{region.get('regionId')}")]
-                    for region in sorted(alerts, key=lambda x: x.get('regionName', ''))
-                ]
-                keyboard.append([InlineKeyboardButton("Всі регіони", callback_data="region:all")])
-                reply_markup = InlineKeyboardMarkup(keyboard)
                 await update.message.reply_text("Оберіть область:", reply_markup=reply_markup)
             elif text == "⬅️ Назад":
                 context.user_data['menu'] = 'main'
@@ -296,7 +282,7 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         elif context.user_data.get('awaiting_currency'):
             currency_code = text.upper()
             context.user_data['awaiting_currency'] = False
-            if currency.add_currency_code(user_id, currency_code):
+            if await currency.add_currency_code(user_id, currency_code):
                 await update.message.reply_text(f"Додано валюту {currency_code}.")
                 await currency.get_currency_command(update, context)
             else:
@@ -314,15 +300,11 @@ async def button_callback(update: telegram.Update, context: ContextTypes.DEFAULT
     try:
         if action == "subscribe":
             region_id = None if data == 'all' else data
-            if db.is_subscribed(user_id, region_id):
+            if subscriptions.is_subscribed(user_id, region_id):
                 await query.message.reply_text("Ви вже підписані на цей регіон.")
                 return
-            if db.add_subscriber(user_id, region_id):
-                alerts = await air_raid.get_air_raid_status()
-                region_name = next(
-                    (r.get('regionName') for r in alerts if r.get('regionId') == region_id),
-                    'всі регіони'
-                ) if alerts else 'всі регіони'
+            if await subscriptions.add_subscriber(user_id, region_id):
+                region_name = regions.directory.name(region_id) or 'всі регіони'
                 await query.message.reply_text(f"Підписано на {region_name}.")
             else:
                 await query.message.reply_text("Помилка підписки.")
@@ -330,11 +312,7 @@ async def button_callback(update: telegram.Update, context: ContextTypes.DEFAULT
         elif action == "region":
             region_id = None if data == 'all' else data
             context.user_data['selected_region'] = region_id
-            alerts = await air_raid.get_air_raid_status()
-            region_name = next(
-                (r.get('regionName') for r in alerts if r.get('regionId') == region_id),
-                'всі регіони'
-            ) if alerts else 'всі регіони'
+            region_name = regions.directory.name(region_id) or 'всі регіони'
             await query.message.reply_text(f"Обрано область: {region_name}. Тривоги будуть відображатися лише для неї.")
             await air_raid.alerts_command(update, context)
     except Exception as e:
@@ -355,28 +333,102 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
         error_message = f"⚠️ Помилка: {str(context.error)}"
         await context.bot.send_message(chat_id=chat_id, text=error_message)
 
-async def cleanup_subscribers(context: ContextTypes.DEFAULT_TYPE) -> None:
-    subscribers = db.get_subscribers()
-    for user_id, _ in set((u, r) for u, r in subscribers):
-        try:
-            await context.bot.send_chat_action(chat_id=user_id, action='typing')
-        except telegram.error.Forbidden:
-            db.remove_subscriber(user_id)
-            logger.info(f"Removed inactive subscriber {user_id}")
+async def post_init(application: Application) -> None:
+    await subscriptions.load()
+    await air_raid.load_alert_snapshot(application.bot_data)
+    await air_raid.refresh_regions()
+    await cities.load()
+    await currency.load_currency_rates()
+    if application.job_queue:
+        await cleanup.schedule_resume(application.job_queue)
+    await metrics.start_server()
+    delivery_workers = int(config.cfg.get('DELIVERY_WORKERS', 1))
+    if delivery_workers > 1:
+        await outbox_workers.start(delivery_workers)
+    else:
+        outbox.start(application.bot)
+
+async def post_shutdown(application: Application) -> None:
+    await alert_history.flush()
+    await outbox.stop()
+    await outbox_workers.stop()
+    await metrics.stop_server()
+    await http_client.close()
+    await db.close_db()
+
+# Only the update types the registered handlers consume.
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+def init() -> None:
+    """
+    Sets up logging, configuration and the database.
+
+    Runs from main() rather than at import time: delivery worker processes
+    are spawned and re-import this module, and must not open bot.log, load
+    the configuration or the database before applying their own settings.
+    """
+    global BOT_TOKEN, ADMIN_IDS, AIR_RAID_CHECK_INTERVAL
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO,
+        handlers=[
+            logging.FileHandler("bot.log", encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    try:
+        config.load_config()
+    except ValueError as e:
+        logger.critical(f"Configuration error: {e}")
+        exit(1)
+
+    BOT_TOKEN = config.cfg.get('BOT_TOKEN')
+    ADMIN_IDS = [int(id_str) for id_str in config.cfg.get('ADMIN_IDS', '').split(',') if id_str.strip().isdigit()]
+    AIR_RAID_CHECK_INTERVAL = config.cfg.get('AIR_RAID_CHECK_INTERVAL', 15)
+
+    try:
+        db.init_db()
+    except sqlite3.Error as e:
+        logger.critical(f"Failed to initialize database: {e}")
+        exit(1)
 
 def main():
+    init()
     logger.info("Starting bot...")
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
-
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("subscribe", subscribe))
-    application.add_handler(CommandHandler("unsubscribe", unsubscribe))
-    application.add_handler(CommandHandler("status", status))
-    application.add_handler(CommandHandler("admin", admin_command))
-    application.add_handler(CommandHandler("weather", weather.get_weather_command))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_message))
-    application.add_handler(CallbackQueryHandler(button_callback))
+    run_mode = config.cfg.get('RUN_MODE', 'polling')
+    # The default pool of one connection would serialize concurrent broadcasts.
+    pool_size = int(config.cfg.get('BROADCAST_CONCURRENCY', 30)) + 8
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .base_url(config.cfg.get('BOT_API_URL', 'https://api.telegram.org/bot'))
+        .connection_pool_size(pool_size)
+        .persistence(SQLitePersistence(update_interval=int(config.cfg.get('PERSISTENCE_INTERVAL', 10))))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if run_mode == 'webhook':
+        builder = builder.updater(None).update_queue(asyncio.Queue(int(config.cfg.get('WEBHOOK_QUEUE_SIZE', 1000))))
+    application = builder.build()
+
+    track = metrics.track_handler
+    # Group -1 runs before the handlers below and can stop an update from reaching them.
+    application.add_handler(TypeHandler(Update, throttle.guard), group=-1)
+    application.add_handler(CommandHandler("start", track("start", start)))
+    application.add_handler(CommandHandler("help", track("help", help_command)))
+    application.add_handler(CommandHandler("subscribe", track("subscribe", subscribe)))
+    application.add_handler(CommandHandler("unsubscribe", track("unsubscribe", unsubscribe)))
+    application.add_handler(CommandHandler("status", track("status", status)))
+    application.add_handler(CommandHandler("admin", track("admin", admin_command)))
+    application.add_handler(CommandHandler("weather", track("weather", weather.get_weather_command)))
+    application.add_handler(CommandHandler("rates", track("rates", currency.get_currency_command)))
+    application.add_handler(CommandHandler("convert", track("convert", currency.convert_command)))
+    application.add_handler(CommandHandler("history", track("history", currency.history_command)))
+    application.add_handler(CommandHandler("stats", track("stats", air_raid.stats_command)))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, track("text", handle_text_message)))
+    application.add_handler(CallbackQueryHandler(track("callback", button_callback)))
     application.add_error_handler(error_handler)
 
     job_queue = application.job_queue
@@ -384,16 +436,29 @@ def main():
         try:
             interval = int(AIR_RAID_CHECK_INTERVAL)
             if interval <= 0:
-                interval = 90
-                logger.warning("Invalid AIR_RAID_CHECK_INTERVAL. Using default: 90.")
+                interval = 15
+                logger.warning("Invalid AIR_RAID_CHECK_INTERVAL. Using default: 15.")
             job_queue.run_repeating(air_raid.check_air_raid_status, interval=interval, first=10)
-            job_queue.run_repeating(cleanup_subscribers, interval=604800, first=86400)
+            history_interval = int(config.cfg.get('ALERT_HISTORY_FLUSH_INTERVAL', 60))
+            job_queue.run_repeating(alert_history.flush, interval=history_interval, first=history_interval)
+            job_queue.run_repeating(cleanup.cleanup_subscribers, interval=604800, first=86400)
+            job_queue.run_repeating(subscriptions.verify_consistency, interval=86400, first=3600)
+            currency_interval = int(config.cfg.get('CURRENCY_REFRESH_INTERVAL', 21600))
+            job_queue.run_repeating(currency.refresh_currency_rates, interval=currency_interval, first=1)
+            regions_interval = int(config.cfg.get('REGIONS_REFRESH_INTERVAL', 21600))
+            job_queue.run_repeating(air_raid.refresh_regions, interval=regions_interval, first=regions_interval)
+            if int(config.cfg.get('WEATHER_PREFETCH_BUDGET', 60)) > 0:
+                prefetch_interval = int(config.cfg.get('WEATHER_PREFETCH_INTERVAL', 300))
+                job_queue.run_repeating(weather.prefetch_weather, interval=prefetch_interval, first=prefetch_interval)
         except (ValueError, TypeError):
-            logger.error("Invalid AIR_RAID_CHECK_INTERVAL. Using default: 90.")
-            job_queue.run_repeating(air_raid.check_air_raid_status, interval=90, first=10)
+            logger.error("Invalid AIR_RAID_CHECK_INTERVAL. Using default: 15.")
+            job_queue.run_repeating(air_raid.check_air_raid_status, interval=15, first=10)
 
-    logger.info("Bot is running...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if run_mode == 'webhook':
+        asyncio.run(webhook.serve(application, ALLOWED_UPDATES))
+    else:
+        logger.info("Bot is running...")
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,203 @@
+import bisect
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import config
+import http_server
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _labels_dict(self, values: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterator[Sample]:
+        for labels, value in self._values.items():
+            yield self.name, self._labels_dict(labels), value
+
+class Gauge(_Metric):
+    """Gauge that is either set directly or read from a callback at scrape time."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterator[Sample]:
+        values = self._callback() if self._callback else self._values
+        for labels, value in values.items():
+            yield self.name, self._labels_dict(labels), value
+
+class CallbackCounter(Gauge):
+    """Counter whose values are kept elsewhere, e.g. cache statistics."""
+
+    kind = 'counter'
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: bucket counts (non-cumulative, last one is +Inf), sum, count.
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0, 0.0])
+        counts, totals = entry
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        totals[0] += value
+        totals[1] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return int(entry[1][1]) if entry else 0
+
+    def samples(self) -> Iterator[Sample]:
+        for labels, (counts, (total, count)) in self._values.items():
+            base = self._labels_dict(labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**base, 'le': _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", base, total
+            yield f"{self.name}_count", base, count
+
+REGISTRY: List[_Metric] = []
+
+HANDLER_LATENCY = Histogram('bot_handler_duration_seconds', "Time spent in update handlers.", ['handler'])
+HANDLER_ERRORS = Counter('bot_handler_errors_total', "Handler calls that raised.", ['handler'])
+UPSTREAM_LATENCY = Histogram('bot_upstream_request_duration_seconds', "Upstream API call latency.", ['upstream'])
+UPSTREAM_REQUESTS = Counter('bot_upstream_requests_total', "Upstream API calls by status code.", ['upstream', 'status'])
+DB_QUERY_LATENCY = Histogram(
+    'bot_db_query_duration_seconds', "SQLite query time including the worker thread hop.", ['query'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+ALERT_TICK_DURATION = Histogram(
+    'bot_alert_tick_duration_seconds', "Duration of one air raid status check: poll, diff and enqueue, excluding delivery by the outbox.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+)
+NOTIFICATION_BACKLOG = Gauge('bot_notification_backlog', "Alert notifications waiting to be sent.")
+NOTIFICATIONS = Counter('bot_notifications_total', "Alert notifications by outcome.", ['result'])
+THROTTLED_UPDATES = Counter('bot_throttled_updates_total', "Updates dropped before the handlers, by reason.", ['reason'])
+FORCE_REFRESHES = Counter('bot_force_refreshes_total', "Forced cache refreshes by upstream and outcome.", ['upstream', 'result'])
+
+def track_handler(name: str, callback: Callable) -> Callable:
+    """Wraps a handler callback to record its latency and errors under the given name."""
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, name)
+    return wrapper
+
+def render() -> str:
+    """Renders all metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+async def _handle(request: http_server.Request) -> http_server.Response:
+    if request.path.split("?", 1)[0] != '/metrics':
+        return http_server.Response(404, b"Not Found\n")
+    if request.method != 'GET':
+        return http_server.Response(405)
+    return http_server.Response(200, render().encode(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+_server = None
+
+async def start_server() -> None:
+    global _server
+    port = int(config.cfg.get('METRICS_PORT', 0))
+    if not port:
+        logger.info("Metrics endpoint disabled.")
+        return
+    _server = await http_server.start_server(_handle, config.cfg.get('METRICS_HOST', '127.0.0.1'), port)
+
+async def stop_server() -> None:
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from telegram import Bot
+from telegram.error import TelegramError, RetryAfter, Forbidden, BadRequest
+
+import config
+import database as db
+import metrics
+import subscriptions
+from broadcast import BroadcastReport, TokenBucket, get_bucket, is_dead_chat
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+RETRY_BASE = 2.0
+RETRY_MAX = 300.0
+
+_wakeup: Optional[asyncio.Event] = None
+_worker: Optional[asyncio.Task] = None
+
+@dataclass
+class BatchResult:
+    """Outcome of one delivery batch. Picklable, so worker processes can send it to the bot process."""
+    removed: int = 0
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    collapsed: int = 0
+    expired: int = 0
+    blocked: List[int] = field(default_factory=list)
+
+async def apply_batch(result: BatchResult) -> None:
+    """Updates metrics and unsubscribes blocked chats after a batch."""
+    metrics.NOTIFICATION_BACKLOG.dec(amount=result.removed)
+    metrics.NOTIFICATIONS.inc('sent', amount=result.sent)
+    metrics.NOTIFICATIONS.inc('failed', amount=result.failed)
+    metrics.NOTIFICATIONS.inc('retried', amount=result.retried)
+    metrics.NOTIFICATIONS.inc('collapsed', amount=result.collapsed)
+    metrics.NOTIFICATIONS.inc('expired', amount=result.expired)
+    if result.blocked:
+        await subscriptions.remove_subscribers(result.blocked)
+
+def _get_wakeup() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff for a delivery that already failed the given number of times."""
+    return min(RETRY_BASE * 2 ** attempts, RETRY_MAX)
+
+async def enqueue(messages: Sequence[Tuple[str, str, str]], recipients: Sequence[Iterable[int]]) -> Optional[int]:
+    """
+    Persists (region_id, kind, text) messages for their recipients and wakes the delivery worker.
+
+    Returns:
+        Number of deliveries queued, or None if they could not be stored.
+    """
+    queued = await db.enqueue_notifications(messages, recipients, time.time())
+    if queued is None:
+        return None
+    metrics.NOTIFICATION_BACKLOG.inc(amount=queued)
+    _get_wakeup().set()
+    return queued
+
+async def _attempt(bot: Bot, bucket: TokenBucket, chat_id: int, text: str, parse_mode: Optional[str],
+                   attempts: int, report: BroadcastReport) -> Optional[Tuple[int, float]]:
+    """
+    Sends one delivery once.
+
+    Returns:
+        None when the delivery is finished (sent or given up), otherwise the
+        (attempts increment, delay) to reschedule it with.
+    """
+    await bucket.acquire()
+    try:
+        await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+        report.sent += 1
+        return None
+    except RetryAfter as e:
+        # Flood control is not the chat's fault, so it does not use up an attempt.
+        report.retries += 1
+        bucket.pause(float(e.retry_after))
+        return 0, float(e.retry_after)
+    except (Forbidden, BadRequest) as e:
+        report.failed += 1
+        if is_dead_chat(e):
+            logger.info(f"Chat {chat_id} is unreachable: {e}")
+            report.blocked.append(chat_id)
+        else:
+            # Only this message was rejected; retrying it would fail the same way.
+            logger.error(f"Notification to {chat_id} was rejected: {e}")
+        return None
+    except TelegramError as e:
+        if attempts + 1 >= MAX_ATTEMPTS:
+            logger.error(f"Giving up on notification to {chat_id} after {attempts + 1} attempts: {e}")
+            report.failed += 1
+            return None
+        logger.warning(f"Failed to notify {chat_id} (attempt {attempts + 1}): {e}")
+        report.retries += 1
+        return 1, retry_delay(attempts)
+
+async def drain(bot: Bot, parse_mode: Optional[str] = 'Markdown', bucket: Optional[TokenBucket] = None,
+                shard: Tuple[int, int] = (0, 1),
+                on_batch: Optional[Callable[[BatchResult], Awaitable[None]]] = None) -> BroadcastReport:
+    """
+    Delivers everything in the outbox that is due, batch by batch.
+
+    Each batch is sent concurrently under the shared rate limit and its
+    outcome is committed in one transaction, so after a crash at most one
+    batch is sent again. Failed deliveries are rescheduled with exponential
+    backoff; RetryAfter pauses the bucket and reschedules after the given time.
+
+    Args:
+        bot: Bot used for sending.
+        parse_mode: Parse mode for all messages.
+        bucket: Rate limiter, defaults to the process-wide one.
+        shard: (index, count) of the chats this caller delivers to.
+        on_batch: Called with each batch's outcome, defaults to apply_batch.
+
+    Returns:
+        Report covering all batches.
+    """
+    bucket = bucket or get_bucket()
+    on_batch = on_batch or apply_batch
+    batch_size = int(config.cfg.get('OUTBOX_BATCH_SIZE', 500))
+    concurrency = int(config.cfg.get('BROADCAST_CONCURRENCY', 30))
+    per_chat_interval = float(config.cfg.get('BROADCAST_PER_CHAT_INTERVAL', 1.0))
+    max_age = int(config.cfg.get('OUTBOX_MAX_AGE', 3600))
+
+    report = BroadcastReport()
+    started = time.monotonic()
+    expired = await db.expire_notifications(time.time() - max_age)
+    if expired:
+        logger.warning(f"Dropped {expired} notifications older than {max_age}s.")
+        await on_batch(BatchResult(removed=expired, expired=expired))
+
+    # Send times of the previous and the current batch; a chat's next message is in a later batch.
+    previous: Dict[int, float] = {}
+    while True:
+        batch = await db.due_notifications(time.time(), batch_size, shard)
+        if not batch:
+            break
+        report.total += len(batch)
+        current: Dict[int, float] = {}
+        done: List[Tuple[int, int]] = []
+        retry: List[Tuple[int, float, int, int]] = []
+        sent_before, failed_before, blocked_before = report.sent, report.failed, len(report.blocked)
+        collapsed = 0
+        rows: Iterator[Tuple[int, int, int, str, Optional[int], float]] = iter(batch)
+
+        async def worker() -> None:
+            nonlocal collapsed
+            for chat_id, message_id, attempts, text, superseded_by, created_at in rows:
+                if superseded_by is not None:
+                    # The region changed back before this chat was notified; neither message is news any more.
+                    done.extend(((chat_id, message_id), (chat_id, superseded_by)))
+                    collapsed += 2
+                    continue
+                wait = previous.get(chat_id, 0.0) + per_chat_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                outcome = await _attempt(bot, bucket, chat_id, text, parse_mode, attempts, report)
+                current[chat_id] = time.monotonic()
+                if outcome is None:
+                    done.append((chat_id, message_id))
+                    # Measured from enqueue, so time spent waiting in the outbox counts.
+                    report.latencies.append(time.time() - created_at)
+                else:
+                    increment, delay = outcome
+                    retry.append((increment, time.time() + delay, chat_id, message_id))
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(concurrency, len(batch)))))
+        finally:
+            blocked = report.blocked[blocked_before:]
+            removed = await db.complete_notifications(done, retry, blocked)
+        await on_batch(BatchResult(
+            removed=removed, sent=report.sent - sent_before, failed=report.failed - failed_before,
+            retried=len(retry), collapsed=collapsed, blocked=blocked
+        ))
+        previous = current
+
+    report.duration = time.monotonic() - started
+    return report
+
+async def run_worker(bot: Bot) -> None:
+    """Drains the outbox whenever something is enqueued or a retry becomes due."""
+    wakeup = _get_wakeup()
+    pending, _ = await db.outbox_status()
+    metrics.NOTIFICATION_BACKLOG.inc(amount=pending)
+    if pending:
+        logger.info(f"Resuming delivery of {pending} queued notifications.")
+    while True:
+        wakeup.clear()
+        try:
+            report = await drain(bot)
+            if report.total:
+                logger.info(f"Outbox delivery: {report.summary()}")
+        except Exception as e:
+            logger.error(f"Outbox delivery failed: {e}", exc_info=True)
+        _, next_attempt = await db.outbox_status()
+        timeout = None if next_attempt is None else max(1.0, next_attempt - time.time())
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+def start(bot: Bot) -> None:
+    global _worker
+    if _worker is None or _worker.done():
+        _worker = asyncio.create_task(run_worker(bot))
+
+async def stop() -> None:
+    global _worker
+    if _worker is not None:
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+        _worker = None
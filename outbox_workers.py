@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+import config
+import database as db
+import metrics
+import outbox
+import broadcast
+from broadcast import SharedTokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Worker processes are spawned, not forked: a forked child would inherit the
+# parent's SQLite connection and the database thread's locks.
+_context = multiprocessing.get_context('spawn')
+
+class DeliveryPool:
+    """
+    Delivers the outbox from several processes, each owning the chats with
+    abs(chat_id) % workers == index.
+
+    The outbox table is the queue: the alert tick keeps enqueueing into it and
+    the pool only forwards wake-ups to the workers. Workers share one
+    SharedTokenBucket and send their batch results back, so metrics and
+    unsubscribing blocked chats stay in the bot process. While the pool runs,
+    the shared bucket is also the bot process's bucket, so the subscriber
+    cleanup's probes count against the same global rate.
+    """
+
+    def __init__(self, workers: int, settings: Optional[Dict[str, Any]] = None):
+        self.workers = workers
+        self.settings = dict(settings if settings is not None else config.cfg)
+        self.bucket = SharedTokenBucket(float(self.settings.get('BROADCAST_RATE', 30.0)), context=_context)
+        self.results = _context.Queue()
+        self.stopping = _context.Event()
+        self._wakeups = [_context.Event() for _ in range(workers)]
+        self._processes: List[multiprocessing.Process] = []
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        pending, _ = await db.outbox_status()
+        metrics.NOTIFICATION_BACKLOG.inc(amount=pending)
+        broadcast.set_bucket(self.bucket)
+        for index, wakeup in enumerate(self._wakeups):
+            process = _context.Process(
+                target=run_worker_process, name=f'outbox-{index}',
+                args=(index, self.workers, self.settings, db.DB_PATH, self.bucket, wakeup, self.stopping, self.results),
+                daemon=True
+            )
+            process.start()
+            self._processes.append(process)
+        self._tasks = [asyncio.create_task(self._collect_results()), asyncio.create_task(self._forward_wakeups())]
+        logger.info(f"Started {self.workers} outbox delivery processes.")
+
+    def wake(self) -> None:
+        for wakeup in self._wakeups:
+            wakeup.set()
+
+    async def _forward_wakeups(self) -> None:
+        wakeup = outbox._get_wakeup()
+        while True:
+            await wakeup.wait()
+            wakeup.clear()
+            self.wake()
+
+    async def _collect_results(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                result = await loop.run_in_executor(None, self.results.get, True, 1.0)
+            except queue.Empty:
+                continue
+            try:
+                await outbox.apply_batch(result)
+            except Exception as e:
+                logger.error(f"Failed to apply delivery results: {e}", exc_info=True)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        self.stopping.set()
+        self.wake()
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop in {timeout}s, terminating.")
+                process.terminate()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # Results sent while shutting down.
+        while True:
+            try:
+                await outbox.apply_batch(self.results.get_nowait())
+            except queue.Empty:
+                break
+        self._processes.clear()
+        self._tasks.clear()
+        broadcast.set_bucket(None)
+
+def run_worker_process(index: int, count: int, settings: Dict[str, Any], db_path: str, bucket: SharedTokenBucket,
+                       wakeup, stopping, results) -> None:
+    """Entry point of a delivery process."""
+    _init_worker_process(index, settings, db_path)
+    asyncio.run(_worker_loop((index, count), bucket, wakeup, stopping, results))
+
+def _init_worker_process(index: int, settings: Dict[str, Any], db_path: str) -> None:
+    """Applies the bot process's settings and database path. The database is opened on first use."""
+    logging.basicConfig(format=f'%(asctime)s - outbox-{index} - %(levelname)s - %(message)s', level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    config.cfg.update(settings)
+    db.DB_PATH = db_path
+
+async def _worker_loop(shard: Tuple[int, int], bucket: SharedTokenBucket, wakeup, stopping, results) -> None:
+    loop = asyncio.get_running_loop()
+    concurrency = int(config.cfg.get('BROADCAST_CONCURRENCY', 30))
+    bot = Bot(
+        config.cfg['BOT_TOKEN'],
+        base_url=config.cfg.get('BOT_API_URL', 'https://api.telegram.org/bot'),
+        request=HTTPXRequest(connection_pool_size=concurrency + 2)
+    )
+
+    async def send_result(result: outbox.BatchResult) -> None:
+        results.put(result)
+
+    async with bot:
+        while not stopping.is_set():
+            wakeup.clear()
+            try:
+                await outbox.drain(bot, bucket=bucket, shard=shard, on_batch=send_result)
+            except Exception as e:
+                logger.error(f"Outbox delivery failed: {e}", exc_info=True)
+            _, next_attempt = await db.outbox_status()
+            timeout = 60.0 if next_attempt is None else min(60.0, max(1.0, next_attempt - time.time()))
+            await loop.run_in_executor(None, wakeup.wait, timeout)
+    await db.close_db()
+
+_pool: Optional[DeliveryPool] = None
+
+async def start(workers: int) -> None:
+    global _pool
+    if _pool is None:
+        _pool = DeliveryPool(workers)
+        await _pool.start()
+
+async def stop() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.stop()
+        _pool = None
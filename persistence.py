@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Set
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+BOT_DATA_KEY = 'bot_data'
+# Saved on their own by air_raid.save_alert_snapshot, in a compact form.
+TRANSIENT_BOT_DATA_KEYS = ('last_alert_status',)
+
+def _dump(data: Dict) -> Optional[str]:
+    try:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    except (TypeError, ValueError) as e:
+        logger.error(f"Cannot serialize persisted data: {e}")
+        return None
+
+class SQLitePersistence(BasePersistence):
+    """
+    Keeps user_data and bot_data in the bot's SQLite database.
+
+    user_data is loaded lazily: get_user_data returns nothing at startup and
+    refresh_user_data, which the application calls before handling each
+    update or job, loads a user's row the first time that user is seen.
+
+    Writes are write-behind. The application hands over only the users that
+    had updates since the last run, every update_interval seconds; entries
+    whose JSON did not change are skipped and the rest are written in one
+    transaction, so a flush costs O(changed users), not O(all users).
+    """
+
+    def __init__(self, update_interval: float = 10):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self._loaded: Set[int] = set()
+        self._written: Dict[Any, Optional[str]] = {}
+        self._pending_users: Dict[int, Optional[str]] = {}
+        self._pending_bot_data: Optional[str] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        if user_id in self._loaded:
+            return
+        raw = await db.get_user_data(user_id)
+        self._loaded.add(user_id)
+        if raw is None:
+            return
+        self._written[user_id] = raw
+        try:
+            stored = json.loads(raw)
+        except ValueError as e:
+            logger.error(f"Ignoring corrupt data of user {user_id}: {e}")
+            return
+        for key, value in stored.items():
+            user_data.setdefault(key, value)
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        raw = _dump(data)
+        if raw is None or self._written.get(user_id) == raw:
+            return
+        self._pending_users[user_id] = raw
+        await self._write_behind()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending_users[user_id] = None
+        await self._write_behind()
+
+    async def get_bot_data(self) -> Dict:
+        raw = await db.get_state(BOT_DATA_KEY)
+        if not raw:
+            return {}
+        self._written[BOT_DATA_KEY] = raw
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            logger.error(f"Ignoring corrupt bot data: {e}")
+            return {}
+
+    async def update_bot_data(self, data: Dict) -> None:
+        raw = _dump({key: value for key, value in data.items() if key not in TRANSIENT_BOT_DATA_KEYS})
+        if raw is None or self._written.get(BOT_DATA_KEY) == raw:
+            return
+        self._pending_bot_data = raw
+        await self._write_behind()
+
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
+
+    async def _write_behind(self) -> None:
+        """
+        Waits for the pending entries to be written.
+
+        The application calls the update methods of one run concurrently, so
+        the first caller starts a single writer and the others join it.
+        """
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_pending())
+        await asyncio.shield(self._writer)
+
+    async def _write_pending(self) -> None:
+        while self._pending_users or self._pending_bot_data is not None:
+            users, self._pending_users = self._pending_users, {}
+            bot_data, self._pending_bot_data = self._pending_bot_data, None
+            state = [(BOT_DATA_KEY, bot_data)] if bot_data is not None else []
+            if not await db.save_user_data(list(users.items()), state):
+                # Kept for the next run unless newer data arrived meanwhile.
+                self._pending_users = {**users, **self._pending_users}
+                if self._pending_bot_data is None:
+                    self._pending_bot_data = bot_data
+                return
+            self._written.update(users)
+            if bot_data is not None:
+                self._written[BOT_DATA_KEY] = bot_data
+            logger.debug(f"Persisted data of {len(users)} users.")
+
+    async def flush(self) -> None:
+        if self._pending_users or self._pending_bot_data is not None:
+            await self._write_behind()
+        elif self._writer is not None:
+            await asyncio.shield(self._writer)
+
+    # Chat data, callback data and conversations are not used by this bot.
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_conversation(self, name: str, key: Any, new_state: Optional[object]) -> None:
+        pass
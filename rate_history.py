@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Day 0 of every history file. One float32 per day, NaN for days without a snapshot,
+# so a currency costs 1.5 KiB a year and a range query is a single contiguous read.
+EPOCH = date(2020, 1, 1)
+DTYPE = np.dtype('<f4')
+CODE = re.compile(r'^[A-Z]{3}$')
+PERIOD = re.compile(r'^(\d{1,4})([dwmy]?)$')
+PERIOD_DAYS = {'': 1, 'd': 1, 'w': 7, 'm': 30, 'y': 365}
+
+@dataclass
+class HistorySummary:
+    code: str
+    days: int
+    points: int
+    first: float
+    last: float
+    low: float
+    low_day: date
+    high: float
+    high_day: date
+    slope: float
+
+    @property
+    def change(self) -> float:
+        """Relative change from the first to the last point."""
+        return self.last / self.first - 1 if self.first else 0.0
+
+class HistoryStore:
+    """
+    Daily currency rates in one array file per currency.
+
+    Each file holds the UAH price of one unit of the currency for
+    consecutive days since EPOCH; later snapshots of the same day overwrite
+    earlier ones. Files are plain little-endian float32 arrays.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _file(self, code: str) -> str:
+        if not CODE.match(code):
+            raise ValueError(f"Invalid currency code: {code!r}")
+        return os.path.join(self.path, f"{code}.f4")
+
+    def append(self, day: date, prices: Dict[str, float]) -> int:
+        """
+        Records the day's UAH price of each currency.
+
+        Returns:
+            Number of currencies written.
+        """
+        index = (day - EPOCH).days
+        if index < 0:
+            raise ValueError(f"Day {day} is before {EPOCH}")
+        os.makedirs(self.path, exist_ok=True)
+        value = np.empty(1, dtype=DTYPE)
+        written = 0
+        for code, price in prices.items():
+            if not CODE.match(code) or not math.isfinite(price) or price <= 0:
+                continue
+            file = self._file(code)
+            with open(file, 'r+b' if os.path.exists(file) else 'w+b') as f:
+                length = f.seek(0, os.SEEK_END) // DTYPE.itemsize
+                if length < index:
+                    np.full(index - length, np.nan, dtype=DTYPE).tofile(f)
+                f.seek(index * DTYPE.itemsize)
+                value[0] = price
+                value.tofile(f)
+            written += 1
+        return written
+
+    def series(self, code: str, start: date, end: date) -> np.ndarray:
+        """Prices from start to end inclusive, NaN where no snapshot exists."""
+        first, last = max((start - EPOCH).days, 0), (end - EPOCH).days
+        result = np.full(max(last - first + 1, 0), np.nan, dtype=DTYPE)
+        file = self._file(code)
+        if not os.path.exists(file) or last < first:
+            return result
+        length = os.path.getsize(file) // DTYPE.itemsize
+        count = min(last + 1, length) - first
+        if count > 0:
+            result[:count] = np.fromfile(file, dtype=DTYPE, count=count, offset=first * DTYPE.itemsize)
+        return result
+
+    def summarize(self, code: str, days: int, today: date) -> Optional[HistorySummary]:
+        """
+        Min, max, change and least-squares trend over the last days days, or None without data.
+
+        Periods reaching back before EPOCH are shortened to start at EPOCH.
+        """
+        days = min(days, (today - EPOCH).days + 1)
+        if days < 1:
+            return None
+        start = today - timedelta(days=days - 1)
+        prices = self.series(code, start, today)
+        valid = np.flatnonzero(~np.isnan(prices))
+        if not valid.size:
+            return None
+        values = prices[valid].astype(np.float64)
+        low, high = int(np.argmin(values)), int(np.argmax(values))
+        slope = float(np.polyfit(valid, values, 1)[0]) if valid.size > 1 else 0.0
+        return HistorySummary(
+            code=code, days=days, points=int(valid.size), first=float(values[0]), last=float(values[-1]),
+            low=float(values[low]), low_day=start + timedelta(days=int(valid[low])),
+            high=float(values[high]), high_day=start + timedelta(days=int(valid[high])), slope=slope
+        )
+
+def parse_period(text: str) -> Optional[int]:
+    """Parses "30d", "8w", "6m", "2y" or a bare number of days."""
+    match = PERIOD.match(text.strip().lower())
+    if not match:
+        return None
+    days = int(match.group(1)) * PERIOD_DAYS[match.group(2)]
+    return days if days > 0 else None
+
+# File writes run on their own thread, one at a time, off the event loop.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rate-history')
+_store: Optional[HistoryStore] = None
+
+def get_store() -> HistoryStore:
+    global _store
+    if _store is None:
+        _store = HistoryStore(config.cfg.get('RATE_HISTORY_DIR', 'rate_history'))
+    return _store
+
+async def append(day: date, rates: Dict[str, float]) -> int:
+    """Records a snapshot of per-UAH rates, as returned by the rates API, for day."""
+    prices = {code: 1 / rate for code, rate in rates.items() if rate}
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, get_store().append, day, prices)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to record rate history: {e}")
+        return 0
+
+async def summarize(code: str, days: int, today: Optional[date] = None) -> Optional[HistorySummary]:
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_executor, get_store().summarize, code, days, today or date.today())
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to read rate history of {code}: {e}")
+        return None
@@ -0,0 +1,81 @@
+import bisect
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+APOSTROPHES = re.compile(r"['’ʼ`´‘]")
+WHITESPACE = re.compile(r"\s+")
+
+def normalize_name(name: str) -> str:
+    """Case- and apostrophe-insensitive form of a region name: "Кам’янець" -> "камянець"."""
+    return WHITESPACE.sub(" ", APOSTROPHES.sub("", name)).strip().casefold()
+
+class RegionDirectory:
+    """
+    In-memory directory of alert regions.
+
+    Holds an ID -> name map and a sorted normalized name -> ID index, so
+    lookups, keyboards and status messages never need an upstream request.
+    """
+
+    def __init__(self):
+        self._names: Dict[str, str] = {}
+        self._states: List[Tuple[str, str]] = []
+        self._index: Dict[str, str] = {}
+        self._keys: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def update(self, regions: Iterable[Dict], states: bool = False) -> None:
+        """
+        Merges regions into the directory.
+
+        Args:
+            regions: Region dicts with regionId and regionName.
+            states: True if the regions are the full list of oblasts used for keyboards.
+        """
+        names = dict(self._names)
+        for region in regions:
+            region_id, name = region.get('regionId'), region.get('regionName')
+            if region_id and name:
+                names[str(region_id)] = name
+        if names != self._names:
+            self._names = names
+            self._index = {normalize_name(name): region_id for region_id, name in names.items()}
+            self._keys = sorted(self._index)
+        if states:
+            self._states = sorted(
+                ((str(r['regionId']), r['regionName']) for r in regions if r.get('regionId') and r.get('regionName')),
+                key=lambda item: item[1]
+            )
+
+    def name(self, region_id: Optional[str]) -> Optional[str]:
+        return self._names.get(region_id) if region_id is not None else None
+
+    def resolve(self, name: str) -> Optional[str]:
+        """
+        Finds a region ID by name.
+
+        An exact normalized match wins; otherwise the name must be a prefix of
+        exactly one region, so "Київська" and "київ" both work while "Х" is
+        ambiguous.
+        """
+        key = normalize_name(name)
+        if not key:
+            return None
+        if key in self._index:
+            return self._index[key]
+        start = bisect.bisect_left(self._keys, key)
+        matches = []
+        for candidate in self._keys[start:start + 2]:
+            if candidate.startswith(key):
+                matches.append(candidate)
+        return self._index[matches[0]] if len(matches) == 1 else None
+
+    def regions(self) -> List[Tuple[str, str]]:
+        """(region_id, name) pairs for keyboards, sorted by name."""
+        if self._states:
+            return self._states
+        return sorted(self._names.items(), key=lambda item: item[1])
+
+directory = RegionDirectory()
@@ -0,0 +1,185 @@
+import logging
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+from telegram.ext import ContextTypes
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+class Recipients:
+    """
+    Frozen recipient list of one region for one broadcast.
+
+    Holds the region's subscribers and a snapshot of the all-region
+    subscribers shared by every region of the tick, and de-duplicates them
+    lazily instead of materializing the union.
+    """
+
+    __slots__ = ('_region', '_all', '_count')
+
+    def __init__(self, region: FrozenSet[int], all_regions: Tuple[int, ...]):
+        self._region = region
+        self._all = all_regions
+        self._count = len(region) + sum(1 for user_id in all_regions if user_id not in region)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[int]:
+        yield from self._region
+        region = self._region
+        for user_id in self._all:
+            if user_id not in region:
+                yield user_id
+
+class SubscriptionStore:
+    """
+    In-memory copy of the subscriptions table.
+
+    Keeps an inverted index region_id -> subscriber ids and a per-user map.
+    Subscribers to all regions are stored under the None key, the same way
+    they are stored in the table.
+    """
+
+    def __init__(self):
+        self._by_region: Dict[Optional[str], Set[int]] = {}
+        self._by_user: Dict[int, Set[Optional[str]]] = {}
+        self.loaded = False
+        self.version = 0
+        self._count = 0
+
+    def load(self, rows: Iterable[Tuple[int, Optional[str]]]) -> None:
+        by_region: Dict[Optional[str], Set[int]] = {}
+        by_user: Dict[int, Set[Optional[str]]] = {}
+        for user_id, region_id in rows:
+            if not isinstance(region_id, (str, type(None))):
+                logger.error(f"Invalid region_id type from database: {region_id} (type: {type(region_id)})")
+                continue
+            by_region.setdefault(region_id, set()).add(user_id)
+            by_user.setdefault(user_id, set()).add(region_id)
+        self._by_region = by_region
+        self._by_user = by_user
+        self._count = sum(len(regions) for regions in by_user.values())
+        self.loaded = True
+        self.version += 1
+
+    def add(self, user_id: int, region_id: Optional[str]) -> None:
+        user_regions = self._by_user.setdefault(user_id, set())
+        if region_id in user_regions:
+            return
+        self.version += 1
+        user_regions.add(region_id)
+        self._by_region.setdefault(region_id, set()).add(user_id)
+        self._count += 1
+
+    def remove(self, user_id: int, region_id: Optional[str] = None) -> None:
+        """Removes one subscription, or all of the user's subscriptions if region_id is None."""
+        user_regions = self._by_user.get(user_id)
+        if not user_regions:
+            return
+        self.version += 1
+        removed = set(user_regions) if region_id is None else {region_id} & user_regions
+        for region in removed:
+            subscribers = self._by_region.get(region)
+            if subscribers is not None:
+                subscribers.discard(user_id)
+                if not subscribers:
+                    del self._by_region[region]
+        user_regions -= removed
+        self._count -= len(removed)
+        if not user_regions:
+            del self._by_user[user_id]
+
+    def recipients(self, region_id: str) -> Set[int]:
+        """Returns subscribers of the region together with all-region subscribers."""
+        region_subscribers = self._by_region.get(region_id)
+        all_subscribers = self._by_region.get(None)
+        if region_subscribers and all_subscribers:
+            return region_subscribers | all_subscribers
+        return set(region_subscribers or all_subscribers or ())
+
+    def snapshot_recipients(self, region_ids: List[str]) -> List[Recipients]:
+        """
+        Copies recipients of several regions so delivery is unaffected by later (un)subscribes.
+
+        The all-region subscribers are copied once and shared by every region.
+        """
+        all_regions = tuple(self._by_region.get(None, ()))
+        return [Recipients(frozenset(self._by_region.get(region_id, ())), all_regions) for region_id in region_ids]
+
+    def user_regions(self, user_id: int) -> Set[Optional[str]]:
+        return set(self._by_user.get(user_id, ()))
+
+    def is_subscribed(self, user_id: int, region_id: Optional[str] = None) -> bool:
+        """Same semantics as database.is_subscribed: region_id None means any subscription."""
+        user_regions = self._by_user.get(user_id)
+        if not user_regions:
+            return False
+        return region_id is None or region_id in user_regions
+
+    def user_count(self) -> int:
+        return len(self._by_user)
+
+    def subscription_count(self) -> int:
+        return self._count
+
+    def users(self) -> List[int]:
+        return list(self._by_user)
+
+    def rows(self) -> Set[Tuple[int, Optional[str]]]:
+        return {(user_id, region_id) for user_id, regions in self._by_user.items() for region_id in regions}
+
+store = SubscriptionStore()
+
+async def load() -> None:
+    store.load(await db.get_subscribers())
+    logger.info(f"Loaded {store.subscription_count()} subscriptions for {store.user_count()} users.")
+
+async def add_subscriber(user_id: int, region_id: Optional[str]) -> bool:
+    added = await db.add_subscriber(user_id, region_id)
+    if added:
+        store.add(user_id, region_id)
+    return added
+
+async def remove_subscriber(user_id: int, region_id: Optional[str] = None) -> bool:
+    removed = await db.remove_subscriber(user_id, region_id)
+    if removed:
+        store.remove(user_id, region_id)
+    return removed
+
+async def remove_subscribers(user_ids: List[int]) -> int:
+    """Removes all subscriptions of the given users in one batched transaction."""
+    if not user_ids:
+        return 0
+    removed = await db.remove_subscribers(user_ids)
+    if removed:
+        for user_id in user_ids:
+            store.remove(user_id)
+    return removed
+
+def is_subscribed(user_id: int, region_id: Optional[str] = None) -> bool:
+    return store.is_subscribed(user_id, region_id)
+
+async def verify_consistency(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> bool:
+    """
+    Compares the store with SQLite and reloads it if they differ.
+
+    Returns:
+        True if the store matched the table.
+    """
+    version = store.version
+    memory_rows = store.rows()
+    table_rows = set(await db.get_subscribers())
+    if store.version != version:
+        logger.info("Subscriptions changed during the consistency check, skipping.")
+        return True
+    if table_rows == memory_rows:
+        logger.info("Subscription store is consistent with the database.")
+        return True
+    logger.warning(
+        f"Subscription store out of sync: {len(table_rows - memory_rows)} rows missing, "
+        f"{len(memory_rows - table_rows)} stale. Reloading."
+    )
+    store.load(table_rows)
+    return False
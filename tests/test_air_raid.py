@@ -1,7 +1,13 @@
 import pytest
 import asyncio
 from unittest.mock import AsyncMock, patch
-from air_raid import get_air_raid_status, format_alert_message, format_no_alert_message
+
+import httpx
+from air_raid import (
+    get_air_raid_status, format_alert_message, format_no_alert_message, diff_alert_status, check_air_raid_status,
+    pack_snapshot, unpack_snapshot, render_tick, AlertFeed, alerts_command
+)
+from subscriptions import SubscriptionStore
 
 @pytest.mark.asyncio
 async def test_get_air_raid_status_success():
@@ -10,10 +16,8 @@ async def test_get_air_raid_status_success():
     ]
     # Мокаем config.cfg с нужными значениями
     with patch('air_raid.config.cfg', {'AIR_RAID_API_URL': 'https://mock.url', 'UKRAINE_ALARM_TOKEN': 'mock_token'}):
-        with patch('requests.get') as mock_get:
-            mock_get.return_value.status_code = 200
-            mock_get.return_value.json.return_value = mock_response
-            mock_get.return_value.headers = {'Last-Modified': '2023-01-01T00:00:00Z'}
+        with patch('air_raid.http_client.get', new_callable=AsyncMock) as mock_get:
+            mock_get.return_value = httpx.Response(200, json=mock_response, headers={'Last-Modified': '2023-01-01T00:00:00Z'})
             result = await get_air_raid_status()
             assert result == mock_response
 
@@ -28,8 +32,8 @@ async def test_get_air_raid_status_not_modified():
     }
     # Мокаем config.cfg с нужными значениями
     with patch('air_raid.config.cfg', {'AIR_RAID_API_URL': 'https://mock.url', 'UKRAINE_ALARM_TOKEN': 'mock_token'}):
-        with patch('requests.get') as mock_get:
-            mock_get.return_value.status_code = 304
+        with patch('air_raid.http_client.get', new_callable=AsyncMock) as mock_get:
+            mock_get.return_value = httpx.Response(304)
             result = await get_air_raid_status(mock_context)
             assert result == [{"regionId": "1", "regionName": "Київ"}]
 
@@ -38,4 +42,130 @@ def test_format_alert_message():
     assert format_alert_message("Львів") == "🚨 УВАГА! Повітряна тривога в **Львів**!\nПрямуйте до укриття!"
 
 def test_format_no_alert_message():
-    assert format_no_alert_message("Київ") == "✅ Відбій повітряної тривоги в **Київ**."
\ No newline at end of file
+    assert format_no_alert_message("Київ") == "✅ Відбій повітряної тривоги в **Київ**."
+def test_diff_alert_status():
+    last = [
+        {"regionId": "1", "regionName": "Київ", "activeAlerts": [{"type": "AIR"}]},
+        {"regionId": "2", "regionName": "Львів", "activeAlerts": [{"type": "AIR"}]},
+    ]
+    current = [
+        {"regionId": "2", "regionName": "Львів", "activeAlerts": [{"type": "AIR"}]},
+        {"regionId": "3", "regionName": "Харків", "activeAlerts": [{"type": "MISSILE"}]},
+    ]
+    started, ended = diff_alert_status(last, current)
+    assert [r["regionId"] for r in started] == ["3"]
+    assert [r["regionId"] for r in ended] == ["1"]
+
+@pytest.mark.asyncio
+async def test_check_air_raid_status_notifies_only_changed_regions():
+    store = SubscriptionStore()
+    store.load([(10, "1"), (11, "2"), (12, None)])
+    context = AsyncMock()
+    context.bot_data = {'last_alert_status': {'data': [], 'lastUpdate': None}}
+    current = [{"regionId": "1", "regionName": "Київ", "activeAlerts": [{"type": "AIR"}]}]
+    with patch('air_raid.fetch_alerts', new_callable=AsyncMock, return_value=AlertFeed(current)), \
+            patch('air_raid.subscriptions.store', store), \
+            patch('air_raid.save_alert_snapshot', new_callable=AsyncMock), \
+            patch('air_raid.outbox.enqueue', new_callable=AsyncMock, return_value=2) as mock_enqueue:
+        await check_air_raid_status(context)
+        messages, recipients = mock_enqueue.await_args.args
+        assert [(region_id, kind) for region_id, kind, _ in messages] == [("1", "alert")]
+        assert sorted(recipients[0]) == [10, 12]
+
+        mock_enqueue.reset_mock()
+        await check_air_raid_status(context)
+        mock_enqueue.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_failed_enqueue_leaves_state_for_the_next_check():
+    context = AsyncMock()
+    context.bot_data = {'last_alert_status': {'data': [], 'lastUpdate': None}}
+    current = [{"regionId": "1", "regionName": "Київ", "activeAlerts": [{"type": "AIR"}]}]
+    with patch('air_raid.fetch_alerts', new_callable=AsyncMock, return_value=AlertFeed(current)), \
+            patch('air_raid.get_alert_marker', new_callable=AsyncMock, return_value=5), \
+            patch('air_raid.save_alert_snapshot', new_callable=AsyncMock) as mock_save, \
+            patch('air_raid.outbox.enqueue', new_callable=AsyncMock, side_effect=[None, 1]) as mock_enqueue:
+        await check_air_raid_status(context)
+        mock_save.assert_not_awaited()
+        assert context.bot_data['last_alert_status']['data'] == []
+
+        await check_air_raid_status(context)
+        messages, _ = mock_enqueue.await_args.args
+        assert [(region_id, kind) for region_id, kind, _ in messages] == [("1", "alert")]
+        mock_save.assert_awaited_once()
+        assert context.bot_data['last_alert_status']['lastActionIndex'] == 5
+
+@pytest.mark.asyncio
+async def test_check_air_raid_status_follows_server_change_markers():
+    context = AsyncMock()
+    context.bot_data = {}
+    alerts = [{"regionId": "1", "regionName": "Київ", "activeAlerts": [{"type": "AIR"}]}]
+    validators = {'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+    responses = {
+        'https://mock.url': [httpx.Response(200, json=alerts, headers=validators), httpx.Response(304)],
+        'https://mock.url/status': [httpx.Response(200, json={'lastActionIndex': index}) for index in (7, 7, 8)],
+    }
+    requests = []
+
+    async def get(url, headers=None, **kwargs):
+        requests.append((url, headers))
+        return responses[url].pop(0)
+
+    with patch('air_raid.config.cfg', {'AIR_RAID_API_URL': 'https://mock.url', 'UKRAINE_ALARM_TOKEN': 'mock_token',
+                                       'AIR_RAID_STATUS_URL': 'https://mock.url/status'}), \
+            patch('air_raid.http_client.get', side_effect=get), \
+            patch('air_raid.save_alert_snapshot', new_callable=AsyncMock), \
+            patch('air_raid.outbox.enqueue', new_callable=AsyncMock, return_value=0) as mock_enqueue:
+        for _ in range(3):
+            await check_air_raid_status(context)
+
+    # Unchanged marker: the full list is not requested at all.
+    assert [url for url, _ in requests] == ['https://mock.url/status', 'https://mock.url',
+                                            'https://mock.url/status', 'https://mock.url/status', 'https://mock.url']
+    conditional = requests[-1][1]
+    assert conditional['If-None-Match'] == '"v1"'
+    assert conditional['If-Modified-Since'] == 'Mon, 01 Jan 2024 00:00:00 GMT'
+    assert mock_enqueue.await_count == 1
+    assert context.bot_data['last_alert_status']['lastActionIndex'] == 8
+
+def test_snapshot_roundtrip_keeps_only_active_regions():
+    data = [
+        {"regionId": "1", "regionName": "Київ", "activeAlerts": [{"type": "AIR", "lastUpdate": "x"}]},
+        {"regionId": "2", "regionName": "Львів", "activeAlerts": []},
+    ]
+    restored = unpack_snapshot(pack_snapshot(data, "2024-01-01T00:00:00+00:00", '"v1"', 42, {"1": [1700000000.0, "AIR"]}))
+    assert restored["lastUpdate"] == "2024-01-01T00:00:00+00:00"
+    assert (restored["etag"], restored["lastActionIndex"]) == ('"v1"', 42)
+    assert restored["since"] == {"1": [1700000000.0, "AIR"]}
+    assert restored["data"] == [{"regionId": "1", "regionName": "Київ", "activeAlerts": [{"type": "AIR"}]}]
+    assert diff_alert_status(restored["data"], data) == ([], [])
+
+def test_render_tick_renders_each_region_once():
+    started = [{"regionId": "1", "regionName": "Київ", "activeAlerts": [{"type": "AIR"}, {"type": "MISSILE"}]}]
+    ended = [{"regionId": "2", "regionName": "Львів", "activeAlerts": [{"type": "AIR"}]}]
+    rendered = render_tick(started, ended)
+    assert [(alert.region_id, alert.kind) for alert in rendered] == [("1", "alert"), ("2", "clear")]
+    assert "Повітряна тривога, Ракетна загроза" in rendered[0].text
+    assert rendered[1].text == format_no_alert_message("Львів")
+
+@pytest.mark.asyncio
+async def test_alerts_command_reads_the_polled_state():
+    update = AsyncMock()
+    context = AsyncMock()
+    context.user_data = {}
+    context.bot_data = {'last_alert_status': {'data': [], 'lastUpdate': None}}
+    alerts = [{"regionId": "1", "regionName": "Київ", "activeAlerts": [{"type": "AIR"}]}]
+    with patch('air_raid.get_air_raid_status', new_callable=AsyncMock, return_value=alerts) as mock_status:
+        # Nothing polled yet: asked upstream.
+        await alerts_command(update, context)
+        mock_status.assert_awaited_once()
+        assert "Київ" in update.message.reply_text.await_args.args[0]
+
+        mock_status.reset_mock()
+        context.bot_data['last_alert_status'] = unpack_snapshot(pack_snapshot(alerts, None, None, 7))
+        await alerts_command(update, context)
+        context.bot_data['last_alert_status']['data'] = []
+        await alerts_command(update, context)
+    mock_status.assert_not_awaited()
+    assert "Київ" in update.message.reply_text.await_args_list[-2].args[0]
+    assert update.message.reply_text.await_args.args[0] == "Наразі тривог немає в обраній області."
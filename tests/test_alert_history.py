@@ -0,0 +1,61 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import alert_history
+
+@pytest.fixture(autouse=True)
+def pending(monkeypatch):
+    monkeypatch.setattr(alert_history, '_pending', [])
+
+def region(region_id, *types):
+    return {"regionId": region_id, "regionName": region_id, "activeAlerts": [{"type": t} for t in types]}
+
+def at(day: date, hour: int, minute: int = 0) -> float:
+    return datetime(day.year, day.month, day.day, hour, minute).timestamp()
+
+def test_track_pairs_starts_with_ends():
+    since = {}
+    assert alert_history.track(since, [region("1", "AIR", "MISSILE"), region("2", "AIR")], [], now=100.0) == 0
+    assert since == {"1": [100.0, "AIR,MISSILE"], "2": [100.0, "AIR"]}
+
+    # An alert that was already active before the first snapshot has no known start.
+    assert alert_history.track(since, [], [region("1"), region("3")], now=700.0) == 1
+    assert since == {"2": [100.0, "AIR"]}
+    assert alert_history._pending == [("1", "AIR,MISSILE", 100.0, 700.0, alert_history.day_of(100.0))]
+
+@pytest.mark.asyncio
+async def test_stats_windows_from_rollups(temp_db):
+    today = date(2024, 3, 31)
+    since = {}
+    for day, region_id, start, minutes in (
+        (today, "1", 10, 30), (today, "1", 14, 90), (today - timedelta(days=3), "1", 8, 60),
+        (today - timedelta(days=20), "1", 1, 240), (today - timedelta(days=40), "1", 1, 600),
+        (today, "2", 10, 15),
+    ):
+        alert_history.track(since, [region(region_id, "AIR")], [], now=at(day, start))
+        alert_history.track(since, [], [region(region_id)], now=at(day, start) + minutes * 60)
+
+    kyiv = await alert_history.get_stats("1", today)
+    assert not alert_history._pending
+    assert [(s.alerts, s.total / 60, s.longest / 60) for s in kyiv] == [(2, 120, 90), (3, 180, 90), (4, 420, 240)]
+    assert kyiv[0].average == 3600
+
+    everywhere = await alert_history.get_stats(None, today)
+    assert [s.alerts for s in everywhere] == [3, 4, 5]
+    assert [s.alerts for s in await alert_history.get_stats("9", today)] == [0, 0, 0]
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_alerts_queued(temp_db, monkeypatch):
+    alert_history._pending.append(("1", "AIR", 0.0, 60.0, 1))
+
+    async def fail(intervals):
+        return False
+
+    monkeypatch.setattr(alert_history.db, 'add_alert_intervals', fail)
+    assert await alert_history.flush() == 0
+    assert len(alert_history._pending) == 1
+
+def test_format_duration():
+    assert alert_history.format_duration(59 * 60) == "59 хв"
+    assert alert_history.format_duration(2 * 3600 + 15 * 60) == "2 год 15 хв"
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+
+import broadcast
+from broadcast import TokenBucket
+
+@pytest.mark.asyncio
+async def test_bucket_spaces_sends_at_its_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    started = time.monotonic()
+    for _ in range(6):
+        await bucket.acquire()
+    # The first token is free, the other five come 20 ms apart.
+    assert 0.09 <= time.monotonic() - started < 0.3
+
+@pytest.mark.asyncio
+async def test_bucket_pause_delays_waiting_callers():
+    bucket = TokenBucket(rate=1000, capacity=1)
+    await bucket.acquire()
+    bucket.pause(0.1)
+    started = time.monotonic()
+    await bucket.acquire()
+    assert time.monotonic() - started >= 0.09
+
+@pytest.mark.asyncio
+async def test_no_burst_after_pause():
+    bucket = TokenBucket(rate=20, capacity=1)
+    started = time.monotonic()
+    times = []
+
+    async def send():
+        await bucket.acquire()
+        times.append(time.monotonic() - started)
+
+    senders = [asyncio.create_task(send()) for _ in range(5)]
+    await asyncio.sleep(0.01)
+    bucket.pause(0.2)
+    await asyncio.gather(*senders)
+
+    # One send went out before the pause; the four reserved before it resume 50 ms apart, not all at once.
+    resumed = sorted(times)[1:]
+    assert resumed[0] >= 0.2
+    assert all(later - earlier >= 0.035 for earlier, later in zip(resumed, resumed[1:]))
+
+def test_report_percentiles():
+    report = broadcast.BroadcastReport(sent=4, duration=2.0, latencies=[0.1, 0.2, 0.3, 0.4])
+    assert report.throughput == 2.0
+    assert report.percentile(50) == 0.2
+    assert report.percentile(99) == 0.4
+
+def test_shared_bucket_pause_delays_reservations():
+    bucket = broadcast.SharedTokenBucket(rate=10, capacity=2)
+    assert bucket._reserve() == 0
+    bucket.pause(5)
+    assert 4.5 < bucket._reserve() <= 5.2
+    assert bucket._paused_until == bucket._state[2]
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from cache import AsyncTTLCache
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch():
+    cache = AsyncTTLCache(maxsize=10, ttl=60)
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "sunny"
+
+    results = await asyncio.gather(*(cache.get_or_fetch("kyiv", fetch) for _ in range(200)))
+    assert results == ["sunny"] * 200
+    assert calls == 1
+    assert cache.stats()['coalesced'] == 199
+    assert await cache.get_or_fetch("kyiv", fetch) == "sunny"
+    assert cache.hits == 1
+
+@pytest.mark.asyncio
+async def test_failed_fetch_is_not_cached():
+    cache = AsyncTTLCache(maxsize=10, ttl=60)
+
+    async def fetch():
+        return None
+
+    assert await cache.get_or_fetch("kyiv", fetch) is None
+    assert "kyiv" not in cache
+
+def test_lru_eviction_and_ttl_expiry_are_counted():
+    timer = FakeTimer()
+    cache = AsyncTTLCache(maxsize=2, ttl=10, timer=timer)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "b" not in cache and "a" in cache
+    timer.now = 11
+    cache.set("d", 4)
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['expirations'] == 2
+    assert stats['size'] == 1
+
+def test_expires_in_tracks_entry_lifetime():
+    timer = FakeTimer()
+    cache = AsyncTTLCache(maxsize=2, ttl=10, timer=timer)
+    cache.set("a", 1)
+    timer.now = 4
+    assert cache.expires_in("a") == 6
+    cache.set("a", 2)
+    assert cache.expires_in("a") == 10
+    timer.now = 20
+    assert cache.expires_in("a") is None
+    assert cache.expires_in("missing") is None
@@ -0,0 +1,19 @@
+import cities
+from cities import CityDirectory
+
+def test_directory_maps_spellings_to_one_city():
+    directory = CityDirectory()
+    directory.load([("kyiv", 703448, "Київ")])
+    assert directory.add(703448, "Київ", ["Київ", " KYIV ", "Kiev"]) == ["київ", "kiev"]
+    assert directory.add(703448, "Київ", ["kiev"]) == []
+    assert directory.resolve("Кiev") is None
+    assert directory.resolve("КИЇВ") == directory.resolve("kiev") == 703448
+    assert directory.name(703448) == "Київ"
+    assert len(directory) == 1
+
+def test_directory_caps_spellings_per_city():
+    directory = CityDirectory()
+    typos = [f"kyiv{i}" for i in range(cities.MAX_ALIASES_PER_CITY + 2)]
+    assert len(directory.add(703448, "Київ", typos)) == cities.MAX_ALIASES_PER_CITY
+    assert directory.resolve(typos[-1]) is None
+    assert directory.add(703448, "Київ", ["Київ"]) == ["київ"]
@@ -0,0 +1,46 @@
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from telegram.error import BadRequest, Forbidden
+
+import cleanup
+from broadcast import TokenBucket
+from subscriptions import SubscriptionStore
+
+@pytest.mark.asyncio
+async def test_cleanup_resumes_from_cursor_and_removes_in_batch():
+    store = SubscriptionStore()
+    store.load([(1, None), (2, "10"), (3, None), (4, "11"), (5, None)])
+    context = AsyncMock()
+
+    async def chat_action(chat_id, action):
+        if chat_id == 3:
+            raise Forbidden("blocked")
+        if chat_id == 4:
+            raise BadRequest("Not enough rights to send text messages to the chat")
+        if chat_id == 5:
+            raise BadRequest("Chat not found")
+
+    context.bot.send_chat_action.side_effect = chat_action
+    with patch('cleanup.subscriptions.store', store), \
+            patch('cleanup.broadcast.get_bucket', return_value=TokenBucket(1000, capacity=10)), \
+            patch('cleanup.db.get_state', new_callable=AsyncMock, return_value="2"), \
+            patch('cleanup.db.set_state', new_callable=AsyncMock) as set_state, \
+            patch('cleanup.subscriptions.remove_subscribers', new_callable=AsyncMock) as remove:
+        await cleanup.cleanup_subscribers(context)
+
+    probed = sorted(call.kwargs['chat_id'] for call in context.bot.send_chat_action.await_args_list)
+    assert probed == [3, 4, 5]
+    remove.assert_awaited_once_with([3, 5])
+    assert set_state.await_args_list[-1].args == (cleanup.CURSOR_KEY, None)
+
+@pytest.mark.asyncio
+async def test_interrupted_scan_resumes_soon_after_startup():
+    job_queue = Mock()
+    with patch('cleanup.db.get_state', new_callable=AsyncMock, return_value=None):
+        assert not await cleanup.schedule_resume(job_queue)
+    job_queue.run_once.assert_not_called()
+
+    with patch('cleanup.db.get_state', new_callable=AsyncMock, return_value="2"):
+        assert await cleanup.schedule_resume(job_queue)
+    job_queue.run_once.assert_called_once_with(cleanup.cleanup_subscribers, when=cleanup.RESUME_DELAY)
@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import currency
+import rate_history
+
+@pytest.fixture(autouse=True)
+def reset_currency_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_history, '_store', rate_history.HistoryStore(str(tmp_path / 'history')))
+    currency.CURRENCY_CACHE.clear()
+    currency.CURRENCY_CODES.clear()
+    yield
+    currency.CURRENCY_CACHE.clear()
+    currency.CURRENCY_CODES.clear()
+
+@pytest.mark.asyncio
+async def test_get_currency_rates_never_waits_on_upstream():
+    fetched = asyncio.Event()
+
+    async def slow_fetch():
+        await fetched.wait()
+        return {'USD': 0.025}
+
+    with patch('currency.fetch_currency_rates', side_effect=slow_fetch), \
+            patch('currency.db.set_state', new_callable=AsyncMock):
+        assert await currency.get_currency_rates() is None
+        fetched.set()
+        await currency._refresh_task
+        assert await currency.get_currency_rates() == {'USD': 0.025}
+        assert 'USD' in currency.CURRENCY_CODES
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_stale_rates():
+    currency._store_rates({'USD': 0.025}, datetime.now() - timedelta(hours=1))
+    with patch('currency.fetch_currency_rates', new_callable=AsyncMock, return_value=None):
+        assert not await currency.refresh_currency_rates()
+    assert currency.is_stale()
+    assert await currency.get_currency_rates() == {'USD': 0.025}
+    await currency._refresh_task
+
+@pytest.mark.asyncio
+async def test_add_currency_code_validation():
+    with patch('currency.db.add_user_currency', new_callable=AsyncMock, return_value=True):
+        assert not await currency.add_currency_code(1, "USD")
+        currency._store_rates({'USD': 0.025}, datetime.now())
+        assert not await currency.add_currency_code(1, "PLN")
+        assert not await currency.add_currency_code(1, "ZZZ")
+        assert await currency.add_currency_code(1, "usd")
+        assert not await currency.add_currency_code(1, "US1")
+
+def test_cross_rates_matrix_and_precomputed_rows():
+    table = currency.CrossRates({'UAH': 1, 'USD': 0.025, 'EUR': 0.0225, 'JPY': 3.75})
+    assert table.rate('USD', 'UAH') == pytest.approx(40.0)
+    assert table.rate('EUR', 'USD') == pytest.approx(0.025 / 0.0225)
+    assert table.rate('USD', 'XXX') is None
+    assert table.rows('UAH')['USD'] == "USD: 40\\.00 UAH\n"
+    assert table.rows('UAH')['JPY'] == "JPY: 0\\.2667 UAH\n"
+    assert table.rows('EUR') is table.rows('EUR')
+
+def test_parse_conversion():
+    assert currency.parse_conversion(["100,5", "usd", "eur"]) == (100.5, "USD", "EUR")
+    assert currency.parse_conversion(["2", "eur"]) == (2.0, "EUR", "UAH")
+    assert currency.parse_conversion(["abc", "usd"]) is None
+    assert currency.parse_conversion(["inf", "usd"]) is None
+    assert currency.parse_conversion(["100"]) is None
+
+@pytest.mark.asyncio
+async def test_convert_command_uses_cross_rates():
+    currency._store_rates({'USD': 0.025, 'EUR': 0.0225}, datetime.now())
+    update = AsyncMock()
+    context = AsyncMock()
+    context.args = ["100", "usd", "eur"]
+    await currency.convert_command(update, context)
+    assert update.message.reply_text.await_args.args[0] == "💱 100.00 USD = 90.00 EUR\n1 USD = 0.9000 EUR"
+
+@pytest.mark.asyncio
+async def test_refresh_appends_to_history():
+    with patch('currency.fetch_currency_rates', new_callable=AsyncMock, return_value={'UAH': 1, 'USD': 0.025}), \
+            patch('currency.db.set_state', new_callable=AsyncMock):
+        assert await currency.refresh_currency_rates()
+    series = rate_history.get_store().series('USD', datetime.now().date(), datetime.now().date())
+    assert series.tolist() == [40.0]
@@ -0,0 +1,21 @@
+import pytest
+
+import database as db
+
+@pytest.mark.asyncio
+async def test_subscription_roundtrip(temp_db):
+    assert await db.add_subscriber(1, "10")
+    assert not await db.add_subscriber(1, "10")
+    assert await db.add_subscriber(2, None)
+    assert await db.is_subscribed(1)
+    assert await db.is_subscribed(1, "10")
+    assert not await db.is_subscribed(1, "11")
+    assert sorted(await db.get_subscribers(), key=str) == sorted([(1, "10"), (2, None)], key=str)
+    assert await db.remove_subscriber(1)
+    assert not await db.is_subscribed(1)
+
+@pytest.mark.asyncio
+async def test_user_currencies(temp_db):
+    assert await db.add_user_currency(5, "USD")
+    assert await db.get_user_currencies(5) == ["USD"]
+    assert await db.get_user_currencies(6) == []
@@ -0,0 +1,53 @@
+import pytest
+
+import metrics
+import http_server
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, 'REGISTRY', [])
+    return metrics.REGISTRY
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = metrics.Histogram('test_seconds', "Test.", ['op'], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, 'read')
+
+    text = metrics.render()
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{op="read",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{op="read",le="1"} 3' in text
+    assert 'test_seconds_bucket{op="read",le="+Inf"} 4' in text
+    assert 'test_seconds_count{op="read"} 4' in text
+    assert histogram.count('read') == 4
+
+def test_counter_and_callback_gauge(registry):
+    counter = metrics.Counter('test_total', "Test.", ['status'])
+    counter.inc('200')
+    counter.inc('200', amount=2)
+    gauge = metrics.Gauge('test_entries', "Test.", ['cache'], callback=lambda: {('we"ather',): 7})
+
+    text = metrics.render()
+    assert 'test_total{status="200"} 3' in text
+    assert 'test_entries{cache="we\\"ather"} 7' in text
+    assert gauge.value() == 0
+
+@pytest.mark.asyncio
+async def test_track_handler_records_errors(registry):
+    latency = metrics.HANDLER_LATENCY.count('failing')
+    errors = metrics.HANDLER_ERRORS.value('failing')
+
+    async def failing(update, context):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await metrics.track_handler('failing', failing)(None, None)
+    assert metrics.HANDLER_LATENCY.count('failing') == latency + 1
+    assert metrics.HANDLER_ERRORS.value('failing') == errors + 1
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    response = await metrics._handle(http_server.Request('GET', '/metrics', {}))
+    assert response.status == 200
+    assert b'# TYPE bot_notification_backlog gauge' in response.body
+    assert (await metrics._handle(http_server.Request('GET', '/', {}))).status == 404
@@ -0,0 +1,91 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+import database as db
+import outbox
+from broadcast import TokenBucket
+
+def fast_bucket() -> TokenBucket:
+    return TokenBucket(rate=10000.0, capacity=10000.0)
+
+@pytest.mark.asyncio
+async def test_alert_and_all_clear_cancel_out(temp_db):
+    assert await outbox.enqueue([("1", "alert", "alert"), ("2", "alert", "other")], [[10, 11], [10]]) == 3
+    await outbox.enqueue([("1", "clear", "clear")], [[10, 11]])
+    await outbox.enqueue([("1", "alert", "again")], [[11]])
+
+    bot = AsyncMock()
+    with patch('outbox.subscriptions.remove_subscribers', new_callable=AsyncMock):
+        report = await outbox.drain(bot, bucket=fast_bucket())
+    sent = sorted((call.kwargs['chat_id'], call.kwargs['text']) for call in bot.send_message.await_args_list)
+    assert sent == [(10, "other"), (11, "again")]
+    assert report.sent == 2
+    assert await db.outbox_status() == (0, None)
+
+@pytest.mark.asyncio
+async def test_latency_includes_time_in_the_outbox(temp_db):
+    with patch('outbox.time.time', return_value=1000.0):
+        await outbox.enqueue([("1", "alert", "a")], [[10, 11]])
+    with patch('outbox.time.time', return_value=1030.0):
+        report = await outbox.drain(AsyncMock(), bucket=fast_bucket())
+    assert report.latencies == [30.0, 30.0]
+
+@pytest.mark.asyncio
+async def test_outbox_survives_restart(temp_db):
+    await outbox.enqueue([("1", "alert", "first"), ("2", "alert", "second")], [[10], [10, 11]])
+    db._executor.submit(db._close_db).result()
+    db.init_db()
+    assert await db.outbox_status() == (3, 0)
+    # Chat 10 gets its second message only after the first one is delivered.
+    rows = await db.due_notifications(9e9, 10)
+    assert [(chat_id, text) for chat_id, _, _, text, _, _ in rows] == [(10, "first"), (11, "second")]
+    assert [chat_id for chat_id, *_ in await db.due_notifications(9e9, 10, shard=(1, 2))] == [11]
+
+@pytest.mark.asyncio
+async def test_drain_retries_with_backoff_and_drops_blocked_chats(temp_db):
+    await outbox.enqueue([("1", "alert", "a"), ("2", "alert", "b")], [[10, 11, 12, 13], [12]])
+
+    async def send_message(chat_id, text, parse_mode):
+        if chat_id == 11:
+            raise NetworkError("timeout")
+        if chat_id == 12:
+            raise Forbidden("bot was blocked by the user")
+        if chat_id == 13:
+            raise RetryAfter(30)
+
+    bot = AsyncMock()
+    bot.send_message.side_effect = send_message
+    with patch('outbox.subscriptions.remove_subscribers', new_callable=AsyncMock) as mock_remove, \
+            patch('outbox.time.time', return_value=1000.0):
+        bucket = fast_bucket()
+        with patch.object(bucket, 'pause') as mock_pause:
+            report = await outbox.drain(bot, bucket=bucket)
+        mock_pause.assert_called_once_with(30.0)
+    mock_remove.assert_awaited_once_with([12])
+    assert report.sent == 1
+    assert report.blocked == [12]
+
+    rows = await db.due_notifications(9e9, 10)
+    assert sorted((chat_id, attempts) for chat_id, _, attempts, _, _, _ in rows) == [(11, 1), (13, 0)]
+    assert await db.due_notifications(1000.0 + outbox.retry_delay(0) - 1, 10) == []
+
+@pytest.mark.asyncio
+async def test_rejected_message_does_not_drop_the_chat(temp_db):
+    await outbox.enqueue([("1", "alert", "a"), ("2", "alert", "b")], [[10, 11], [10]])
+
+    async def send_message(chat_id, text, parse_mode):
+        if chat_id == 10 and text == "a":
+            raise BadRequest("Can't parse entities: can't find end of the entity")
+        if chat_id == 11:
+            raise BadRequest("Chat not found")
+
+    bot = AsyncMock()
+    bot.send_message.side_effect = send_message
+    with patch('outbox.subscriptions.remove_subscribers', new_callable=AsyncMock) as mock_remove:
+        report = await outbox.drain(bot, bucket=fast_bucket())
+    mock_remove.assert_awaited_once_with([11])
+    assert (report.sent, report.failed, report.blocked) == (1, 2, [11])
+    assert bot.send_message.await_args_list[-1].kwargs['text'] == "b"
+    assert await db.outbox_status() == (0, None)
@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import broadcast
+import cleanup
+import database as db
+import outbox_workers
+from subscriptions import SubscriptionStore
+
+def open_database_in_worker(cwd: str, db_path: str, results) -> None:
+    os.chdir(cwd)
+    # What a spawned worker of `python main.py` does before its entry point runs.
+    import main
+    outbox_workers._init_worker_process(0, {'BOT_TOKEN': 'token'}, db_path)
+    conn = db._executor.submit(db._connect).result()
+    results.put((conn.execute("PRAGMA database_list").fetchone()[2], os.path.exists('bot.log')))
+
+def test_spawned_worker_uses_the_bot_process_database(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    db_path = str(tmp_path / 'bot.db')
+    process = context.Process(target=open_database_in_worker, args=(str(tmp_path), db_path, results))
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+    assert results.get(timeout=1) == (db_path, False)
+
+@pytest.mark.asyncio
+async def test_cleanup_and_workers_share_one_bucket():
+    pool = outbox_workers.DeliveryPool(2, {'BROADCAST_RATE': 1000.0})
+    store = SubscriptionStore()
+    store.load([(1, None)])
+    with patch('outbox_workers.db.outbox_status', new_callable=AsyncMock, return_value=(0, None)), \
+            patch.object(outbox_workers._context, 'Process') as mock_process:
+        mock_process.return_value.is_alive.return_value = False
+        await pool.start()
+        try:
+            assert [pool.bucket in call.kwargs['args'] for call in mock_process.call_args_list] == [True, True]
+            context = AsyncMock()
+            with patch.object(pool.bucket, 'acquire', new_callable=AsyncMock) as mock_acquire, \
+                    patch('cleanup.subscriptions.store', store), \
+                    patch('cleanup.db.get_state', new_callable=AsyncMock, return_value=None), \
+                    patch('cleanup.db.set_state', new_callable=AsyncMock):
+                await cleanup.cleanup_subscribers(context)
+            mock_acquire.assert_awaited_once()
+        finally:
+            await pool.stop()
+    assert broadcast.get_bucket() is not pool.bucket
@@ -0,0 +1,48 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+import database as db
+from persistence import SQLitePersistence
+
+@pytest.mark.asyncio
+async def test_changed_users_are_written_in_one_batch(temp_db):
+    persistence = SQLitePersistence()
+    with patch('persistence.db.save_user_data', wraps=db.save_user_data) as mock_save:
+        await asyncio.gather(
+            persistence.update_user_data(1, {'menu': 'weather', 'city': 'Львів'}),
+            persistence.update_user_data(2, {'selected_region': '31'}),
+            persistence.update_bot_data({'last_alert_status': {'data': []}, 'version': 1}),
+        )
+        assert mock_save.await_count == 1
+        assert sorted(mock_save.await_args.args[0]) == [
+            (1, '{"city":"Львів","menu":"weather"}'), (2, '{"selected_region":"31"}')
+        ]
+
+        # Users whose data did not change are not written again.
+        await persistence.update_user_data(1, {'city': 'Львів', 'menu': 'weather'})
+        await persistence.update_bot_data({'version': 1})
+        assert mock_save.await_count == 1
+
+@pytest.mark.asyncio
+async def test_user_data_is_loaded_on_first_access(temp_db):
+    await SQLitePersistence().update_user_data(1, {'menu': 'currency', 'city': 'Одеса'})
+
+    persistence = SQLitePersistence()
+    assert await persistence.get_user_data() == {}
+    user_data = {'menu': 'main'}
+    await persistence.refresh_user_data(1, user_data)
+    # Data set before loading wins over the stored copy.
+    assert user_data == {'menu': 'main', 'city': 'Одеса'}
+
+    await persistence.drop_user_data(1)
+    assert await db.get_user_data(1) is None
+    user_data = {}
+    await persistence.refresh_user_data(1, user_data)
+    assert user_data == {}
+
+@pytest.mark.asyncio
+async def test_bot_data_skips_transient_keys(temp_db):
+    await SQLitePersistence().update_bot_data({'last_alert_status': {'data': []}, 'version': 2})
+    assert await SQLitePersistence().get_bot_data() == {'version': 2}
@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from rate_history import EPOCH, HistoryStore, parse_period
+
+def test_append_and_series_pad_missing_days(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    day = date(2024, 3, 1)
+    store.append(day, {'USD': 40.0, 'EUR': 43.5, '../x': 1.0, 'BAD': float('nan')})
+    store.append(day + timedelta(days=3), {'USD': 41.0})
+    store.append(day + timedelta(days=3), {'USD': 41.5})
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['EUR.f4', 'USD.f4']
+    assert (tmp_path / 'USD.f4').stat().st_size == ((day - EPOCH).days + 4) * 4
+    series = store.series('USD', day - timedelta(days=1), day + timedelta(days=5))
+    assert np.isnan(series[[0, 2, 3, 5, 6]]).all()
+    assert series[[1, 4]].tolist() == [40.0, 41.5]
+    assert np.isnan(store.series('GBP', day, day)).all()
+    with pytest.raises(ValueError):
+        store.series('../etc', day, day)
+
+def test_summarize_range(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    today = date(2025, 6, 30)
+    for offset, price in enumerate([40.0, 39.0, 42.0, 41.0]):
+        store.append(today - timedelta(days=6 - 2 * offset), {'USD': price})
+
+    summary = store.summarize('USD', 7, today)
+    assert summary.points == 4
+    assert (summary.low, summary.low_day) == (39.0, today - timedelta(days=4))
+    assert (summary.high, summary.high_day) == (42.0, today - timedelta(days=2))
+    assert summary.change == pytest.approx(41.0 / 40.0 - 1)
+    assert summary.slope > 0
+    assert store.summarize('USD', 1, today - timedelta(days=1)) is None
+
+def test_summarize_clamps_periods_to_epoch(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    today = EPOCH + timedelta(days=9)
+    store.append(EPOCH, {'USD': 40.0})
+    store.append(today, {'USD': 44.0})
+
+    summary = store.summarize('USD', parse_period("3000y"), today)
+    assert summary.days == 10
+    assert (summary.low, summary.low_day) == (40.0, EPOCH)
+    assert store.summarize('USD', 30, EPOCH - timedelta(days=1)) is None
+
+def test_parse_period():
+    assert parse_period("30d") == 30
+    assert parse_period("2w") == 14
+    assert parse_period("6M") == 180
+    assert parse_period("5y") == 1825
+    assert parse_period("10") == 10
+    assert parse_period("0d") is None
+    assert parse_period("month") is None
@@ -0,0 +1,35 @@
+from regions import RegionDirectory, normalize_name
+
+def make_directory() -> RegionDirectory:
+    directory = RegionDirectory()
+    directory.update([
+        {"regionId": "14", "regionName": "Київська область"},
+        {"regionId": "31", "regionName": "м. Київ"},
+        {"regionId": "22", "regionName": "Харківська область"},
+        {"regionId": "23", "regionName": "Херсонська область"},
+        {"regionId": "3", "regionName": "Хмельницька область"},
+    ], states=True)
+    return directory
+
+def test_normalize_name_ignores_case_and_apostrophes():
+    assert normalize_name("  Кам’янець-Подільський ") == normalize_name("кам'янець-подільський")
+
+def test_resolve_exact_and_prefix():
+    directory = make_directory()
+    assert directory.resolve("київська область") == "14"
+    assert directory.resolve("КИЇВСЬКА") == "14"
+    assert directory.resolve("Харк") == "22"
+    assert directory.resolve("Х") is None
+    assert directory.resolve("Одеська") is None
+
+def test_names_and_keyboard_order():
+    directory = make_directory()
+    assert directory.name("31") == "м. Київ"
+    assert directory.name(None) is None
+    assert [name for _, name in directory.regions()][:2] == ["Київська область", "Харківська область"]
+
+def test_update_merges_alert_feed_names():
+    directory = make_directory()
+    directory.update([{"regionId": "1293", "regionName": "Бучанський район"}])
+    assert directory.resolve("бучанський") == "1293"
+    assert len(directory.regions()) == 5
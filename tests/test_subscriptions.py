@@ -0,0 +1,53 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import subscriptions
+from subscriptions import SubscriptionStore
+
+def test_recipients_include_all_region_subscribers():
+    store = SubscriptionStore()
+    store.load([(1, "10"), (2, "11"), (3, None), (1, None)])
+    assert store.recipients("10") == {1, 3}
+    assert store.recipients("11") == {1, 2, 3}
+    assert store.recipients("99") == {1, 3}
+
+def test_recipients_without_subscribers():
+    store = SubscriptionStore()
+    store.load([])
+    assert store.recipients("10") == set()
+
+def test_add_and_remove_keep_indexes_in_sync():
+    store = SubscriptionStore()
+    store.load([(1, "10"), (1, "11"), (2, "10")])
+    store.add(3, None)
+    store.add(3, None)
+    assert store.subscription_count() == 4
+    assert store.user_count() == 3
+    store.remove(1, "10")
+    assert store.user_regions(1) == {"11"}
+    assert store.recipients("10") == {2, 3}
+    store.remove(1)
+    assert not store.is_subscribed(1)
+    assert store.is_subscribed(2, "10")
+    assert store.rows() == {(2, "10"), (3, None)}
+    assert store.subscription_count() == 2
+
+@pytest.mark.asyncio
+async def test_verify_consistency_reloads_on_mismatch():
+    store = SubscriptionStore()
+    store.load([(1, "10")])
+    with patch('subscriptions.store', store), \
+            patch('subscriptions.db.get_subscribers', new_callable=AsyncMock, return_value=[(1, "10"), (2, None)]):
+        assert not await subscriptions.verify_consistency()
+        assert store.rows() == {(1, "10"), (2, None)}
+        assert await subscriptions.verify_consistency()
+
+def test_snapshot_recipients_are_deduplicated_and_frozen():
+    store = SubscriptionStore()
+    store.load([(1, "10"), (1, None), (2, None), (3, "11")])
+    recipients_10, recipients_11 = store.snapshot_recipients(["10", "11"])
+    store.add(4, None)
+    assert sorted(recipients_10) == [1, 2]
+    assert len(recipients_10) == 2
+    assert sorted(recipients_11) == [1, 2, 3]
+    assert len(recipients_11) == 3
@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from telegram.ext import ApplicationHandlerStop
+
+import config
+import currency
+import metrics
+import throttle
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setitem(config.cfg, 'THROTTLE_RATE', 1.0)
+    monkeypatch.setitem(config.cfg, 'THROTTLE_BURST', 3)
+    monkeypatch.setitem(config.cfg, 'FORCE_REFRESH_PER_MINUTE', 2)
+    throttle.reset()
+    yield
+    throttle.reset()
+
+def message_update(user_id: int, text: str):
+    message = SimpleNamespace(text=text, chat_id=user_id, reply_text=AsyncMock())
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), message=message,
+                           effective_message=message, callback_query=None)
+
+def callback_update(user_id: int, data: str):
+    query = SimpleNamespace(data=data, answer=AsyncMock(), message=None)
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), message=None,
+                           effective_message=None, callback_query=query)
+
+async def passes(update) -> bool:
+    try:
+        await throttle.guard(update, None)
+        return True
+    except ApplicationHandlerStop:
+        return False
+
+def test_keyed_bucket_allows_burst_then_refills():
+    bucket = throttle.KeyedBucket(rate=2.0, capacity=3)
+    assert [bucket.try_acquire('a', now=0.0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.try_acquire('b', now=0.0)
+    assert not bucket.try_acquire('a', now=0.4)
+    assert bucket.try_acquire('a', now=0.5)
+
+@pytest.mark.asyncio
+async def test_guard_collapses_identical_updates():
+    before = metrics.THROTTLED_UPDATES.value('duplicate')
+    assert await passes(message_update(1, "🔄 Обновить курс"))
+    assert not await passes(message_update(1, "🔄 Обновить курс"))
+    assert await passes(message_update(2, "🔄 Обновить курс"))
+    assert await passes(message_update(1, "⬅️ Назад"))
+
+    assert await passes(callback_update(1, "region:31"))
+    repeated = callback_update(1, "region:31")
+    assert not await passes(repeated)
+    repeated.callback_query.answer.assert_awaited_once()
+    assert metrics.THROTTLED_UPDATES.value('duplicate') == before + 2
+
+@pytest.mark.asyncio
+async def test_guard_throttles_per_user_and_warns_once():
+    updates = [message_update(1, f"/weather city{i}") for i in range(5)]
+    assert [await passes(update) for update in updates] == [True, True, True, False, False]
+    updates[3].message.reply_text.assert_awaited_once()
+    updates[4].message.reply_text.assert_not_awaited()
+    assert await passes(message_update(2, "/weather"))
+
+@pytest.mark.asyncio
+async def test_forced_refreshes_are_capped_globally():
+    before = metrics.FORCE_REFRESHES.value('currency', 'capped')
+    with patch.object(currency, 'is_stale', return_value=False), \
+            patch.object(currency, 'schedule_refresh') as schedule:
+        for _ in range(3):
+            await currency.get_currency_rates(force_update=True)
+    assert schedule.call_count == 2
+    assert metrics.FORCE_REFRESHES.value('currency', 'capped') == before + 1
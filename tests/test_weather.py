@@ -0,0 +1,123 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+import cities
+import weather
+from cache import AsyncTTLCache
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def city_weather(city_id: int, temp: float, name: str = '') -> dict:
+    return {
+        'id': city_id, 'name': name or f"City{city_id}", 'weather': [{'description': 'ясно'}],
+        'main': {'temp': temp, 'feels_like': temp, 'humidity': 50}, 'wind': {'speed': 1.0}
+    }
+
+def ok(json: dict) -> httpx.Response:
+    return httpx.Response(200, json=json, request=httpx.Request('GET', weather.WEATHER_API_URL))
+
+@pytest.fixture
+def weather_state(temp_db, monkeypatch):
+    timer = FakeTimer()
+    monkeypatch.setattr(weather, 'WEATHER_CACHE', AsyncTTLCache(maxsize=100, ttl=3600, timer=timer))
+    monkeypatch.setattr(weather, '_popularity', weather.Counter())
+    monkeypatch.setattr(weather, '_not_found', None)
+    monkeypatch.setattr(weather, '_prefetch_allowance', 0.0)
+    monkeypatch.setattr(cities, 'directory', cities.CityDirectory())
+    monkeypatch.setattr(weather, 'WEATHER_API_KEY', 'key')
+    yield timer
+
+@pytest.mark.asyncio
+async def test_spellings_of_a_city_share_one_cache_entry(weather_state):
+    with patch('weather.http_client.get', new_callable=AsyncMock) as mock_get:
+        mock_get.return_value = ok(city_weather(703448, 10.0, name="Київ"))
+        assert "Погода в Київ" in await weather.get_weather("Kyiv")
+        assert "Погода в Київ" in await weather.get_weather("  київ ")
+        assert await weather.get_weather("KYIV") == await weather.get_weather("Kyiv")
+        mock_get.return_value = ok(city_weather(703448, 12.0, name="Київ"))
+        assert "12.0°C" in await weather.get_weather("Kiev")
+        assert "12.0°C" in await weather.get_weather("Київ")
+    # "Kyiv" by name, then "Kiev" by name; "київ" is the canonical name.
+    assert [call.kwargs['params'].get('q') for call in mock_get.await_args_list] == ["Kyiv", "Kiev"]
+    assert len(weather.get_cache()) == 1
+
+    # The known spellings survive a restart, so they go straight to a fetch by id.
+    cities.directory = cities.CityDirectory()
+    await cities.load()
+    assert {cities.directory.resolve(spelling) for spelling in ("kyiv", "Київ", "kiev")} == {703448}
+    assert cities.directory.name(703448) == "Київ"
+
+@pytest.mark.asyncio
+async def test_unknown_spelling_is_looked_up_once(weather_state):
+    release = asyncio.Event()
+
+    async def get(url, params=None, **kwargs):
+        await release.wait()
+        if params['q'] == "Kyivv":
+            return httpx.Response(404, json={}, request=httpx.Request('GET', url))
+        return ok(city_weather(703448, 10.0, name="Київ"))
+
+    with patch('weather.http_client.get', side_effect=get) as mock_get:
+        pending = asyncio.gather(*(weather.get_weather(city) for city in ["Kyiv", " kyiv", "Kyivv", "kyivv"]))
+        await asyncio.sleep(0)
+        release.set()
+        results = await pending
+        assert await weather.get_weather("Kyivv") is None
+    assert results[0] == results[1] and "Погода в Київ" in results[0]
+    assert results[2:] == [None, None]
+    assert [call.kwargs['params']['q'] for call in mock_get.await_args_list] == ["Kyiv", "Kyivv"]
+
+@pytest.mark.asyncio
+async def test_prefetch_refreshes_popular_cities_in_groups(weather_state):
+    timer = weather_state
+    names = [f"City{i}" for i in range(25)]
+    with patch('weather.http_client.get', new_callable=AsyncMock) as mock_get:
+        for i, city in enumerate(names):
+            mock_get.return_value = ok(city_weather(i, 10.0))
+            for _ in range(i + 1):
+                await weather.get_weather(city)
+        assert mock_get.await_count == 25
+
+        timer.now = 3500
+        mock_get.reset_mock()
+        mock_get.return_value = ok({'list': [city_weather(i, 20.0) for i in range(5, 25)]})
+        weather.config.cfg.update({'WEATHER_PREFETCH_INTERVAL': 300, 'WEATHER_PREFETCH_BUDGET': 12})
+        assert await weather.prefetch_weather() == 20
+
+    # A budget of 12 calls per hour allows one call per 5-minute run: the 20 most requested cities.
+    mock_get.assert_awaited_once()
+    assert mock_get.await_args.args[0] == weather.WEATHER_GROUP_URL
+    assert sorted(map(int, mock_get.await_args.kwargs['params']['id'].split(','))) == list(range(5, 25))
+    assert weather.get_cache().expires_in(24) == 3600
+    assert "20.0°C" in await weather.get_weather("City24")
+    assert weather.get_cache().expires_in(0) == 100
+
+@pytest.mark.asyncio
+async def test_small_prefetch_budget_carries_over_between_runs(weather_state):
+    with patch('weather.http_client.get', new_callable=AsyncMock) as mock_get:
+        mock_get.return_value = ok(city_weather(703448, 10.0))
+        await weather.get_weather("Kyiv")
+        weather.get_cache().clear()
+        mock_get.reset_mock()
+        mock_get.return_value = ok({'list': [city_weather(703448, 20.0)]})
+        # 5 calls per hour at one run per 5 minutes is 0.42 calls per run.
+        weather.config.cfg.update({'WEATHER_PREFETCH_INTERVAL': 300, 'WEATHER_PREFETCH_BUDGET': 5})
+        assert [await weather.prefetch_weather() for _ in range(3)] == [0, 0, 1]
+    mock_get.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_prefetch_skips_fresh_entries(weather_state):
+    with patch('weather.http_client.get', new_callable=AsyncMock) as mock_get:
+        mock_get.return_value = ok(city_weather(703448, 10.0))
+        await weather.get_weather("Kyiv")
+        mock_get.reset_mock()
+        assert await weather.prefetch_weather() == 0
+        mock_get.assert_not_awaited()
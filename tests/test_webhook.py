@@ -0,0 +1,94 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+from telegram.ext import ApplicationBuilder
+
+import http_server
+import webhook
+
+SECRET = 'test-secret-token-0123'
+
+def make_application(queue_size: int):
+    return (
+        ApplicationBuilder()
+        .token('123456:' + 'A' * 35)
+        .updater(None)
+        .update_queue(asyncio.Queue(queue_size))
+        .build()
+    )
+
+def post(body: bytes, secret: str = SECRET, path: str = '/telegram') -> http_server.Request:
+    return http_server.Request('POST', path, {webhook.SECRET_HEADER: secret}, body)
+
+UPDATE = json.dumps({
+    'update_id': 1,
+    'message': {'message_id': 1, 'date': 0, 'chat': {'id': 42, 'type': 'private'}, 'text': '/start'},
+}).encode()
+
+@pytest.mark.asyncio
+async def test_webhook_enqueues_valid_updates():
+    application = make_application(10)
+    handle = webhook.make_handler(application, '/telegram', SECRET)
+
+    response = await handle(post(UPDATE))
+    assert response.status == 200
+    update = application.update_queue.get_nowait()
+    assert update.update_id == 1
+    assert update.message.chat.id == 42
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_bad_requests():
+    application = make_application(10)
+    handle = webhook.make_handler(application, '/telegram', SECRET)
+
+    assert (await handle(post(UPDATE, secret='wrong'))).status == 403
+    assert (await handle(post(UPDATE, path='/other'))).status == 404
+    assert (await handle(post(b'{not json'))).status == 400
+    assert (await handle(http_server.Request('GET', '/telegram', {webhook.SECRET_HEADER: SECRET}))).status == 405
+    assert application.update_queue.empty()
+
+@pytest.mark.asyncio
+async def test_webhook_sheds_load_when_queue_is_full():
+    application = make_application(1)
+    handle = webhook.make_handler(application, '/telegram', SECRET)
+
+    assert (await handle(post(UPDATE))).status == 200
+    response = await handle(post(UPDATE))
+    assert response.status == 503
+    assert response.headers['Retry-After'] == '1'
+    assert application.update_queue.qsize() == 1
+
+@pytest.mark.asyncio
+async def test_stop_on_signals_falls_back_without_loop_signal_handlers():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    with patch.object(loop, 'add_signal_handler', side_effect=NotImplementedError), \
+            patch('webhook.signal.signal') as mock_signal:
+        webhook._stop_on_signals(stop)
+    assert mock_signal.call_count == 2
+    handler = mock_signal.call_args.args[1]
+    handler(webhook.signal.SIGTERM, None)
+    await asyncio.wait_for(stop.wait(), 1)
+
+@pytest.mark.asyncio
+async def test_server_closes_slow_and_idle_connections():
+    async def handler(request):
+        return http_server.Response(200, b"ok")
+
+    server = await http_server.start_server(handler, '127.0.0.1', 0, read_timeout=0.1, idle_timeout=0.2)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b"POST /telegram HTTP/1.1\r\nContent-Length: 10\r\n")
+        assert (await asyncio.wait_for(reader.read(), 2)).startswith(b"HTTP/1.1 408")
+        writer.close()
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b"GET / HTTP/1.1\r\n\r\n")
+        assert (await asyncio.wait_for(reader.read(), 2)).endswith(b"\r\n\r\nok")
+        writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
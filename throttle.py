@@ -0,0 +1,132 @@
+import logging
+import time
+from typing import Hashable, Optional, Tuple
+
+from cachetools import TTLCache
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED = 100_000
+
+class KeyedBucket:
+    """
+    Non-blocking token buckets, one per key.
+
+    A key idle for capacity / rate seconds has a full bucket again, so its
+    entry expires then and memory stays bounded by the active keys.
+    """
+
+    def __init__(self, rate: float, capacity: float, maxsize: int = MAX_TRACKED):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: TTLCache = TTLCache(maxsize, ttl=capacity / rate)
+
+    def try_acquire(self, key: Hashable, now: Optional[float] = None) -> bool:
+        """Takes a token for key if one is available. Never waits."""
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1
+        self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+_users: Optional[KeyedBucket] = None
+_refreshes: Optional[KeyedBucket] = None
+# Updates seen within THROTTLE_DUPLICATE_WINDOW, keyed by update_key.
+_recent: Optional[TTLCache] = None
+# Users already told they are throttled, so a flood gets one reply, not one per update.
+_warned: Optional[TTLCache] = None
+
+def _get_users() -> KeyedBucket:
+    global _users, _warned
+    if _users is None:
+        rate = float(config.cfg.get('THROTTLE_RATE', 1.0))
+        _users = KeyedBucket(rate, float(config.cfg.get('THROTTLE_BURST', 5)))
+        _warned = TTLCache(MAX_TRACKED, ttl=_users.capacity / rate)
+    return _users
+
+def _get_recent() -> TTLCache:
+    global _recent
+    if _recent is None:
+        _recent = TTLCache(MAX_TRACKED, ttl=float(config.cfg.get('THROTTLE_DUPLICATE_WINDOW', 2.0)))
+    return _recent
+
+def _get_refreshes() -> KeyedBucket:
+    global _refreshes
+    if _refreshes is None:
+        per_minute = float(config.cfg.get('FORCE_REFRESH_PER_MINUTE', 30))
+        _refreshes = KeyedBucket(per_minute / 60, per_minute)
+    return _refreshes
+
+def reset() -> None:
+    """Forgets all buckets and recent updates."""
+    global _users, _refreshes, _recent, _warned
+    _users = _refreshes = _recent = _warned = None
+
+def update_key(update: Update) -> Optional[Tuple]:
+    """Identity of an update's content: the same user sending the same text or pressing the same button."""
+    user = update.effective_user
+    if user is None:
+        return None
+    if update.message and update.message.text is not None:
+        return user.id, 'message', update.message.text
+    if update.callback_query and update.callback_query.data is not None:
+        return user.id, 'callback', update.callback_query.data
+    return None
+
+def allow_refresh(upstream: str) -> bool:
+    """
+    Checks the global cap on forced refreshes of an upstream.
+
+    All users share FORCE_REFRESH_PER_MINUTE per upstream; a refresh over the
+    cap is served from the cache instead.
+    """
+    allowed = _get_refreshes().try_acquire(upstream)
+    metrics.FORCE_REFRESHES.inc(upstream, 'allowed' if allowed else 'capped')
+    return allowed
+
+async def guard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Runs before every handler and stops updates that should not reach them.
+
+    Repeats of the same message or button from the same user within
+    THROTTLE_DUPLICATE_WINDOW are dropped silently. Beyond that, each user
+    gets THROTTLE_BURST updates at once, refilled at THROTTLE_RATE per
+    second; the first update over the limit gets a short reply.
+
+    Raises:
+        ApplicationHandlerStop: The update is dropped.
+    """
+    user = update.effective_user
+    if user is None:
+        return
+
+    key = update_key(update)
+    if key is not None:
+        recent = _get_recent()
+        if key in recent:
+            metrics.THROTTLED_UPDATES.inc('duplicate')
+            await _dismiss(update)
+            raise ApplicationHandlerStop
+        recent[key] = True
+
+    if _get_users().try_acquire(user.id):
+        return
+    metrics.THROTTLED_UPDATES.inc('rate')
+    if user.id not in _warned:
+        _warned[user.id] = True
+        logger.info(f"Throttling user {user.id}.")
+        if update.effective_message:
+            await update.effective_message.reply_text("Забагато запитів. Зачекайте кілька секунд.")
+    await _dismiss(update)
+    raise ApplicationHandlerStop
+
+async def _dismiss(update: Update) -> None:
+    # An unanswered callback query keeps the button's spinner running in the client.
+    if update.callback_query:
+        await update.callback_query.answer()
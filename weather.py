@@ -1,61 +1,216 @@
 import logging
-from typing import Optional
-from datetime import datetime
+from collections import Counter
+from typing import Any, Dict, List, Optional
 
-import requests
+import httpx
+from cachetools import TTLCache
 from telegram import Update
 from telegram.ext import ContextTypes
 
+import cities
 import config
+import http_client
+import throttle
+from cache import AsyncTTLCache
+from regions import normalize_name
 
 logger = logging.getLogger(__name__)
 
 WEATHER_API_KEY = config.cfg.get('WEATHER_API_KEY')
 WEATHER_API_URL = "http://api.openweathermap.org/data/2.5/weather"
-WEATHER_CACHE: dict = {}
+# Current weather for up to GROUP_SIZE city ids in one call.
+WEATHER_GROUP_URL = "http://api.openweathermap.org/data/2.5/group"
+GROUP_SIZE = 20
+# Keyed by OpenWeatherMap city id, so every spelling of a city shares one entry.
+WEATHER_CACHE: Optional[AsyncTTLCache[str]] = None
+# Normalized spellings whose lookup failed recently, mostly typos.
+_not_found: Optional[TTLCache] = None
 
-async def get_weather(city: str, force_update: bool = False) -> Optional[str]:
-    if not WEATHER_API_KEY:
+POPULARITY_HALF_LIFE = 3600.0
+# Decayed request counts per city id.
+_popularity: Counter = Counter()
+# Fraction of a prefetch call left over from earlier runs.
+_prefetch_allowance = 0.0
+
+def get_cache() -> AsyncTTLCache[str]:
+    global WEATHER_CACHE
+    if WEATHER_CACHE is None:
+        WEATHER_CACHE = AsyncTTLCache(
+            maxsize=int(config.cfg.get('WEATHER_CACHE_SIZE', 1000)),
+            ttl=float(config.cfg.get('WEATHER_CACHE_TTL', 3600)),
+            name='weather'
+        )
+    return WEATHER_CACHE
+
+def _get_not_found() -> TTLCache:
+    global _not_found
+    if _not_found is None:
+        _not_found = TTLCache(maxsize=10_000, ttl=float(config.cfg.get('WEATHER_NOT_FOUND_TTL', 120)))
+    return _not_found
+
+def format_weather(city: str, data: Dict) -> str:
+    weather_desc = data['weather'][0]['description']
+    temp = data['main']['temp']
+    feels_like = data['main']['feels_like']
+    humidity = data['main']['humidity']
+    wind_speed = data['wind']['speed']
+
+    return (
+        f"Погода в {city}:\n"
+        f"📌 {weather_desc.capitalize()}\n"
+        f"🌡️ Температура: {temp}°C (відчувається як {feels_like}°C)\n"
+        f"💧 Вологість: {humidity}%\n"
+        f"💨 Вітер: {wind_speed} м/с"
+    )
+
+async def _request(url: str, params: Dict[str, Any], upstream: str) -> Optional[Dict]:
+    # Config is loaded after module import in main, so fall back to it at call time.
+    api_key = WEATHER_API_KEY or config.cfg.get('WEATHER_API_KEY')
+    if not api_key:
         logger.error("Weather API key is not configured.")
         return None
 
-    cache_key = city.lower()
-    if not force_update and cache_key in WEATHER_CACHE:
-        cached = WEATHER_CACHE[cache_key]
-        if (datetime.now() - cached['timestamp']).total_seconds() < 3600:
-            logger.info(f"Returning cached weather for {city}")
-            return cached['data']
-
-    params = {
-        'q': city,
-        'appid': WEATHER_API_KEY,
-        'units': 'metric',
-        'lang': 'ua'
-    }
+    params = {**params, 'appid': api_key, 'units': 'metric', 'lang': 'ua'}
     try:
-        response = requests.get(WEATHER_API_URL, params=params, timeout=10)
+        response = await http_client.get(url, params=params, upstream=upstream)
         response.raise_for_status()
-        data = response.json()
-
-        weather_desc = data['weather'][0]['description']
-        temp = data['main']['temp']
-        feels_like = data['main']['feels_like']
-        humidity = data['main']['humidity']
-        wind_speed = data['wind']['speed']
-
-        result = (
-            f"Погода в {city}:\n"
-            f"📌 {weather_desc.capitalize()}\n"
-            f"🌡️ Температура: {temp}°C (відчувається як {feels_like}°C)\n"
-            f"💧 Вологість: {humidity}%\n"
-            f"💨 Вітер: {wind_speed} м/с"
-        )
-        WEATHER_CACHE[cache_key] = {'data': result, 'timestamp': datetime.now()}
-        return result
-    except requests.RequestException as e:
-        logger.error(f"Failed to fetch weather for {city}: {e}")
+        return response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"Weather API request {params.get('q') or params.get('id')} failed: {e}")
         return None
 
+async def fetch_weather(city_id: int) -> Optional[str]:
+    """Fetches and formats the weather of a known city."""
+    data = await _request(WEATHER_API_URL, {'id': city_id}, 'weather')
+    if data is None:
+        return None
+    return format_weather(cities.directory.name(city_id) or data.get('name', ''), data)
+
+async def fetch_new_city(city: str) -> Optional[str]:
+    """
+    Fetches the weather of a spelling not in the city directory by name.
+
+    The response carries the city's id and canonical name, which are
+    remembered so the next request with any known spelling hits the cache.
+    """
+    data = await _request(WEATHER_API_URL, {'q': city}, 'weather')
+    if data is None:
+        return None
+    if 'id' not in data:
+        return format_weather(city, data)
+    city_id = data['id']
+    name = data.get('name') or city
+    await cities.remember(city, city_id, name)
+    text = format_weather(cities.directory.name(city_id) or name, data)
+    get_cache().set(city_id, text)
+    _popularity[city_id] += 1
+    return text
+
+async def fetch_weather_group(city_ids: List[int]) -> Optional[Dict[int, Dict]]:
+    """
+    Fetches current weather for up to GROUP_SIZE cities in one call.
+
+    Returns:
+        Weather data by city id, or None on errors.
+    """
+    data = await _request(WEATHER_GROUP_URL, {'id': ','.join(str(city_id) for city_id in city_ids)}, 'weather_group')
+    if data is None:
+        return None
+    try:
+        return {item['id']: item for item in data.get('list', [])}
+    except (KeyError, TypeError, AttributeError) as e:
+        logger.error(f"Unexpected group weather response: {e}")
+        return None
+
+async def get_weather(city: str, force_update: bool = False) -> Optional[str]:
+    city_id = cities.directory.resolve(city)
+    if city_id is None:
+        spelling = normalize_name(city)
+        not_found = _get_not_found()
+        if spelling in not_found:
+            return None
+        # Counted as a cache miss: the lookup has to go upstream, once for all concurrent requests of the spelling.
+        cache = get_cache()
+        cache.misses += 1
+        text = await cache.coalesce(('q', spelling), lambda: fetch_new_city(city))
+        if text is None:
+            not_found[spelling] = True
+        return text
+    _popularity[city_id] += 1
+    if force_update and not throttle.allow_refresh('weather'):
+        force_update = False
+    return await get_cache().get_or_fetch(city_id, lambda: fetch_weather(city_id), force_update)
+
+def decay_popularity(factor: float, threshold: float = 0.1) -> None:
+    """Scales request counts by factor and forgets cities that fall below threshold."""
+    for city_id in list(_popularity):
+        _popularity[city_id] *= factor
+        if _popularity[city_id] < threshold:
+            del _popularity[city_id]
+
+def select_prefetch(cache: AsyncTTLCache[str], top: int, horizon: float, max_cities: int) -> List[int]:
+    """
+    Picks the popular cities whose cached weather expires within horizon seconds.
+
+    Args:
+        cache: Weather cache.
+        top: How many of the most requested cities are considered.
+        horizon: Entries expiring later than this are left alone.
+        max_cities: Upper bound on the result, from the API-call budget.
+
+    Returns:
+        City ids, most requested first.
+    """
+    due = []
+    for city_id, _ in _popularity.most_common(top):
+        if len(due) >= max_cities:
+            break
+        remaining = cache.expires_in(city_id)
+        if remaining is None or remaining < horizon:
+            due.append(city_id)
+    return due
+
+async def prefetch_weather(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> int:
+    """
+    Refreshes the most requested cities before their cache entries expire.
+
+    Cities go GROUP_SIZE to a request. The number of requests per run is
+    WEATHER_PREFETCH_BUDGET (calls per hour) spread over the runs in an hour;
+    a budget below one call per run is carried over until it adds up to one.
+    Request counts decay with a one-hour half-life, so popularity follows
+    recent demand and cities nobody asks for any more drop out.
+
+    Returns:
+        Number of cities refreshed.
+    """
+    global _prefetch_allowance
+    interval = float(config.cfg.get('WEATHER_PREFETCH_INTERVAL', 300))
+    budget = int(config.cfg.get('WEATHER_PREFETCH_BUDGET', 60))
+    top = int(config.cfg.get('WEATHER_PREFETCH_TOP', 300))
+    _prefetch_allowance += budget * interval / 3600
+    calls = int(_prefetch_allowance)
+    _prefetch_allowance -= calls
+    cache = get_cache()
+
+    # An entry that would expire before the next run is refreshed now.
+    city_ids = select_prefetch(cache, top, interval * 1.5, calls * GROUP_SIZE)
+    refreshed = 0
+    for start in range(0, len(city_ids), GROUP_SIZE):
+        results = await fetch_weather_group(city_ids[start:start + GROUP_SIZE])
+        if results is None:
+            break
+        for city_id, data in results.items():
+            try:
+                cache.set(city_id, format_weather(cities.directory.name(city_id) or data.get('name', ''), data))
+                refreshed += 1
+            except (KeyError, IndexError) as e:
+                logger.warning(f"Unexpected weather data for city {city_id}: {e}")
+
+    decay_popularity(0.5 ** (interval / POPULARITY_HALF_LIFE))
+    if city_ids:
+        logger.info(f"Prefetched weather for {refreshed} of {len(city_ids)} popular cities.")
+    return refreshed
+
 async def get_weather_command(update: Update, context: ContextTypes.DEFAULT_TYPE, force_update: bool = False) -> None:
     try:
         city = context.user_data.get('city', 'Kyiv')
@@ -71,4 +226,4 @@ async def get_weather_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             await update.message.reply_text(f"Не вдалося отримати погоду для {city}. Перевірте ключ API погоди.")
     except Exception as e:
         await update.message.reply_text(f"⚠️ Помилка: {str(e)}")
-        raise
\ No newline at end of file
+        raise
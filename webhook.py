@@ -0,0 +1,112 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from typing import Optional, Sequence
+
+from telegram import Update
+from telegram.ext import Application
+
+import config
+import http_server
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+WEBHOOK_UPDATES = metrics.Counter('bot_webhook_updates_total', "Webhook requests by outcome.", ['result'])
+
+def make_handler(application: Application, path: str, secret: str) -> http_server.Handler:
+    """
+    Builds the HTTP handler that feeds Telegram updates into the application's queue.
+
+    Requests without the secret token are rejected with 403. When the bounded
+    update queue is full the handler answers 503, and Telegram redelivers the
+    update later instead of it piling up in memory.
+    """
+    expected = secret.encode()
+
+    async def handle(request: http_server.Request) -> http_server.Response:
+        if request.path.split("?", 1)[0] != path:
+            return http_server.Response(404)
+        if request.method != 'POST':
+            return http_server.Response(405)
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, '').encode('latin-1'), expected):
+            WEBHOOK_UPDATES.inc('forbidden')
+            return http_server.Response(403)
+        try:
+            update = Update.de_json(json.loads(request.body), application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Rejected malformed webhook update: {e}")
+            WEBHOOK_UPDATES.inc('malformed')
+            return http_server.Response(400)
+        try:
+            application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            WEBHOOK_UPDATES.inc('overloaded')
+            return http_server.Response(503, headers={'Retry-After': '1'})
+        WEBHOOK_UPDATES.inc('accepted')
+        return http_server.Response(200)
+
+    return handle
+
+def _stop_on_signals(stop: asyncio.Event) -> None:
+    """Sets stop on SIGINT and SIGTERM."""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows event loops have no signal handlers; wake the loop from a Python-level handler instead.
+            signal.signal(sig, lambda signum, frame: loop.call_soon_threadsafe(stop.set))
+
+async def serve(application: Application, allowed_updates: Sequence[str],
+                stop: Optional[asyncio.Event] = None) -> None:
+    """
+    Runs the application behind the embedded webhook server until stopped.
+
+    Mirrors the lifecycle of Application.run_polling: initialize, post_init,
+    start, then stop, shutdown and post_shutdown on the way out.
+
+    Args:
+        application: Application built without an updater.
+        allowed_updates: Update types requested from Telegram.
+        stop: Event that ends the server; SIGINT/SIGTERM set it when omitted.
+    """
+    path = config.cfg.get('WEBHOOK_PATH', '/telegram')
+    secret = config.cfg['WEBHOOK_SECRET']
+    if stop is None:
+        stop = asyncio.Event()
+        _stop_on_signals(stop)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    server = None
+    try:
+        server = await http_server.start_server(
+            make_handler(application, path, secret),
+            config.cfg.get('WEBHOOK_HOST', '0.0.0.0'),
+            int(config.cfg.get('WEBHOOK_PORT', 8443))
+        )
+        await application.bot.set_webhook(
+            url=config.cfg['WEBHOOK_URL'].rstrip('/') + path,
+            secret_token=secret,
+            allowed_updates=list(allowed_updates),
+            max_connections=int(config.cfg.get('WEBHOOK_MAX_CONNECTIONS', 40))
+        )
+        await application.start()
+        logger.info("Bot is running in webhook mode...")
+        await stop.wait()
+    finally:
+        # The webhook stays registered so Telegram keeps updates while the bot restarts.
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)